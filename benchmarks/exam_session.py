@@ -0,0 +1,148 @@
+"""Load test of the candidate-facing exam endpoints, sync (WSGI) vs async (ASGI).
+
+Each simulated candidate fetches the paper, autosaves a few answers, polls
+the time remaining and submits. Start the server under test separately,
+for example:
+
+    gunicorn mysite.wsgi -w 4 --threads 8 -b :8000
+    uvicorn mysite.asgi:application --workers 4 --port 8001
+
+then run against each deployment:
+
+    python benchmarks/exam_session.py --exam 1 --base-url http://localhost:8000 --api sync
+    python benchmarks/exam_session.py --exam 1 --base-url http://localhost:8001 --api async
+
+Tokens are minted locally for the exam's eligible candidates, so the
+script needs the same settings and database as the server. Candidates
+only get the paper while one of the exam's schedules is running.
+
+Submissions are real rows; use a scratch database, or
+QUIZZ_SUBMISSION_INGEST=log. A candidate can submit an exam only once,
+so delete the exam's submissions before running again.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+
+ROUTES = {
+    "sync": {
+        "paper": ('GET', '/api/exams/{exam}/paper/'),
+        "draft": ('PATCH', '/api/exams/{exam}/draft/'),
+        "time": ('GET', '/api/exams/{exam}/time-remaining/'),
+        "submit": ('POST', '/api/submissions/'),
+    },
+    "async": {
+        "paper": ('GET', '/api/async/exams/{exam}/paper/'),
+        "draft": ('PATCH', '/api/async/exams/{exam}/draft/'),
+        "time": ('GET', '/api/async/exams/{exam}/time-remaining/'),
+        "submit": ('POST', '/api/async/exams/{exam}/submit/'),
+    },
+}
+
+
+def candidate_tokens(exam_id, limit):
+    import django
+    django.setup()
+    from quizzMaster.authentication import tokens_for_user
+    from quizzMaster.models import User
+    from quizzMaster.prewarm import eligible_candidates
+
+    users = User.objects.select_related('role').filter(id__in=eligible_candidates(exam_id)[:limit])
+    return [str(tokens_for_user(user).access_token) for user in users]
+
+
+async def request(reader, writer, host, method, path, token, body=None):
+    payload = json.dumps(body).encode() if body is not None else b''
+    writer.write(
+        f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\n'
+        f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n'.encode() + payload
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    response = await reader.readexactly(length)
+    return int(status_line.split()[1]), response
+
+
+async def candidate(args, token, timings, errors):
+    url = urlsplit(args.base_url)
+    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    routes = ROUTES[args.api]
+
+    async def call(name, body=None):
+        method, path = routes[name]
+        started = time.perf_counter()
+        status, response = await request(reader, writer, url.netloc, method, path.format(exam=args.exam), token, body)
+        timings[name].append(time.perf_counter() - started)
+        if status >= 400:
+            errors.append((name, status))
+        return response
+
+    try:
+        paper = json.loads(await call('paper'))
+        questions = paper["questions"]
+        for question in questions[:args.autosaves]:
+            await call('draft', {"answers": {str(question["id"]): question["choices"][0]["option"]}})
+            await call('time')
+        await call('submit', {"exam_id": args.exam, "answers": {}})
+    finally:
+        writer.close()
+
+
+async def run(args, tokens):
+    timings = {name: [] for name in ROUTES[args.api]}
+    errors = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(token):
+        async with semaphore:
+            await candidate(args, token, timings, errors)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(token) for token in tokens))
+    return timings, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--exam', type=int, required=True)
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--api', choices=ROUTES, default='async')
+    parser.add_argument('--candidates', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--autosaves', type=int, default=5)
+    args = parser.parse_args()
+
+    tokens = candidate_tokens(args.exam, args.candidates)
+    if not tokens:
+        parser.error('the exam has no eligible candidates')
+    timings, errors, elapsed = asyncio.run(run(args, tokens))
+
+    total = sum(len(samples) for samples in timings.values())
+    print(f'{args.api} @ {args.base_url}: {len(tokens)} candidates, {total} requests in {elapsed:.2f}s '
+          f'({total / elapsed:.0f} req/s), {len(errors)} errors')
+    for name, samples in timings.items():
+        if samples:
+            samples.sort()
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            print(f'  {name:7} n={len(samples):6} median={statistics.median(samples) * 1000:7.1f}ms '
+                  f'p99={p99 * 1000:7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
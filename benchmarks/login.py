@@ -0,0 +1,102 @@
+"""Load test of the login endpoint, reported as logins per second per core.
+
+Start the server under test separately, for example:
+
+    gunicorn mysite.wsgi -w 4 -b :8000
+
+create the benchmark users once (they share one password) and run:
+
+    python benchmarks/login.py --setup 2000
+    python benchmarks/login.py --base-url http://localhost:8000 --users 2000 --server-cores 4
+
+Every user logs in once, so the per-username limiter is not hit, but all
+requests come from one address: raise QUIZZ_LOGIN_IP_BURST and
+QUIZZ_LOGIN_IP_RATE on the server first. Compare QUIZZ_PASSWORD_ITERATIONS
+settings by restarting the server with each one. The first run after a
+change also pays for rehashing every password.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+
+USERNAME = 'bench-login-{}'
+
+
+def setup_users(count, password):
+    import django
+    django.setup()
+    from quizzMaster.provisioning import provision_users
+
+    rows = [
+        {"username": USERNAME.format(i), "email": f'{USERNAME.format(i)}@example.com', "password": password,
+         "role": '', "subjects": ''}
+        for i in range(count)
+    ]
+    report = provision_users(rows)
+    print(f'Created {report["created"]} user(s); {len(report["errors"])} already existed or were invalid')
+
+
+async def login(url, username, password, timings, errors):
+    payload = json.dumps({"username": username, "password": password}).encode()
+    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    started = time.perf_counter()
+    try:
+        writer.write(
+            f'POST /api/auth/login/ HTTP/1.1\r\nHost: {url.netloc}\r\nConnection: close\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n'.encode() + payload
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        await reader.read()
+    finally:
+        writer.close()
+    timings.append(time.perf_counter() - started)
+    if status != 200:
+        errors.append(status)
+
+
+async def run(args):
+    url = urlsplit(args.base_url)
+    timings, errors = [], []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(i):
+        async with semaphore:
+            await login(url, USERNAME.format(i), args.password, timings, errors)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(args.users)))
+    return timings, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--setup', type=int, metavar='N', help='Create N benchmark users and exit')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--server-cores', type=int, default=os.cpu_count(), help='Cores available to the server')
+    args = parser.parse_args()
+
+    if args.setup:
+        setup_users(args.setup, args.password)
+        return
+    timings, errors, elapsed = asyncio.run(run(args))
+    rate = len(timings) / elapsed
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f'{len(timings)} logins in {elapsed:.2f}s: {rate:.1f}/s, {rate / args.server_cores:.1f}/s per core, '
+          f'median={statistics.median(timings) * 1000:.1f}ms p99={p99 * 1000:.1f}ms, {len(errors)} errors')
+
+
+if __name__ == '__main__':
+    main()
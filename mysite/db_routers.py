@@ -0,0 +1,103 @@
+"""Send safe API reads to the read replica, when one is configured.
+
+ReplicaRoutingMiddleware decides per request whether reads may use the
+replica and stores that in a context variable, which also follows the
+request into sync_to_async threads under ASGI. Management commands and
+anything outside a request always use the primary.
+
+After a client writes, its reads stick to the primary for
+QUIZZ_REPLICA_STICKY_SECONDS so it does not miss its own write on a
+lagging replica. The sticky marker is kept in the default cache, which
+must therefore be shared by all workers (not LocMemCache).
+
+Code that fills a cache entry keyed by an exam version (answer keys,
+papers, candidate lists) or otherwise cached from the database reads
+with ``.using(DEFAULT_DB_ALIAS)``: a lagging replica would store stale
+rows under the new version until the next bump.
+"""
+import hashlib
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_alias():
+    return getattr(settings, 'QUIZZ_READ_REPLICA', None)
+
+
+def sticky_key(request):
+    client = request.META.get('HTTP_AUTHORIZATION') or request.META.get('REMOTE_ADDR', '')
+    return 'db-sticky:' + hashlib.sha1(client.encode()).hexdigest()
+
+
+def _sticky_seconds():
+    return getattr(settings, 'QUIZZ_REPLICA_STICKY_SECONDS', 5)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction must see its own writes.
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica mirrors the primary, so rows from either may be related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        alias = replica_alias()
+        if alias is None:
+            return self.get_response(request)
+        key = sticky_key(request)
+        use_replica = request.method in SAFE_METHODS and cache.get(key) is None
+        token = _read_alias.set(alias if use_replica else None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            cache.set(key, 1, _sticky_seconds())
+        return response
+
+    async def __acall__(self, request):
+        alias = replica_alias()
+        if alias is None:
+            return await self.get_response(request)
+        key = sticky_key(request)
+        use_replica = request.method in SAFE_METHODS and await cache.aget(key) is None
+        token = _read_alias.set(alias if use_replica else None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            await cache.aset(key, 1, _sticky_seconds())
+        return response
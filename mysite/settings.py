@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 
 import cloudinary
 import cloudinary.uploader
@@ -59,12 +59,15 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'quizzMaster.authentication.RoleJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-
+    # Reverse proxies in front of the app. Throttles (the login limiter
+    # among them) trust only that many X-Forwarded-For entries; with 0 they
+    # key on REMOTE_ADDR, so clients cannot pick their own address.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
 AUTH_USER_MODEL = 'quizzMaster.User'
@@ -87,6 +90,45 @@ CLOUDINARY_STORAGE = {
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Where images embedded in imported DOCX files are uploaded.
+QUIZZ_IMAGE_STORAGE = config('QUIZZ_IMAGE_STORAGE', default='quizzMaster.images.CloudinaryImageStorage')
+QUIZZ_IMAGE_UPLOAD_WORKERS = config('QUIZZ_IMAGE_UPLOAD_WORKERS', default=4, cast=int)
+
+# Submissions are scored as (correct answers / questions) * QUIZZ_GRADING_SCALE.
+QUIZZ_GRADING_SCALE = config('QUIZZ_GRADING_SCALE', default=10, cast=float)
+
+# Candidates get questions in a per-candidate order; choices of questions
+# imported with "MIX CHOICES: Yes" are always shuffled.
+QUIZZ_SHUFFLE_QUESTIONS = config('QUIZZ_SHUFFLE_QUESTIONS', default=True, cast=bool)
+
+# "direct" saves submissions in the request; "log" appends them to
+# QUIZZ_SUBMISSION_LOG and answers 202, leaving the insert to the
+# drain_submissions command.
+QUIZZ_SUBMISSION_INGEST = config('QUIZZ_SUBMISSION_INGEST', default='direct')
+QUIZZ_SUBMISSION_LOG = config('QUIZZ_SUBMISSION_LOG', default=str(BASE_DIR / 'var' / 'submissions.log'))
+QUIZZ_SUBMISSION_LOG_FSYNC = config('QUIZZ_SUBMISSION_LOG_FSYNC', default=True, cast=bool)
+
+# Autosaved answers are kept in the cache and written to SubmissionDraft at
+# most once per QUIZZ_DRAFT_FLUSH_INTERVAL seconds per candidate.
+QUIZZ_DRAFT_FLUSH_INTERVAL = config('QUIZZ_DRAFT_FLUSH_INTERVAL', default=60, cast=int)
+QUIZZ_DRAFT_CACHE_TIMEOUT = config('QUIZZ_DRAFT_CACHE_TIMEOUT', default=6 * 60 * 60, cast=int)
+
+# Imports link questions already in the subject's bank instead of copying
+# them: exact copies always, near copies (estimated Jaccard similarity of at
+# least QUIZZ_DEDUPE_THRESHOLD and the same correct answer) unless
+# QUIZZ_DEDUPE_NEAR is off.
+QUIZZ_DEDUPE_NEAR = config('QUIZZ_DEDUPE_NEAR', default=True, cast=bool)
+QUIZZ_DEDUPE_THRESHOLD = config('QUIZZ_DEDUPE_THRESHOLD', default=0.9, cast=float)
+
+# Processes used to render DOCX papers; 0 renders in the request thread.
+QUIZZ_RENDER_WORKERS = config('QUIZZ_RENDER_WORKERS', default=4, cast=int)
+# Processes hashing passwords when the import worker or the provision_users
+# command provisions users; 0 hashes in the calling process. A web upload of
+# more than QUIZZ_PROVISION_INLINE_ROWS users is queued for the import
+# worker, smaller ones are hashed in the request without a pool.
+QUIZZ_HASH_WORKERS = config('QUIZZ_HASH_WORKERS', default=2, cast=int)
+QUIZZ_PROVISION_INLINE_ROWS = config('QUIZZ_PROVISION_INLINE_ROWS', default=20, cast=int)
+
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -98,6 +140,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
+    'mysite.db_routers.ReplicaRoutingMiddleware',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -134,8 +177,42 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default=''),
         'HOST': config('DB_HOST', default='127.0.0.1'),
         'PORT': config('DB_PORT', default='3306'),
+        # Keep connections open across requests; health checks replace a
+        # connection the server closed before it is reused. WSGI only:
+        # mysite/asgi.py sets it back to 0.
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+    }
+}
+
+# Optional read replica. Safe API reads go there (see mysite/db_routers.py)
+# unless the client wrote within the last QUIZZ_REPLICA_STICKY_SECONDS.
+# That marker lives in the default cache, so a replica requires a shared
+# CACHE_BACKEND.
+QUIZZ_READ_REPLICA = None
+QUIZZ_REPLICA_STICKY_SECONDS = config('DB_REPLICA_STICKY_SECONDS', default=5, cast=int)
+if config('DB_REPLICA_HOST', default=''):
+    QUIZZ_READ_REPLICA = 'replica'
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': config('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'USER': config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'HOST': config('DB_REPLICA_HOST'),
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['mysite.db_routers.ReplicaRouter']
+
 
+# Cache
+# Exam papers and answer keys are cached and invalidated through version
+# tokens, so every worker process must share the same cache in production.
 
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
     }
 }
 
@@ -143,6 +220,31 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# The first hasher hashes new passwords; the others only verify old hashes,
+# which are rehashed on the next successful login. The PBKDF2 iteration
+# count is per deployment as well.
+PASSWORD_HASHERS = config(
+    'QUIZZ_PASSWORD_HASHERS',
+    default=','.join([
+        'quizzMaster.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ]),
+    cast=Csv(),
+)
+QUIZZ_PASSWORD_ITERATIONS = config('QUIZZ_PASSWORD_ITERATIONS', default=870000, cast=int)
+
+# Login attempts allowed per username from one client IP and per client
+# IP: (burst, refill per second), kept per worker process.
+QUIZZ_LOGIN_BUCKETS = {
+    'username': (config('QUIZZ_LOGIN_USER_BURST', default=5, cast=int),
+                 config('QUIZZ_LOGIN_USER_RATE', default=1 / 30, cast=float)),
+    'ip': (config('QUIZZ_LOGIN_IP_BURST', default=300, cast=int),
+           config('QUIZZ_LOGIN_IP_RATE', default=20, cast=float)),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
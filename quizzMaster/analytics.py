@@ -0,0 +1,217 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .grading import get_answer_key
+from .models import ExamItemStats, QuestionStats, Submission
+
+
+def _point_biserial(n, sum_x, sum_y, sum_xy, sum_yy):
+    """Correlation of a 0/1 item score with the total score, from running sums."""
+    n, sum_x, sum_y, sum_xy, sum_yy = (np.asarray(v, dtype=float) for v in (n, sum_x, sum_y, sum_xy, sum_yy))
+    denominator = np.sqrt((n * sum_x - sum_x ** 2) * (n * sum_yy - sum_y ** 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = (n * sum_xy - sum_x * sum_y) / denominator
+    return np.where(denominator > 0, r, np.nan)
+
+
+def _kr20(num_items, n, p_values, sum_y, sum_yy):
+    if num_items < 2 or n == 0:
+        return None
+    variance = sum_yy / n - (sum_y / n) ** 2
+    if variance <= 0:
+        return None
+    return float(num_items / (num_items - 1) * (1 - np.sum(p_values * (1 - p_values)) / variance))
+
+
+def _none_if_nan(value):
+    return None if value is None or np.isnan(value) else float(value)
+
+
+def _accumulate(key, rows):
+    """Sums contributed by a batch of ``(id, user_id, answers, updated_at)`` rows."""
+    responses = key.encode_many([row[2] for row in rows], [row[1] for row in rows])
+    correct = key.correct_matrix(responses)
+    totals = correct.sum(axis=1).astype(float)
+
+    width = key.correct.shape[1]
+    answered = responses >= 0
+    cells = (np.arange(key.num_questions) * width + responses)[answered]
+    choice_counts = np.bincount(cells, minlength=key.num_questions * width).reshape(key.num_questions, width)
+
+    return {
+        "n": len(rows),
+        "correct": correct.sum(axis=0),
+        "correct_total": (correct * totals[:, None]).sum(axis=0),
+        "choice_counts": choice_counts,
+        "total": totals.sum(),
+        "total_sq": (totals ** 2).sum(),
+    }
+
+
+def _folded_submissions_changed(exam_stats):
+    """Whether submissions already folded in were edited or deleted since.
+
+    A regrade or delete changes the count or the newest updated_at of the
+    submissions up to the watermark, and so does a lower id that committed
+    after a higher one had been folded.
+    """
+    seen = Submission.objects.filter(
+        exam_id=exam_stats.exam_id, id__lte=exam_stats.last_submission_id
+    ).aggregate(count=Count('pk'), last=Max('updated_at'))
+    return seen["count"] != exam_stats.submissions or seen["last"] != exam_stats.last_submission_updated_at
+
+
+def update_exam_stats(exam_id, full=False, batch_size=5000):
+    """Fold submissions newer than the last run into the exam's item stats.
+
+    A change of answer key, an edit or delete of a submission already
+    folded in (or ``full=True``) recomputes from scratch. Returns the
+    number of submissions processed.
+    """
+    key = get_answer_key(exam_id)
+    fingerprint = key.fingerprint()
+    width = key.correct.shape[1]
+
+    with transaction.atomic():
+        exam_stats, _ = ExamItemStats.objects.select_for_update().get_or_create(exam_id=exam_id)
+        if full or exam_stats.answer_key_fingerprint != fingerprint or _folded_submissions_changed(exam_stats):
+            QuestionStats.objects.filter(exam_id=exam_id).delete()
+            exam_stats.answer_key_fingerprint = fingerprint
+            exam_stats.last_submission_id = 0
+            exam_stats.last_submission_updated_at = None
+            exam_stats.submissions = 0
+            exam_stats.total_sum = exam_stats.total_sq_sum = 0
+
+        existing = {stats.question_id: stats for stats in QuestionStats.objects.filter(exam_id=exam_id)}
+        def column(field):
+            return np.array([getattr(existing[q], field) if q in existing else 0 for q in key.question_ids], dtype=float)
+
+        n = column('responses')
+        correct = column('correct')
+        correct_total = column('correct_total_sum')
+        choice_counts = np.zeros((key.num_questions, width), dtype=np.int64)
+        for q, question_id in enumerate(key.question_ids):
+            if question_id in existing:
+                counts = existing[question_id].choice_counts
+                for c, choice_id in enumerate(key.choice_ids[q]):
+                    choice_counts[q, c] = counts.get(str(choice_id), 0)
+
+        processed = 0
+        submissions = (
+            Submission.objects.filter(exam_id=exam_id, id__gt=exam_stats.last_submission_id)
+            .order_by('id')
+            .values_list('id', 'user_id', 'answers', 'updated_at')
+            .iterator(chunk_size=batch_size)
+        )
+        batch = []
+        for row in submissions:
+            batch.append(row)
+            if len(batch) < batch_size:
+                continue
+            processed += _fold(exam_stats, key, batch, n, correct, correct_total, choice_counts)
+            batch = []
+        if batch:
+            processed += _fold(exam_stats, key, batch, n, correct, correct_total, choice_counts)
+
+        p_values = np.divide(correct, n, out=np.full_like(correct, np.nan), where=n > 0)
+        point_biserial = _point_biserial(n, correct, exam_stats.total_sum, correct_total, exam_stats.total_sq_sum)
+        exam_stats.kr20 = _kr20(
+            key.num_questions, exam_stats.submissions, np.nan_to_num(p_values), exam_stats.total_sum, exam_stats.total_sq_sum
+        )
+        exam_stats.save()
+
+        to_create, to_update = [], []
+        for q, question_id in enumerate(key.question_ids):
+            stats = existing.get(question_id) or QuestionStats(exam_id=exam_id, question_id=question_id)
+            stats.responses = int(n[q])
+            stats.correct = int(correct[q])
+            stats.correct_total_sum = float(correct_total[q])
+            stats.choice_counts = {str(choice_id): int(choice_counts[q, c]) for c, choice_id in enumerate(key.choice_ids[q])}
+            stats.p_value = _none_if_nan(p_values[q])
+            stats.point_biserial = _none_if_nan(point_biserial[q])
+            stats.distractor_rates = {
+                str(choice_id): float(choice_counts[q, c] / n[q])
+                for c, choice_id in enumerate(key.choice_ids[q])
+                if n[q] and not key.correct[q, c]
+            }
+            (to_update if stats.pk else to_create).append(stats)
+        QuestionStats.objects.bulk_create(to_create, batch_size=1000)
+        QuestionStats.objects.bulk_update(
+            to_update,
+            ['responses', 'correct', 'correct_total_sum', 'choice_counts', 'p_value', 'point_biserial', 'distractor_rates'],
+            batch_size=1000,
+        )
+    return processed
+
+
+def _fold(exam_stats, key, rows, n, correct, correct_total, choice_counts):
+    sums = _accumulate(key, rows)
+    n += sums["n"]
+    correct += sums["correct"]
+    correct_total += sums["correct_total"]
+    choice_counts += sums["choice_counts"]
+    exam_stats.submissions += sums["n"]
+    exam_stats.total_sum += float(sums["total"])
+    exam_stats.total_sq_sum += float(sums["total_sq"])
+    exam_stats.last_submission_id = rows[-1][0]
+    newest = max(row[3] for row in rows)
+    if exam_stats.last_submission_updated_at is None or newest > exam_stats.last_submission_updated_at:
+        exam_stats.last_submission_updated_at = newest
+    return len(rows)
+
+
+def exam_item_report(exam_id):
+    exam_stats = ExamItemStats.objects.filter(exam_id=exam_id).first()
+    questions = QuestionStats.objects.filter(exam_id=exam_id).order_by('question_id')
+    return {
+        "exam": exam_id,
+        "submissions": exam_stats.submissions if exam_stats else 0,
+        "kr20": exam_stats.kr20 if exam_stats else None,
+        "questions": [
+            {
+                "question": stats.question_id,
+                "responses": stats.responses,
+                "p_value": stats.p_value,
+                "point_biserial": stats.point_biserial,
+                "choice_counts": stats.choice_counts,
+                "distractor_rates": stats.distractor_rates,
+            }
+            for stats in questions
+        ],
+    }
+
+
+def subject_item_report(subject_id):
+    """Pool the materialized stats of every exam of a subject, per question.
+
+    The totals of each exam enter the discrimination index of the questions
+    it contains, so no submissions are read.
+    """
+    exam_totals = {
+        stats.exam_id: stats
+        for stats in ExamItemStats.objects.filter(exam__subject_id=subject_id)
+    }
+    pooled = {}
+    for stats in QuestionStats.objects.filter(exam_id__in=list(exam_totals)):
+        exam_stats = exam_totals[stats.exam_id]
+        entry = pooled.setdefault(stats.question_id, np.zeros(5))
+        entry += (stats.responses, stats.correct, exam_stats.total_sum, stats.correct_total_sum, exam_stats.total_sq_sum)
+
+    question_ids = sorted(pooled)
+    sums = np.array([pooled[q] for q in question_ids]).reshape(-1, 5)
+    n, correct, total, correct_total, total_sq = sums.T
+    p_values = np.divide(correct, n, out=np.full_like(correct, np.nan), where=n > 0)
+    point_biserial = _point_biserial(n, correct, total, correct_total, total_sq)
+    return {
+        "subject": subject_id,
+        "questions": [
+            {
+                "question": question_id,
+                "responses": int(n[i]),
+                "p_value": _none_if_nan(p_values[i]),
+                "point_biserial": _none_if_nan(point_biserial[i]),
+            }
+            for i, question_id in enumerate(question_ids)
+        ],
+    }
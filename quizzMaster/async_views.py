@@ -0,0 +1,141 @@
+"""Async endpoints for candidates taking an exam.
+
+These are plain Django async views rather than DRF viewsets, so under ASGI
+a waiting request holds no thread. They mirror ExamViewSet.paper,
+ExamViewSet.draft and SubmissionViewSet.create, and read through the same
+caches.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
+from django.utils.timezone import now
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .authentication import RoleJWTAuthentication
+from .drafts import asave_draft, atake_draft
+from .grading import aget_answer_key
+from .ingest import INGEST_LOG, aclaim_submission, append_submission, ingest_mode, release_submission
+from .models import Exam, Submission, SubmissionDraft
+from .papers import aget_candidate_paper_bytes, aget_paper_bytes
+from .permissions import role_name
+from .prewarm import exam_is_open_to
+from .scheduling import aexam_windows, time_remaining
+from .serializers import ALREADY_SUBMITTED
+
+
+def _error(message, status):
+    return JsonResponse({'message': message, 'status': 'error'}, status=status)
+
+
+def _authenticated(candidates_only=False):
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                result = await RoleJWTAuthentication().aauthenticate(request)
+            except (AuthenticationFailed, InvalidToken, TokenError) as e:
+                return _error(str(getattr(e, 'detail', e)), 401)
+            if result is None:
+                return _error('Authentication credentials were not provided.', 401)
+            request.user = result[0]
+            if candidates_only and role_name(request.user) != 'Candidate':
+                return _error('You do not have permission to perform this action.', 403)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@require_http_methods(['GET'])
+@_authenticated()
+async def exam_paper(request, exam_id):
+    try:
+        if role_name(request.user) == 'Candidate':
+            if not await sync_to_async(exam_is_open_to)(exam_id, request.user.id):
+                return _error('This exam is not open to you', 403)
+            paper = await aget_candidate_paper_bytes(exam_id, request.user.id)
+        else:
+            paper = await aget_paper_bytes(exam_id)
+    except Exam.DoesNotExist:
+        return _error('Exam not found', 404)
+    return HttpResponse(paper, content_type='application/json')
+
+
+@csrf_exempt
+@require_http_methods(['PATCH'])
+@_authenticated(candidates_only=True)
+async def exam_draft(request, exam_id):
+    key = await aget_answer_key(exam_id)
+    if not key.num_questions:
+        return _error('Exam not found', 404)
+    if not await sync_to_async(exam_is_open_to)(exam_id, request.user.id):
+        return _error('This exam is not open to you', 403)
+    data = _json_body(request)
+    delta = data.get('answers') if data else None
+    if not isinstance(delta, dict):
+        return JsonResponse({"answers": ["Answers must map question ids to choice ids or options."]}, status=400)
+    unknown = [question_id for question_id in delta if not str(question_id).isdigit()
+               or int(question_id) not in key.question_index]
+    if unknown:
+        return JsonResponse({"answers": [f"Questions not in this exam: {', '.join(map(str, unknown))}"]}, status=400)
+    answers = await asave_draft(exam_id, request.user.id, delta)
+    return JsonResponse({"saved": len(delta), "answered": len(answers)})
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+@_authenticated(candidates_only=True)
+async def exam_submit(request, exam_id):
+    key = await aget_answer_key(exam_id)
+    if not key.num_questions:
+        return _error('Exam not found', 404)
+    if not await sync_to_async(exam_is_open_to)(exam_id, request.user.id):
+        return _error('This exam is not open to you', 403)
+    data = _json_body(request)
+    submitted = data.get('answers', {}) if data else None
+    if not isinstance(submitted, dict):
+        return JsonResponse({"answers": ["Answers must map question ids to choice ids or options."]}, status=400)
+
+    user_id = request.user.id
+    logged = ingest_mode() == INGEST_LOG
+    if logged and not await aclaim_submission(exam_id, user_id):
+        return JsonResponse({"exam_id": [ALREADY_SUBMITTED]}, status=400)
+    answers = {**await atake_draft(exam_id, user_id), **submitted}
+    score = key.score(answers, user_id)
+    if logged:
+        try:
+            # fsync blocks, so keep it off the event loop.
+            await sync_to_async(append_submission, thread_sensitive=False)(exam_id, user_id, answers, score)
+        except Exception:
+            await sync_to_async(release_submission)(exam_id, user_id)
+            raise
+        return JsonResponse({"status": "accepted", "exam_id": exam_id}, status=202)
+
+    try:
+        submission = await Submission.objects.acreate(exam_id=exam_id, user_id=user_id, answers=answers, score=score)
+    except IntegrityError:
+        return JsonResponse({"exam_id": [ALREADY_SUBMITTED]}, status=400)
+    await SubmissionDraft.objects.filter(exam_id=exam_id, user_id=user_id).adelete()
+    return JsonResponse({"id": submission.id, "exam_id": exam_id, "score": score}, status=201)
+
+
+@require_http_methods(['GET'])
+@_authenticated()
+async def exam_time_remaining(request, exam_id):
+    remaining = time_remaining(await aexam_windows(exam_id), now())
+    if remaining is None:
+        return _error('No upcoming schedule for this exam', 404)
+    return JsonResponse(remaining)
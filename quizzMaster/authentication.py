@@ -0,0 +1,110 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+ROLE_CLAIM = 'role'
+ROLE_VERSION_CLAIM = 'role_version'
+
+
+def role_version_key(user_id):
+    return f'role-version:{user_id}'
+
+
+def _stamp_timeout():
+    # Access tokens expire on their own, so a stamp only needs to outlive
+    # the longest access token.
+    return int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+def publish_role_version(user_id, version):
+    """Make tokens issued before ``version`` fail authentication."""
+    cache.set(role_version_key(user_id), version, _stamp_timeout())
+
+
+def load_role_version(user_id):
+    """The user's role version, from the cache or else the database.
+
+    A stamp read from the database is only added, never overwrites, so a
+    concurrent publish_role_version wins. Returns None for unknown users.
+    """
+    key = role_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = User.objects.filter(pk=user_id).values_list('role_version', flat=True).first()
+        if version is not None:
+            cache.add(key, version, _stamp_timeout())
+    return version
+
+
+def tokens_for_user(user):
+    # Seed the stamp so requests with the new tokens need no lookup.
+    cache.add(role_version_key(user.pk), user.role_version, _stamp_timeout())
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.username
+    refresh[ROLE_CLAIM] = user.role.name
+    refresh[ROLE_VERSION_CLAIM] = user.role_version
+    return refresh
+
+
+class TokenRole:
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+class RoleTokenUser(TokenUser):
+    """Authenticated user built from token claims, without a database row."""
+
+    @cached_property
+    def role(self):
+        return TokenRole(self.token.get(ROLE_CLAIM))
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    """JWT authentication that trusts the role claim instead of loading the user.
+
+    The token's role version is checked against a cached stamp, which is
+    read from the user row when the cache does not have it. Tokens issued
+    before role claims existed fall back to a database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token or api_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        self._check_role_version(validated_token, load_role_version(validated_token[api_settings.USER_ID_CLAIM]))
+        return RoleTokenUser(validated_token)
+
+    def _check_role_version(self, validated_token, current_version):
+        if current_version is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if current_version != validated_token.get(ROLE_VERSION_CLAIM):
+            raise AuthenticationFailed('Role has changed, please log in again', code='role_changed')
+
+    async def aauthenticate(self, request):
+        """Async counterpart of ``authenticate`` for plain Django async views."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if ROLE_CLAIM not in validated_token or api_settings.USER_ID_CLAIM not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token), validated_token
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        version = await cache.aget(role_version_key(user_id))
+        if version is None:
+            version = await sync_to_async(load_role_version)(user_id)
+        self._check_role_version(validated_token, version)
+        return RoleTokenUser(validated_token), validated_token
@@ -0,0 +1,338 @@
+"""Duplicate detection for the question bank.
+
+A question is identified by its folded text, labelled choices and correct
+choice texts:
+
+* ``fingerprint`` is a SHA-256 of that content, indexed per subject, and
+  finds exact copies (case, accents and punctuation aside). Option labels
+  are part of it, so answers given as letters stay valid after a merge.
+* ``minhash`` is a MinHash signature of word shingles. Signatures are
+  split into LSH bands, stored in QuestionBand, so near copies are found
+  by looking up the buckets of the new questions, without reading the
+  rest of the bank. Candidates must also have the same correct answers.
+"""
+import hashlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import (
+    Choice, CorrectAnswer, ExamItemStats, ExamQuestion, Question, QuestionBand, QuestionStats, Submission,
+)
+from .search import fold
+from .versioning import bump_exam_versions
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+DEFAULT_NEAR_THRESHOLD = 0.9
+DEDUPE_BATCH_SIZE = 500
+
+_PRIME = (1 << 31) - 1
+_A, _B = np.random.default_rng(20250101).integers(1, _PRIME, size=(2, NUM_PERM, 1), dtype=np.uint64)
+
+
+def near_threshold():
+    return getattr(settings, 'QUIZZ_DEDUPE_THRESHOLD', DEFAULT_NEAR_THRESHOLD)
+
+
+def fingerprint(question_text, choices, correct_texts):
+    """``choices`` are ``(option, choice_text)`` pairs."""
+    content = '\x1e'.join([
+        fold(question_text),
+        '\x1f'.join(sorted(f'{fold(option)}:{fold(text)}' for option, text in choices)),
+        '\x1f'.join(sorted(fold(text) for text in correct_texts)),
+    ])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def answer_key_of(correct_texts):
+    return tuple(sorted(fold(text) for text in correct_texts))
+
+
+def shingles(question_text, choice_texts):
+    words = fold(question_text).split()
+    result = {' '.join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+    result.update('choice:' + fold(text) for text in choice_texts)
+    return result
+
+
+def minhash(items):
+    """MinHash signature of a set of strings, as bytes."""
+    if not items:
+        return b''
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big') % _PRIME for item in items],
+        dtype=np.uint64,
+    )
+    return ((_A * hashes + _B) % _PRIME).min(axis=1).astype(np.uint32).tobytes()
+
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two signatures."""
+    a = np.frombuffer(signature_a, dtype=np.uint32)
+    b = np.frombuffer(signature_b, dtype=np.uint32)
+    return float((a == b).mean())
+
+
+def band_buckets(signature):
+    """``(band, bucket)`` pairs of a signature; a bucket is the band's rows in hex."""
+    return [(band, signature[band * ROWS * 4:(band + 1) * ROWS * 4].hex()) for band in range(BANDS)]
+
+
+class LSHIndex:
+    """In-memory bands, for comparing a whole subject with itself."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    _bands = staticmethod(band_buckets)
+
+    def add(self, key, signature):
+        for band in self._bands(signature):
+            self.buckets.setdefault(band, []).append(key)
+
+    def candidates(self, signature):
+        found = set()
+        for band in self._bands(signature):
+            found.update(self.buckets.get(band, ()))
+        return found
+
+
+def identify(question_text, choices, correct_texts):
+    """``(fingerprint, minhash)`` of question content."""
+    return (
+        fingerprint(question_text, choices, correct_texts),
+        minhash(shingles(question_text, [text for _, text in choices])),
+    )
+
+
+def _contents(question_ids):
+    """``{question_id: (question_text, [(option, choice_text)], correct_texts)}``."""
+    contents = {
+        question_id: (question_text, [], [])
+        for question_id, question_text in Question.objects.filter(id__in=question_ids).values_list('id', 'question_text')
+    }
+    for question_id, option, choice_text in (
+        Choice.objects.filter(question_id__in=question_ids).order_by('question_id', 'option', 'id')
+        .values_list('question_id', 'option', 'choice_text')
+    ):
+        contents[question_id][1].append((option, choice_text))
+    for question_id, choice_text in (
+        CorrectAnswer.objects.filter(question_id__in=question_ids).values_list('question_id', 'choice__choice_text')
+    ):
+        contents[question_id][2].append(choice_text)
+    return contents
+
+
+def store_bands(questions):
+    """Replace the stored bands of ``(question_id, subject_id, signature)`` rows."""
+    questions = list(questions)
+    QuestionBand.objects.filter(question_id__in=[question_id for question_id, _, _ in questions]).delete()
+    QuestionBand.objects.bulk_create(
+        [
+            QuestionBand(question_id=question_id, subject_id=subject_id, band=band, bucket=bucket)
+            for question_id, subject_id, signature in questions if signature
+            for band, bucket in band_buckets(bytes(signature))
+        ],
+        batch_size=DEDUPE_BATCH_SIZE,
+    )
+
+
+def refresh_fingerprints(question_ids):
+    question_ids = list(question_ids)
+    for start in range(0, len(question_ids), DEDUPE_BATCH_SIZE):
+        batch = question_ids[start:start + DEDUPE_BATCH_SIZE]
+        contents = _contents(batch)
+        subjects = dict(Question.objects.filter(id__in=batch).values_list('id', 'subject_id'))
+        updated = []
+        for question_id, content in contents.items():
+            question_fingerprint, signature = identify(*content)
+            updated.append(Question(id=question_id, fingerprint=question_fingerprint, minhash=signature))
+        Question.objects.bulk_update(updated, ['fingerprint', 'minhash'])
+        store_bands((question.id, subjects[question.id], question.minhash) for question in updated)
+
+
+def _answer_keys(question_ids):
+    keys = {question_id: [] for question_id in question_ids}
+    for question_id, choice_text in (
+        CorrectAnswer.objects.filter(question_id__in=question_ids).values_list('question_id', 'choice__choice_text')
+    ):
+        keys[question_id].append(choice_text)
+    return {question_id: answer_key_of(texts) for question_id, texts in keys.items()}
+
+
+def find_existing(subject_id, items, near=True):
+    """Match imported questions against the subject's bank.
+
+    ``items`` are ``(fingerprint, minhash, answer_key)`` tuples. Returns one
+    ``(question_id, kind, similarity)`` per item, or None when it is new.
+    """
+    matches = [None] * len(items)
+    exact = {}
+    for question_fingerprint, question_id in (
+        Question.objects.filter(subject_id=subject_id, fingerprint__in={item[0] for item in items})
+        .order_by('-id').values_list('fingerprint', 'id')
+    ):
+        exact[question_fingerprint] = question_id
+    for i, item in enumerate(items):
+        if item[0] in exact:
+            matches[i] = (exact[item[0]], 'exact', 1.0)
+    if not near:
+        return matches
+
+    wanted = {}
+    for i, (_, signature, _) in enumerate(items):
+        if matches[i] is None and signature:
+            for band, bucket in band_buckets(signature):
+                wanted.setdefault(band, set()).add(bucket)
+    if not wanted:
+        return matches
+    lookup = Q()
+    for band, buckets in wanted.items():
+        lookup |= Q(band=band, bucket__in=buckets)
+    bucketed, signatures = {}, {}
+    for question_id, band, bucket, signature in (
+        QuestionBand.objects.filter(lookup, subject_id=subject_id)
+        .values_list('question_id', 'band', 'bucket', 'question__minhash')
+    ):
+        bucketed.setdefault((band, bucket), set()).add(question_id)
+        signatures[question_id] = bytes(signature)
+
+    threshold = near_threshold()
+    scored = {}
+    for i, (_, signature, _) in enumerate(items):
+        if matches[i] is None and signature:
+            candidates = set().union(*(bucketed.get(band, ()) for band in band_buckets(signature)))
+            best = [(similarity(signature, signatures[question_id]), question_id) for question_id in candidates]
+            scored[i] = sorted((pair for pair in best if pair[0] >= threshold), reverse=True)
+    candidate_ids = {question_id for pairs in scored.values() for _, question_id in pairs}
+    answer_keys = _answer_keys(candidate_ids) if candidate_ids else {}
+    for i, pairs in scored.items():
+        for score, question_id in pairs:
+            if answer_keys.get(question_id) == items[i][2]:
+                matches[i] = (question_id, 'near', score)
+                break
+    return matches
+
+
+def duplicate_groups(subject_id, near=False):
+    """Groups of question ids with the same content, oldest first.
+
+    Only exact groups are safe to merge; near groups are for review.
+    """
+    groups = {}
+    for question_id, question_fingerprint in (
+        Question.objects.filter(subject_id=subject_id).exclude(fingerprint='').order_by('id')
+        .values_list('id', 'fingerprint')
+    ):
+        groups.setdefault(question_fingerprint, []).append(question_id)
+    exact = [ids for ids in groups.values() if len(ids) > 1]
+    if not near:
+        return exact, []
+
+    canonical = [ids[0] for ids in groups.values()]
+    rows = dict(Question.objects.filter(id__in=canonical).values_list('id', 'minhash'))
+    answer_keys = _answer_keys(canonical)
+    index = LSHIndex()
+    near_groups = []
+    threshold = near_threshold()
+    for question_id in canonical:
+        signature = bytes(rows[question_id])
+        if not signature:
+            continue
+        similar = sorted(
+            other for other in index.candidates(signature)
+            if similarity(signature, bytes(rows[other])) >= threshold and answer_keys[other] == answer_keys[question_id]
+        )
+        if similar:
+            near_groups.append(similar + [question_id])
+        index.add(question_id, signature)
+    return exact, near_groups
+
+
+def merge_duplicates(groups):
+    """Fold each group of exact duplicates into its first (oldest) question.
+
+    Exam links move to the kept question and affected submissions are
+    rewritten to the kept question and choice ids. The duplicates' own
+    choices and correct answers are deleted with them; the kept question
+    has the same answer key, since exact fingerprints include it. The item
+    statistics of the affected exams are reset. The questions are locked
+    for the duration, and ids that no longer exist are skipped. Returns
+    the number of questions removed.
+    """
+    groups = [group for group in groups if len(group) > 1]
+    if not groups:
+        return 0
+    all_ids = [question_id for group in groups for question_id in group]
+
+    with transaction.atomic():
+        existing = set(
+            Question.objects.select_for_update().filter(id__in=all_ids).order_by('id').values_list('id', flat=True)
+        )
+        keep_of = {}
+        for group in groups:
+            group = [question_id for question_id in group if question_id in existing]
+            keep_of.update((duplicate, group[0]) for duplicate in group[1:])
+        if not keep_of:
+            return 0
+
+        choices = {}
+        for choice_id, question_id, choice_text in (
+            Choice.objects.filter(question_id__in=all_ids).order_by('option', 'id')
+            .values_list('id', 'question_id', 'choice_text')
+        ):
+            choices.setdefault(question_id, []).append((fold(choice_text), choice_id))
+        choice_map = {}
+        for duplicate, keep in keep_of.items():
+            available = {}
+            for text, choice_id in choices.get(keep, ()):
+                available.setdefault(text, []).append(choice_id)
+            for text, choice_id in choices.get(duplicate, ()):
+                if available.get(text):
+                    choice_map[choice_id] = available[text].pop(0)
+
+        links = list(ExamQuestion.objects.filter(question_id__in=all_ids).values_list('id', 'exam_id', 'question_id'))
+        affected_exams = {exam_id for _, exam_id, question_id in links if question_id in keep_of}
+        linked = {(exam_id, question_id) for _, exam_id, question_id in links if question_id not in keep_of}
+        moved, dropped = [], []
+        for link_id, exam_id, question_id in links:
+            if question_id not in keep_of:
+                continue
+            target = (exam_id, keep_of[question_id])
+            if target in linked:
+                dropped.append(link_id)
+            else:
+                linked.add(target)
+                moved.append(ExamQuestion(id=link_id, question_id=target[1]))
+        ExamQuestion.objects.filter(id__in=dropped).delete()
+        ExamQuestion.objects.bulk_update(moved, ['question'], batch_size=DEDUPE_BATCH_SIZE)
+
+        _rewrite_answers(affected_exams, keep_of, choice_map)
+        QuestionStats.objects.filter(exam_id__in=affected_exams).delete()
+        ExamItemStats.objects.filter(exam_id__in=affected_exams).delete()
+        Question.objects.filter(id__in=list(keep_of)).delete()
+        transaction.on_commit(lambda: bump_exam_versions(affected_exams))
+    return len(keep_of)
+
+
+def _rewrite_answers(exam_ids, keep_of, choice_map):
+    keep_of = {str(duplicate): str(keep) for duplicate, keep in keep_of.items()}
+    changed = []
+    for submission_id, answers in (
+        Submission.objects.filter(exam_id__in=exam_ids).values_list('id', 'answers').iterator(chunk_size=2000)
+    ):
+        if not isinstance(answers, dict) or not keep_of.keys() & answers.keys():
+            continue
+        rewritten = {}
+        for question_id, answer in answers.items():
+            if question_id in keep_of:
+                question_id = keep_of[question_id]
+                if isinstance(answer, int) or (isinstance(answer, str) and answer.isdigit()):
+                    answer = choice_map.get(int(answer), answer)
+            rewritten[question_id] = answer
+        changed.append(Submission(id=submission_id, answers=rewritten))
+    Submission.objects.bulk_update(changed, ['answers'], batch_size=1000)
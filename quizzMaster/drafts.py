@@ -0,0 +1,111 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import SubmissionDraft
+
+DEFAULT_DRAFT_FLUSH_INTERVAL = 60
+DEFAULT_DRAFT_CACHE_TIMEOUT = 6 * 60 * 60
+
+
+def draft_key(exam_id, user_id):
+    return f'draft:{exam_id}:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'QUIZZ_DRAFT_CACHE_TIMEOUT', DEFAULT_DRAFT_CACHE_TIMEOUT)
+
+
+def _new_state(answers):
+    return {"answers": answers or {}, "flushed_at": time.time()}
+
+
+def _state(exam_id, user_id):
+    state = cache.get(draft_key(exam_id, user_id))
+    if state is None:
+        state = _new_state(
+            SubmissionDraft.objects.using(DEFAULT_DB_ALIAS).filter(exam_id=exam_id, user_id=user_id)
+            .values_list('answers', flat=True).first()
+        )
+    return state
+
+
+async def _astate(exam_id, user_id):
+    state = await cache.aget(draft_key(exam_id, user_id))
+    if state is None:
+        state = _new_state(
+            await SubmissionDraft.objects.using(DEFAULT_DB_ALIAS).filter(exam_id=exam_id, user_id=user_id)
+            .values_list('answers', flat=True).afirst()
+        )
+    return state
+
+
+def _merge(state, delta):
+    """Apply a delta and say whether the draft is due for a database write."""
+    answers = state["answers"]
+    for question_id, answer in delta.items():
+        if answer is None:
+            answers.pop(str(question_id), None)
+        else:
+            answers[str(question_id)] = answer
+    interval = getattr(settings, 'QUIZZ_DRAFT_FLUSH_INTERVAL', DEFAULT_DRAFT_FLUSH_INTERVAL)
+    return time.time() - state["flushed_at"] >= interval
+
+
+def _flushed(state):
+    state["flushed_at"] = time.time()
+
+
+def load_draft(exam_id, user_id):
+    state = _state(exam_id, user_id)
+    cache.set(draft_key(exam_id, user_id), state, _timeout())
+    return state["answers"]
+
+
+def save_draft(exam_id, user_id, delta):
+    """Merge ``{question_id: answer or None}`` into the candidate's draft.
+
+    Deltas are coalesced in the cache; the database row is only rewritten
+    when the previous write is older than QUIZZ_DRAFT_FLUSH_INTERVAL.
+    """
+    state = _state(exam_id, user_id)
+    if _merge(state, delta):
+        SubmissionDraft.objects.update_or_create(exam_id=exam_id, user_id=user_id, defaults={"answers": state["answers"]})
+        _flushed(state)
+    cache.set(draft_key(exam_id, user_id), state, _timeout())
+    return state["answers"]
+
+
+def take_draft(exam_id, user_id):
+    """Pop the draft so a final submission can include it.
+
+    Falls back to the last flushed row when the cache has lost the draft
+    (eviction, timeout, or another worker's local cache). The row is left
+    for the caller (or the submission drainer) to delete together with
+    the submission insert, after it has been read here.
+    """
+    state = _state(exam_id, user_id)
+    cache.delete(draft_key(exam_id, user_id))
+    return state["answers"]
+
+
+async def asave_draft(exam_id, user_id, delta):
+    """Async variant of save_draft."""
+    key = draft_key(exam_id, user_id)
+    state = await _astate(exam_id, user_id)
+    if _merge(state, delta):
+        await SubmissionDraft.objects.aupdate_or_create(
+            exam_id=exam_id, user_id=user_id, defaults={"answers": state["answers"]}
+        )
+        _flushed(state)
+    await cache.aset(key, state, _timeout())
+    return state["answers"]
+
+
+async def atake_draft(exam_id, user_id):
+    """Async variant of take_draft."""
+    state = await _astate(exam_id, user_id)
+    await cache.adelete(draft_key(exam_id, user_id))
+    return state["answers"]
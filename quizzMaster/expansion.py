@@ -0,0 +1,72 @@
+"""Sparse fieldsets (``?fields=``) and relation expansion (``?expand=``).
+
+Relations listed in a serializer's ``expandable_fields`` are primary keys
+unless expanded. Expanding one nests its serializer and makes the viewset
+load it with the listed select_related/prefetch_related paths, so the
+number of queries does not depend on the page size.
+"""
+from collections import namedtuple
+
+from rest_framework.serializers import ListSerializer
+
+Expandable = namedtuple('Expandable', ['serializer', 'select_related', 'prefetch_related'], defaults=[(), ()])
+
+
+def _param(request, name):
+    value = request.query_params.get(name) if request is not None else None
+    return {part.strip() for part in value.split(',') if part.strip()} if value else None
+
+
+class ExpandableFieldsMixin:
+    expandable_fields = {}
+
+    @classmethod
+    def expanded(cls, request):
+        expand = _param(request, 'expand') or set()
+        fields = _param(request, 'fields')
+        return sorted(name for name in expand & cls.expandable_fields.keys() if fields is None or name in fields)
+
+    @classmethod
+    def eager_load(cls, queryset, request):
+        for name in cls.expanded(request):
+            expandable = cls.expandable_fields[name]
+            queryset = queryset.select_related(*expandable.select_related).prefetch_related(*expandable.prefetch_related)
+        return queryset
+
+    def _is_root(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, ListSerializer) and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self._is_root():
+            # Nested inside another serializer: the query string is not ours.
+            return fields
+        requested = _param(request, 'fields')
+        if requested is not None:
+            # Input-only fields are kept so writes still validate.
+            fields = {name: field for name, field in fields.items() if name in requested or field.write_only}
+        return fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if not self._is_root():
+            return data
+        # Expanded relations are only nested on output; input stays a key.
+        if not hasattr(self, '_expanders'):
+            self._expanders = {
+                name: self.expandable_fields[name].serializer(context=self.context)
+                for name in self.expanded(self.context.get('request')) if name in data
+            }
+        for name, serializer in self._expanders.items():
+            related = getattr(instance, name)
+            data[name] = serializer.to_representation(related) if related is not None else None
+        return data
+
+
+class ExpandableQuerysetMixin:
+    """Viewset side: eager-loads what the request expands."""
+
+    def get_queryset(self):
+        return self.get_serializer_class().eager_load(super().get_queryset(), self.request)
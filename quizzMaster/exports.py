@@ -0,0 +1,85 @@
+"""Streaming exports of submission results.
+
+Rows are read in keyset-paginated batches of flat ``values_list`` tuples,
+so memory stays flat however many submissions an exam has. (MySQL client
+cursors buffer a whole result set, which rules out one big iterator().)
+"""
+import csv
+import tempfile
+
+from openpyxl import Workbook
+
+from .models import Submission
+
+EXPORT_BATCH_SIZE = 2000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+RESULT_COLUMNS = (
+    ('submission_id', 'id'),
+    ('exam_code', 'exam__exam_code'),
+    ('subject', 'exam__subject__name'),
+    ('username', 'user__username'),
+    ('email', 'user__email'),
+    ('role', 'user__role__name'),
+    ('score', 'score'),
+    ('submitted_at', 'submitted_at'),
+)
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def result_rows(queryset=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield one tuple per submission in ``queryset``, in id order."""
+    queryset = Submission.objects.all() if queryset is None else queryset
+    fields = [field for _, field in RESULT_COLUMNS]
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id').values_list(*fields)[:batch_size])
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1][0]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """CSV text in chunks of about EXPORT_CHUNK_SIZE, header first."""
+    writer = csv.writer(_Echo())
+    # The header goes out on its own so the client sees bytes immediately;
+    # the BOM makes Excel read the file as UTF-8 (Vietnamese names).
+    yield ('\ufeff' + writer.writerow([name for name, _ in RESULT_COLUMNS])).encode('utf-8')
+    chunk, size = [], 0
+    for row in rows:
+        line = writer.writerow(row)
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk).encode('utf-8')
+            chunk, size = [], 0
+    if chunk:
+        yield ''.join(chunk).encode('utf-8')
+
+
+def stream_xlsx(rows):
+    """An XLSX workbook built in write-only mode, then streamed from disk.
+
+    XLSX is a zip whose directory is written last, so nothing can be sent
+    before the workbook is complete; write-only mode keeps that build at
+    constant memory by spilling rows to a temporary file.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Results')
+    sheet.append([name for name, _ in RESULT_COLUMNS])
+    for row in rows:
+        # Excel has no time zones; submitted_at is exported in UTC.
+        sheet.append([value.replace(tzinfo=None) if hasattr(value, 'tzinfo') else value for value in row])
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while chunk := output.read(EXPORT_CHUNK_SIZE):
+            yield chunk
@@ -0,0 +1,183 @@
+import hashlib
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Choice, CorrectAnswer, ExamQuestion, Submission
+from .shuffling import choice_permutation
+from .versioning import aget_versioned, get_versioned, set_versioned
+
+DEFAULT_GRADING_SCALE = 10
+ANSWER_KEY_CACHE_TIMEOUT = 60 * 60
+UNANSWERED = -1
+
+
+def grading_scale():
+    return getattr(settings, 'QUIZZ_GRADING_SCALE', DEFAULT_GRADING_SCALE)
+
+
+class AnswerKey:
+    """Compiled answer key of one exam.
+
+    Questions are numbered in exam order and choices in option order, and
+    ``correct[q, c]`` says whether choice ``c`` of question ``q`` is correct.
+    Submitted answers are encoded as one choice index per question, with -1
+    for unanswered, which makes scoring a single fancy-indexing operation.
+    """
+
+    def __init__(self, exam_id, question_ids, choices, correct_choice_ids, mixed_question_ids=()):
+        self.exam_id = exam_id
+        self.question_ids = list(question_ids)
+        self.is_mixed = [question_id in mixed_question_ids for question_id in self.question_ids]
+        self.question_index = {question_id: i for i, question_id in enumerate(self.question_ids)}
+        self.choice_ids = []
+        self.choice_index = {}
+        self.option_index = []
+        width = max((len(choices.get(question_id, ())) for question_id in self.question_ids), default=0)
+        self.correct = np.zeros((len(self.question_ids), max(width, 1)), dtype=bool)
+        for q, question_id in enumerate(self.question_ids):
+            question_choices = choices.get(question_id, ())
+            self.choice_ids.append([choice_id for choice_id, _ in question_choices])
+            self.option_index.append({option.strip().lower(): c for c, (_, option) in enumerate(question_choices)})
+            for c, (choice_id, _) in enumerate(question_choices):
+                self.choice_index[choice_id] = (q, c)
+                if choice_id in correct_choice_ids:
+                    self.correct[q, c] = True
+
+    @property
+    def num_questions(self):
+        return len(self.question_ids)
+
+    def fingerprint(self):
+        """Changes whenever the questions, choices or correct answers change."""
+        digest = hashlib.sha1(repr((self.question_ids, self.choice_ids, self.is_mixed)).encode())
+        digest.update(self.correct.tobytes())
+        return digest.hexdigest()
+
+    def encode(self, answers, user_id=None):
+        """Turn ``{question_id: choice_id or option}`` into choice indices.
+
+        Options are read as displayed to ``user_id``, whose choices of mixed
+        questions were shuffled by shuffling.personalize_paper.
+        """
+        row = np.full(self.num_questions, UNANSWERED, dtype=np.int16)
+        if not isinstance(answers, dict):
+            return row
+        for question_id, answer in answers.items():
+            try:
+                q = self.question_index[int(question_id)]
+            except (KeyError, TypeError, ValueError):
+                continue
+            if isinstance(answer, str) and not answer.strip().isdigit():
+                c = self.option_index[q].get(answer.strip().lower())
+                if c is not None and user_id is not None and self.is_mixed[q]:
+                    c = choice_permutation(self.exam_id, user_id, self.question_ids[q], len(self.choice_ids[q]))[c]
+            else:
+                try:
+                    choice_q, c = self.choice_index.get(int(answer), (None, None))
+                except (TypeError, ValueError):
+                    continue
+                if choice_q != q:
+                    c = None
+            if c is not None:
+                row[q] = c
+        return row
+
+    def encode_many(self, answers_list, user_ids=None):
+        matrix = np.full((len(answers_list), self.num_questions), UNANSWERED, dtype=np.int16)
+        user_ids = user_ids or [None] * len(answers_list)
+        for i, (answers, user_id) in enumerate(zip(answers_list, user_ids)):
+            matrix[i] = self.encode(answers, user_id)
+        return matrix
+
+    def correct_matrix(self, responses):
+        """Boolean ``(submissions, questions)`` matrix of correct responses."""
+        responses = np.atleast_2d(responses)
+        answered = responses >= 0
+        picked = self.correct[np.arange(self.num_questions), np.where(answered, responses, 0)]
+        return picked & answered
+
+    def score_matrix(self, responses):
+        """Vectorized scores for a ``(submissions, questions)`` response matrix."""
+        if not self.num_questions:
+            return np.zeros(len(np.atleast_2d(responses)))
+        return self.correct_matrix(responses).sum(axis=1) * (grading_scale() / self.num_questions)
+
+    def score(self, answers, user_id=None):
+        return float(self.score_matrix(self.encode(answers, user_id))[0])
+
+
+def compile_answer_key(exam_id):
+    is_mixed = {}
+    for question_id, mixed in (
+        ExamQuestion.objects.using(DEFAULT_DB_ALIAS).filter(exam_id=exam_id).order_by('id')
+        .values_list('question_id', 'question__is_mixed')
+    ):
+        is_mixed.setdefault(question_id, mixed)
+    question_ids = list(is_mixed)
+    mixed_question_ids = {question_id for question_id, mixed in is_mixed.items() if mixed}
+    choices = {}
+    for choice_id, question_id, option in (
+        Choice.objects.using(DEFAULT_DB_ALIAS).filter(question_id__in=question_ids)
+        .order_by('question_id', 'option', 'id')
+        .values_list('id', 'question_id', 'option')
+    ):
+        choices.setdefault(question_id, []).append((choice_id, option))
+    correct_choice_ids = set(
+        CorrectAnswer.objects.using(DEFAULT_DB_ALIAS).filter(question_id__in=question_ids)
+        .values_list('choice_id', flat=True)
+    )
+    return AnswerKey(exam_id, question_ids, choices, correct_choice_ids, mixed_question_ids)
+
+
+def get_answer_key(exam_id):
+    key, version = get_versioned('answer-key', exam_id)
+    if key is None:
+        key = compile_answer_key(exam_id)
+        set_versioned('answer-key', exam_id, version, key, ANSWER_KEY_CACHE_TIMEOUT)
+    return key
+
+
+async def aget_answer_key(exam_id):
+    key, _ = await aget_versioned('answer-key', exam_id)
+    if key is None:
+        key = await sync_to_async(get_answer_key)(exam_id)
+    return key
+
+
+def grade_answers(exam_id, answers, user_id=None):
+    return get_answer_key(exam_id).score(answers, user_id)
+
+
+def regrade_exam(exam_id, batch_size=5000):
+    """Re-score every submission of an exam; returns the number updated."""
+    key = get_answer_key(exam_id)
+    updated = 0
+    batch = []
+    submissions = (
+        Submission.objects.filter(exam_id=exam_id)
+        .values_list('id', 'user_id', 'answers')
+        .iterator(chunk_size=batch_size)
+    )
+    for row in submissions:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            updated += _rescore(key, batch)
+            batch = []
+    if batch:
+        updated += _rescore(key, batch)
+    return updated
+
+
+def _rescore(key, rows):
+    scores = key.score_matrix(key.encode_many(
+        [answers for _, _, answers in rows], [user_id for _, user_id, _ in rows]
+    ))
+    Submission.objects.bulk_update(
+        [Submission(id=submission_id, score=float(score)) for (submission_id, _, _), score in zip(rows, scores)],
+        ['score'],
+        batch_size=1000,
+    )
+    return len(rows)
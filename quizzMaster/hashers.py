@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count set by QUIZZ_PASSWORD_ITERATIONS.
+
+    It keeps Django's algorithm name, so existing hashes still verify, and
+    a hash with a different count is rewritten on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'QUIZZ_PASSWORD_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
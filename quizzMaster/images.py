@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+
+DEFAULT_IMAGE_STORAGE = 'quizzMaster.images.CloudinaryImageStorage'
+DEFAULT_UPLOAD_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+
+class CloudinaryImageStorage:
+    def __init__(self, upload_preset='quiz_images_upload'):
+        self.upload_preset = upload_preset
+
+    def save(self, blob, name, digest):
+        from cloudinary.uploader import upload
+
+        result = upload(BytesIO(blob), resource_type="image", upload_preset=self.upload_preset)
+        return result["secure_url"]
+
+
+class LocalImageStorage:
+    """Writes images to a local directory; handy for development and tests."""
+
+    def __init__(self, location=None, base_url=None):
+        self.location = location or os.path.join(settings.BASE_DIR, 'extracted_images')
+        self.base_url = base_url or '/extracted_images/'
+
+    def save(self, blob, name, digest):
+        file_name = digest + os.path.splitext(name)[1].lower()
+        os.makedirs(self.location, exist_ok=True)
+        path = os.path.join(self.location, file_name)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(blob)
+        return self.base_url + file_name
+
+
+def get_image_storage():
+    return import_string(getattr(settings, 'QUIZZ_IMAGE_STORAGE', DEFAULT_IMAGE_STORAGE))()
+
+
+def _picture_names(doc):
+    """Map every name a picture is known by to its relationship id.
+
+    Word keeps the inserted file name in ``pic:cNvPr`` and the shape name and
+    alt text in ``wp:docPr``; any of them may be what ``[file:...]`` refers to.
+    """
+    names = {}
+    for drawing in doc.element.body.xpath('.//w:drawing'):
+        embeds = drawing.xpath('.//a:blip/@r:embed')
+        if not embeds:
+            continue
+        for props in drawing.xpath('.//wp:docPr | .//pic:cNvPr'):
+            for attr in ('name', 'descr', 'title'):
+                value = (props.get(attr) or '').strip()
+                if value:
+                    names.setdefault(value, embeds[0])
+    return names
+
+
+def resolve_image_parts(doc, references):
+    """Return ``{reference: image part}`` for every reference that resolves."""
+    parts_by_rid = {
+        rid: rel.target_part
+        for rid, rel in doc.part.rels.items()
+        if rel.reltype == RT.IMAGE and not rel.is_external
+    }
+    lookup = {}
+    for rid, part in parts_by_rid.items():
+        lookup.setdefault(posixpath.basename(part.partname), part)
+    for name, rid in _picture_names(doc).items():
+        if rid in parts_by_rid:
+            lookup.setdefault(name, parts_by_rid[rid])
+    folded = {}
+    for name, part in lookup.items():
+        folded.setdefault(name.lower(), part)
+        folded.setdefault(os.path.splitext(name)[0].lower(), part)
+
+    resolved = {}
+    for reference in references:
+        part = lookup.get(reference) or folded.get(reference.lower()) or folded.get(os.path.splitext(reference)[0].lower())
+        if part is not None:
+            resolved[reference] = part
+    return resolved
+
+
+def upload_images(doc, references, storage=None, max_workers=None, progress=None, problems=None):
+    """Upload the images behind ``[file:...]`` references and return their URLs.
+
+    Identical blobs are uploaded once and uploads run on a bounded thread pool.
+    Unresolved references and failed uploads map to None; they are logged
+    and, given a ``problems`` list, described in it.
+    ``progress(done, total)`` is called after each upload.
+    """
+    def report(message):
+        logger.warning(message)
+        if problems is not None:
+            problems.append(message)
+
+    references = list(dict.fromkeys(references))
+    urls = dict.fromkeys(references)
+    if not references:
+        return urls
+
+    storage = storage or get_image_storage()
+    if max_workers is None:
+        max_workers = getattr(settings, 'QUIZZ_IMAGE_UPLOAD_WORKERS', DEFAULT_UPLOAD_WORKERS)
+
+    resolved = resolve_image_parts(doc, references)
+    for reference in references:
+        if reference not in resolved:
+            report(f"Image {reference} not found in document")
+
+    references_by_digest = {}
+    blobs = {}
+    for reference, part in resolved.items():
+        blob = part.blob
+        digest = hashlib.sha256(blob).hexdigest()
+        references_by_digest.setdefault(digest, []).append(reference)
+        blobs.setdefault(digest, (blob, posixpath.basename(part.partname)))
+
+    if not blobs:
+        return urls
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(blobs)))) as executor:
+        futures = {
+            executor.submit(storage.save, blob, name, digest): digest
+            for digest, (blob, name) in blobs.items()
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            digest = futures[future]
+            try:
+                url = future.result()
+            except Exception as e:
+                report(f"Error uploading image {', '.join(references_by_digest[digest])}: {e}")
+                url = None
+            for reference in references_by_digest[digest]:
+                urls[reference] = url
+            if progress:
+                progress(done, len(futures))
+    return urls
@@ -0,0 +1,355 @@
+import datetime
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max
+
+from .dedupe import answer_key_of, find_existing, identify, store_bands
+from .images import upload_images
+from .models import Choice, CorrectAnswer, Exam, ExamQuestion, Question, Subject
+from .search import build_search_document
+from .versioning import bump_exam_versions, bump_table_versions
+
+IMPORT_BATCH_SIZE = 500
+# Write steps of save_questions reported to its progress callback.
+SAVE_STEPS = 5
+
+
+class ImportFailed(Exception):
+    pass
+
+
+def _bulk_create(model, objs, scope):
+    """bulk_create ``objs`` and make sure every object ends up with its pk.
+
+    MySQL does not return ids from a multi-row INSERT, so the new rows are read
+    back in insertion order from ``scope``, a queryset that only this
+    transaction can be adding rows to.
+    """
+    if not objs:
+        return objs
+    using = scope.db
+    if connections[using].features.can_return_rows_from_bulk_insert:
+        return model.objects.using(using).bulk_create(objs, batch_size=IMPORT_BATCH_SIZE)
+
+    high_water = scope.aggregate(high_water=Max('pk'))['high_water'] or 0
+    model.objects.using(using).bulk_create(objs, batch_size=IMPORT_BATCH_SIZE)
+    pks = list(scope.filter(pk__gt=high_water).order_by('pk').values_list('pk', flat=True))
+    if len(pks) != len(objs):
+        raise RuntimeError(f"Expected {len(objs)} new {model.__name__} rows, found {len(pks)}")
+    for obj, pk in zip(objs, pks):
+        obj.pk = pk
+        obj._state.adding = False
+        obj._state.db = using
+    return objs
+
+
+def save_questions(questions, exam, subject, strict_answers=True, progress=None):
+    """Persist parsed questions, their choices and correct answers for ``exam``.
+
+    Every model is written with bulk_create inside one transaction, so the
+    number of queries does not depend on how many questions are imported.
+    Questions already in the subject's bank, exactly or as near duplicates
+    (see dedupe.find_existing), are linked to the exam instead of copied,
+    as are repeats within the same file.
+
+    Returns ``(rows_written, matches)``; ``matches`` has one entry per
+    imported question that was linked rather than created.
+    ``progress(done, total)`` is called after each write step.
+    """
+    if not questions:
+        return 0, []
+
+    def step(done):
+        if progress:
+            progress(done, SAVE_STEPS)
+
+    identities = []
+    for data in questions:
+        choices = [(choice_data["option"], choice_data["text"]) for choice_data in data["choices"]]
+        correct_option = (data.get("correct_choice") or "").strip().lower()
+        correct_texts = [text for option, text in choices if option.strip().lower() == correct_option][:1]
+        if correct_option and not correct_texts and strict_answers:
+            raise ValueError(
+                f"Answer '{data['correct_choice']}' does not match any choice of question '{data['question_text']}'"
+            )
+        question_fingerprint, signature = identify(data["question_text"], choices, correct_texts)
+        identities.append((question_fingerprint, signature, answer_key_of(correct_texts)))
+
+    with transaction.atomic():
+        # Serializes imports into the same subject so the rows read back by
+        # _bulk_create can only be ours, and so two imports of one file
+        # cannot both miss each other's questions.
+        list(Subject.objects.select_for_update().filter(pk=subject.pk).values_list('pk', flat=True))
+
+        existing = find_existing(subject.pk, identities, near=getattr(settings, 'QUIZZ_DEDUPE_NEAR', True))
+        first_in_file = {}
+        new_indexes = []
+        matches = []
+        for i, (question_fingerprint, _, _) in enumerate(identities):
+            if existing[i] is not None:
+                question_id, kind, score = existing[i]
+                matches.append({"index": i, "question_id": question_id, "match": kind, "similarity": round(score, 3)})
+            elif question_fingerprint in first_in_file:
+                matches.append({"index": i, "question_id": None, "match": "repeated", "similarity": 1.0})
+            else:
+                first_in_file[question_fingerprint] = i
+                new_indexes.append(i)
+        step(1)
+
+        new_questions = [questions[i] for i in new_indexes]
+        question_objs = [
+            Question(
+                question_text=data["question_text"],
+                image=data.get("image_file"),
+                unit=data.get("unit"),
+                is_mixed=bool(data.get("mix_choices")),
+                subject=subject,
+                search_document=build_search_document(
+                    data["question_text"], data.get("unit"), subject.name,
+                    [choice_data["text"] for choice_data in data["choices"]],
+                ),
+                fingerprint=identities[i][0],
+                minhash=identities[i][1],
+            )
+            for i, data in zip(new_indexes, new_questions)
+        ]
+        _bulk_create(Question, question_objs, Question.objects.filter(subject=subject))
+        store_bands((question.pk, subject.pk, question.minhash) for question in question_objs)
+        step(2)
+
+        choice_objs = []
+        choices_by_question = []
+        for data, question in zip(new_questions, question_objs):
+            question_choices = [
+                Choice(question=question, choice_text=choice_data["text"], option=choice_data["option"])
+                for choice_data in data["choices"]
+            ]
+            choices_by_question.append(question_choices)
+            choice_objs.extend(question_choices)
+        _bulk_create(Choice, choice_objs, Choice.objects.filter(question__in=[q.pk for q in question_objs]))
+        step(3)
+
+        correct_answers = []
+        for data, question, question_choices in zip(new_questions, question_objs, choices_by_question):
+            correct_option = (data.get("correct_choice") or "").strip().lower()
+            if not correct_option:
+                continue
+            by_option = {choice.option.strip().lower(): choice for choice in question_choices}
+            correct_choice = by_option.get(correct_option)
+            if correct_choice is not None:
+                correct_answers.append(CorrectAnswer(question=question, choice=correct_choice))
+        CorrectAnswer.objects.bulk_create(correct_answers, batch_size=IMPORT_BATCH_SIZE)
+        step(4)
+
+        created_ids = {i: question.pk for i, question in zip(new_indexes, question_objs)}
+        for match in matches:
+            if match["question_id"] is None:
+                match["question_id"] = created_ids[first_in_file[identities[match["index"]][0]]]
+        question_ids = {**created_ids, **{match["index"]: match["question_id"] for match in matches}}
+        linked = set(ExamQuestion.objects.filter(exam=exam).values_list('question_id', flat=True))
+        exam_questions = []
+        for i in range(len(questions)):
+            question_id = question_ids[i]
+            if question_id not in linked:
+                linked.add(question_id)
+                exam_questions.append(ExamQuestion(exam=exam, question_id=question_id))
+        ExamQuestion.objects.bulk_create(exam_questions, batch_size=IMPORT_BATCH_SIZE)
+        step(5)
+        # bulk_create bypasses the post_save handlers in signals.py.
+        transaction.on_commit(lambda: bump_exam_versions([exam.id]))
+        transaction.on_commit(lambda: bump_table_versions([Question, Choice]))
+
+    rows_written = len(question_objs) + len(choice_objs) + len(correct_answers) + len(exam_questions)
+    return rows_written, matches
+
+
+def parse_docx_questions(document):
+    """Parse the paragraph layout ("Câu ...", "A. ...", "Đáp án: ...")."""
+    questions = []
+    current_question = None
+    current_choices = []
+    for paragraph in document.paragraphs:
+        text = paragraph.text.strip()
+        if text.startswith("Câu"):
+            if current_question and current_choices:
+                questions.append({
+                    "question_text": current_question,
+                    "choices": current_choices
+                })
+            current_question = text.split(":")[1].strip()
+            current_choices = []
+        elif text.startswith(("A.", "B.", "C.", "D.")):
+            option, choice_text = text.split(".", 1)
+            current_choices.append({
+                "option": option.strip(),
+                "text": choice_text.strip()
+            })
+        elif text.startswith("Đáp án"):
+            correct_choice = text.split(":")[1].strip()
+            if current_choices and current_question:
+                questions.append({
+                    "question_text": current_question,
+                    "choices": current_choices,
+                    "correct_choice": correct_choice
+                })
+                current_question = None
+                current_choices = []
+    if current_question and current_choices:
+        questions.append({
+            "question_text": current_question,
+            "choices": current_choices
+        })
+    return questions
+
+
+def extract_metadata(document):
+    subject_name = None
+    num_questions = 0
+    lecturer = None
+
+    for paragraph in document.paragraphs:
+        text = paragraph.text.strip()
+        if text.startswith("Subject:"):
+            subject_name = text.split(":")[1].strip()
+        elif text.startswith("Number of Quiz:"):
+            num_questions = int(text.split(":")[1].strip())
+        elif text.startswith("Lecturer:"):
+            lecturer = text.split(":")[1].strip()
+
+    return subject_name, num_questions, lecturer
+
+
+def create_or_update_subject(subject_name, lecturer):
+    subject, created = Subject.objects.get_or_create(name=subject_name)
+    if created:
+        subject.lecturer = lecturer
+        subject.save()
+    return subject
+
+
+def process_questions_table(table, doc, progress=None, problems=None):
+    """Parse the QN / a.-d. / ANSWER / MARK / UNIT / MIX CHOICES table.
+
+    Images referenced as ``[file:name]`` are uploaded in a separate stage once
+    the whole table has been read; ``progress(done, total)`` follows it.
+    Missing images and failed uploads are added to ``problems``.
+    """
+    questions = []
+    current_question = None
+    correct_choice = None
+    mark = None
+    unit = None
+    mix_choices = False
+    for row in table.rows:
+        first_cell = row.cells[0].text.strip()
+        second_cell = row.cells[1].text.strip()
+        if first_cell.startswith("QN"):
+            image_reference = None
+
+            if "[file:" in second_cell:
+                question_text = second_cell.split("[file:")[0].strip()
+                image_reference = second_cell.split("[file:")[1].split("]")[0].strip()
+            else:
+                question_text = second_cell
+
+            current_question = {
+                "question_text": question_text,
+                "choices": [],
+                "image_reference": image_reference,
+                "image_file": None,
+                "correct_choice": correct_choice,
+                "mark": mark,
+                "unit": unit,
+                "mix_choices": mix_choices
+            }
+
+            questions.append(current_question)
+
+        elif first_cell.startswith(("a.", "b.", "c.", "d.")):
+            option = first_cell.split(".", 1)[0]
+            choice_text = second_cell
+            if current_question:
+                current_question["choices"].append({
+                    "option": option,
+                    "text": choice_text
+                })
+        elif first_cell.startswith("ANSWER:"):
+            correct_choice = second_cell.strip()
+            if current_question:
+                current_question["correct_choice"] = correct_choice
+        elif first_cell.startswith("MARK:"):
+            mark = float(second_cell.strip())
+            if current_question:
+                current_question["mark"] = mark
+        elif first_cell.startswith("UNIT:"):
+            unit = second_cell.strip()
+            if current_question:
+                current_question["unit"] = unit
+        elif first_cell.startswith("MIX CHOICES:"):
+            mix_choices = second_cell.strip().lower() == "yes"
+            if current_question:
+                current_question["mix_choices"] = mix_choices
+
+    references = [q["image_reference"] for q in questions if q["image_reference"]]
+    urls = upload_images(doc, references, progress=progress, problems=problems)
+    for question in questions:
+        if question["image_reference"]:
+            question["image_file"] = urls.get(question["image_reference"])
+    return questions
+
+
+def save_exam(subject, num_questions, exam_code, exam_id=None):
+    if exam_id:
+        exam = Exam.objects.get(id=exam_id)
+        exam.subject = subject
+        exam.num_questions = num_questions
+        exam.exam_code = exam_code
+        exam.save()
+        return exam
+    else:
+        exam = Exam.objects.create(subject=subject, num_questions=num_questions, exam_code=exam_code)
+        return exam
+
+
+def import_exam_document(document, exam_id=None, progress=None, save_progress=None, problems=None):
+    """Import an exam DOCX (metadata paragraphs plus questions table).
+
+    ``progress`` follows the image uploads, ``save_progress`` the database
+    write. Images that could not be imported are described in ``problems``.
+    Returns ``(exam, rows_written, matches)``, see save_questions.
+    """
+    subject_name, num_questions, lecturer = extract_metadata(document)
+    if not subject_name or not num_questions or not lecturer:
+        raise ImportFailed("Missing required fields")
+    if exam_id and not Exam.objects.filter(id=exam_id).exists():
+        raise ImportFailed("Exam not found")
+    if not document.tables:
+        raise ImportFailed("Questions table not found")
+
+    questions = process_questions_table(document.tables[0], document, progress, problems)
+
+    with transaction.atomic():
+        subject = create_or_update_subject(subject_name, lecturer)
+        if exam_id:
+            exam_code = Exam.objects.get(id=exam_id).exam_code
+        else:
+            exam_code = f"EXAM_{subject_name}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+        exam = save_exam(subject, num_questions, exam_code, exam_id)
+        rows_written, matches = save_questions(questions, exam, subject, progress=save_progress)
+    return exam, rows_written, matches
+
+
+def import_question_document(document, exam_id, subject_id, save_progress=None):
+    """Import a paragraph-layout DOCX into an existing exam and subject.
+
+    Returns ``(exam, rows_written, matches)``, see save_questions.
+    """
+    try:
+        subject = Subject.objects.get(id=subject_id)
+        exam = Exam.objects.get(id=exam_id)
+    except (Subject.DoesNotExist, Exam.DoesNotExist):
+        raise ImportFailed("Exam or subject not found")
+    questions = parse_docx_questions(document)
+    rows_written, matches = save_questions(questions, exam, subject, strict_answers=False, progress=save_progress)
+    return exam, rows_written, matches
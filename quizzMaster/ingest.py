@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.timezone import now
+
+from .models import Exam, Submission, SubmissionDraft, User
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+INGEST_DIRECT = 'direct'
+INGEST_LOG = 'log'
+# Longer than a drain can lag behind; after that the row itself is found.
+SUBMITTED_MARKER_TIMEOUT = 24 * 60 * 60
+
+_append_lock = threading.Lock()
+
+
+def ingest_mode():
+    return getattr(settings, 'QUIZZ_SUBMISSION_INGEST', INGEST_DIRECT)
+
+
+def log_path():
+    return getattr(settings, 'QUIZZ_SUBMISSION_LOG', os.path.join(settings.BASE_DIR, 'var', 'submissions.log'))
+
+
+def checkpoint_path():
+    return log_path() + '.offset'
+
+
+@contextmanager
+def _locked(fd, exclusive=True):
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def submitted_key(exam_id, user_id):
+    return f'submitted:{exam_id}:{user_id}'
+
+
+def claim_submission(exam_id, user_id):
+    """Reserve the one submission of a candidate before it is logged.
+
+    The cache marker catches repeats still waiting in the log, the database
+    check those already drained. False when the candidate has submitted.
+    """
+    if not cache.add(submitted_key(exam_id, user_id), True, SUBMITTED_MARKER_TIMEOUT):
+        return False
+    return not Submission.objects.using(DEFAULT_DB_ALIAS).filter(exam_id=exam_id, user_id=user_id).exists()
+
+
+async def aclaim_submission(exam_id, user_id):
+    if not await cache.aadd(submitted_key(exam_id, user_id), True, SUBMITTED_MARKER_TIMEOUT):
+        return False
+    return not await Submission.objects.using(DEFAULT_DB_ALIAS).filter(exam_id=exam_id, user_id=user_id).aexists()
+
+
+def release_submission(exam_id, user_id):
+    """Undo claim_submission when the record could not be logged."""
+    cache.delete(submitted_key(exam_id, user_id))
+
+
+def append_submission(exam_id, user_id, answers, score):
+    """Durably append a submission to the log; returns once it is on disk."""
+    record = {
+        "exam": exam_id,
+        "user": user_id,
+        "answers": answers,
+        "score": score,
+        "received_at": now().isoformat(),
+    }
+    line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+    path = log_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _append_lock:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        try:
+            with _locked(fd):
+                os.write(fd, line)
+                if getattr(settings, 'QUIZZ_SUBMISSION_LOG_FSYNC', True):
+                    os.fsync(fd)
+        finally:
+            os.close(fd)
+    return record
+
+
+def read_checkpoint():
+    try:
+        with open(checkpoint_path()) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(offset):
+    tmp = checkpoint_path() + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, checkpoint_path())
+
+
+def read_batch(offset, max_records):
+    """Return ``(records, new_offset)`` for complete lines after ``offset``."""
+    records = []
+    try:
+        f = open(log_path(), 'rb')
+    except FileNotFoundError:
+        return records, offset
+    with f:
+        if offset > os.fstat(f.fileno()).st_size:
+            # The log was compacted after the checkpoint was last written.
+            offset = 0
+        f.seek(offset)
+        while len(records) < max_records:
+            line = f.readline()
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            if line.strip():
+                records.append(json.loads(line))
+    return records, offset
+
+
+def store_records(records):
+    """Insert the first submission per (exam, user) that is not stored yet.
+
+    Replaying records that were already inserted is a no-op, which is what
+    makes a crash between the insert and the checkpoint safe. Records of
+    exams or users deleted since are dropped, and a row stored meanwhile by
+    a direct submit is left alone, so a batch never blocks the drainer.
+    """
+    first = {}
+    for record in records:
+        first.setdefault((record["exam"], record["user"]), record)
+    if not first:
+        return 0
+
+    exam_ids = {exam_id for exam_id, _ in first}
+    user_ids = {user_id for _, user_id in first}
+    with transaction.atomic():
+        known_exams = set(Exam.objects.filter(id__in=exam_ids).values_list('id', flat=True))
+        known_users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+        stored = set(
+            Submission.objects.filter(exam_id__in=exam_ids, user_id__in=user_ids).values_list('exam_id', 'user_id')
+        )
+        submissions = [
+            Submission(exam_id=exam_id, user_id=user_id, answers=record["answers"], score=record["score"])
+            for (exam_id, user_id), record in first.items()
+            if (exam_id, user_id) not in stored and exam_id in known_exams and user_id in known_users
+        ]
+        Submission.objects.bulk_create(submissions, batch_size=1000, ignore_conflicts=True)
+        inserted = {(submission.exam_id, submission.user_id) for submission in submissions}
+        drafts = [
+            draft_id for draft_id, exam_id, user_id in SubmissionDraft.objects.filter(
+                exam_id__in=exam_ids, user_id__in=user_ids
+            ).values_list('id', 'exam_id', 'user_id')
+            if (exam_id, user_id) in inserted
+        ]
+        if drafts:
+            SubmissionDraft.objects.filter(id__in=drafts).delete()
+    return len(submissions)
+
+
+def drain(batch_size=1000):
+    """Move every complete record of the log into the Submission table."""
+    inserted = 0
+    offset = read_checkpoint()
+    while True:
+        records, new_offset = read_batch(offset, batch_size)
+        if new_offset == offset:
+            return inserted
+        inserted += store_records(records)
+        write_checkpoint(new_offset)
+        offset = new_offset
+
+
+def compact(max_bytes):
+    """Truncate a fully drained log once it grows past ``max_bytes``."""
+    path = log_path()
+    if fcntl is None or not os.path.exists(path) or os.path.getsize(path) < max_bytes:
+        return False
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        with _locked(fd):
+            if read_checkpoint() != os.fstat(fd).st_size:
+                return False
+            # Checkpoint first: a crash before the truncate only replays
+            # records, which store_records ignores.
+            write_checkpoint(0)
+            os.ftruncate(fd, 0)
+    finally:
+        os.close(fd)
+    return True
+
+
+@contextmanager
+def drainer_lock():
+    """Allow a single drainer process per log."""
+    path = log_path() + '.lock'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o640)
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RuntimeError('Another drainer is already running for this log')
+        yield
+    finally:
+        os.close(fd)
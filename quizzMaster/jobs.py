@@ -0,0 +1,155 @@
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.db import DatabaseError, connection, transaction
+from django.utils.timezone import now
+from docx import Document
+
+from .importers import import_exam_document, import_question_document
+from .models import ImportJob
+from .provisioning import provision_users, read_users_csv
+
+# Share of the progress bar spent parsing the document (image uploads happen
+# there); the database write takes it from there to 99.
+PARSE_PROGRESS_SHARE = 90
+SAVE_PROGRESS_END = 99
+# How often the reporter checks for new progress, and how often it touches
+# updated_at anyway so a long write is not taken for a stale job.
+PUBLISH_INTERVAL = 1
+HEARTBEAT_INTERVAL = 30
+
+
+def enqueue_import(kind, uploaded_file, params=None, user=None):
+    return ImportJob.objects.create(
+        kind=kind,
+        file_name=uploaded_file.name,
+        file_data=uploaded_file.read(),
+        params=params or {},
+        created_by_id=user.id if user is not None and user.is_authenticated else None,
+    )
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None."""
+    with transaction.atomic():
+        job = (
+            ImportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImportJob.STATUS_PENDING)
+            .order_by('id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ImportJob.STATUS_RUNNING
+        job.started_at = now()
+        job.progress = 0
+        job.errors = []
+        job.save(update_fields=['status', 'started_at', 'progress', 'errors', 'updated_at'])
+    return job
+
+
+def requeue_stale_jobs(stale_after):
+    """Put running jobs that stopped reporting progress back in the queue."""
+    return ImportJob.objects.filter(
+        status=ImportJob.STATUS_RUNNING,
+        updated_at__lt=now() - timedelta(seconds=stale_after),
+    ).update(status=ImportJob.STATUS_PENDING, progress=0, updated_at=now())
+
+
+class ProgressReporter:
+    """Publishes the progress of a running job from a thread of its own.
+
+    The import writes everything in one transaction on the worker's
+    connection, where progress updates would stay invisible (and the job
+    would look stale to requeue_stale_jobs) until it commits. Connections
+    are per thread, so this thread writes in autocommit on its own one.
+    """
+
+    def __init__(self, job):
+        self.job_id = job.pk
+        self.progress = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'import-progress-{job.pk}', daemon=True)
+
+    def stage(self, start, end):
+        """A ``progress(done, total)`` callback mapped onto ``start``..``end`` percent."""
+        def report(done, total):
+            self.progress = start + (done * (end - start) // total if total else 0)
+        return report
+
+    def _publish(self, progress):
+        try:
+            ImportJob.objects.filter(pk=self.job_id, status=ImportJob.STATUS_RUNNING).update(
+                progress=progress, updated_at=now()
+            )
+        except DatabaseError:
+            # A missed update only delays the next one.
+            pass
+
+    def _run(self):
+        published, published_at = None, 0
+        try:
+            while not self._stop.wait(PUBLISH_INTERVAL):
+                progress = self.progress
+                if progress != published or time.monotonic() - published_at >= HEARTBEAT_INTERVAL:
+                    self._publish(progress)
+                    published, published_at = progress, time.monotonic()
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_import_job(job):
+    """Run a claimed job; a successful job lists skipped images or rows in ``errors``."""
+    problems = []
+    try:
+        with ProgressReporter(job) as reporter:
+            save_progress = reporter.stage(PARSE_PROGRESS_SHARE, SAVE_PROGRESS_END)
+            if job.kind == ImportJob.KIND_USERS:
+                # The reporter's heartbeat keeps a long hashing run from looking stale.
+                report = provision_users(read_users_csv(StringIO(job.file_data.decode('utf-8-sig'), newline='')))
+                exam, rows_written, matches = None, report["created"] + report["assigned"], []
+                problems.extend(f'Line {error["line"]} ({error["username"]}): {error["message"]}'
+                                for error in report["errors"])
+            elif job.kind == ImportJob.KIND_EXAM:
+                document = Document(BytesIO(job.file_data))
+                exam, rows_written, matches = import_exam_document(
+                    document, job.params.get('exam_id'),
+                    progress=reporter.stage(0, PARSE_PROGRESS_SHARE), save_progress=save_progress,
+                    problems=problems,
+                )
+            else:
+                document = Document(BytesIO(job.file_data))
+                exam, rows_written, matches = import_question_document(
+                    document, job.params.get('exam_id'), job.params.get('subject_id'), save_progress=save_progress,
+                )
+    except Exception as e:
+        ImportJob.objects.filter(pk=job.pk).update(
+            status=ImportJob.STATUS_FAILED,
+            errors=[str(e)],
+            finished_at=now(),
+            updated_at=now(),
+        )
+        return False
+
+    ImportJob.objects.filter(pk=job.pk).update(
+        status=ImportJob.STATUS_SUCCEEDED,
+        progress=100,
+        rows_written=rows_written,
+        matches=matches,
+        errors=problems,
+        exam=exam,
+        file_data=b'',
+        finished_at=now(),
+        updated_at=now(),
+    )
+    return True
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from quizzMaster.dedupe import DEDUPE_BATCH_SIZE, duplicate_groups, merge_duplicates, refresh_fingerprints
+from quizzMaster.models import Question, Subject
+
+
+class Command(BaseCommand):
+    help = 'Fill missing question fingerprints and report (or merge) duplicate questions per subject'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', type=int, action='append', dest='subjects', help='Subject id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=DEDUPE_BATCH_SIZE, help='Questions fingerprinted per batch')
+        parser.add_argument('--near', action='store_true', help='Also report near duplicates (never merged)')
+        parser.add_argument('--apply', action='store_true', help='Merge exact duplicates instead of only reporting them')
+
+    def handle(self, *args, **options):
+        subject_ids = options['subjects'] or list(Subject.objects.order_by('id').values_list('id', flat=True))
+
+        missing = list(
+            Question.objects.filter(subject_id__in=subject_ids, fingerprint='').order_by('id').values_list('id', flat=True)
+        )
+        for start in range(0, len(missing), options['batch_size']):
+            refresh_fingerprints(missing[start:start + options['batch_size']])
+        if missing:
+            self.stdout.write(f'Fingerprinted {len(missing)} question(s)')
+
+        removed = 0
+        for subject_id in subject_ids:
+            exact, near = duplicate_groups(subject_id, near=options['near'])
+            for group in exact:
+                self.stdout.write(f'Subject {subject_id}: exact duplicates {group}')
+            for group in near:
+                self.stdout.write(f'Subject {subject_id}: near duplicates {group}')
+            if options['apply']:
+                removed += merge_duplicates(exact)
+
+        if options['apply']:
+            self.stdout.write(self.style.SUCCESS(f'Removed {removed} duplicate question(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Dry run; pass --apply to merge exact duplicates'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from quizzMaster.ingest import compact, drain, drainer_lock
+
+
+class Command(BaseCommand):
+    help = 'Insert submissions from the write-behind log into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Keep draining new submissions')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between drains with --loop')
+        parser.add_argument('--compact-at', type=int, default=64 * 1024 * 1024, help='Truncate a drained log larger than this many bytes')
+
+    def handle(self, *args, **options):
+        try:
+            with drainer_lock():
+                while True:
+                    close_old_connections()
+                    started = time.monotonic()
+                    inserted = drain(batch_size=options['batch_size'])
+                    if inserted:
+                        self.stdout.write(f'Inserted {inserted} submission(s) in {time.monotonic() - started:.2f}s')
+                    compact(options['compact_at'])
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS('Submission log drained'))
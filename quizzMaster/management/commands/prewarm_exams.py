@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from quizzMaster.prewarm import prewarm_exam, upcoming_exam_ids
+
+
+class Command(BaseCommand):
+    help = 'Cache papers, answer keys and candidate lists of exams about to start'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=30, help='Warm exams starting within this many minutes')
+        parser.add_argument('--exam', type=int, action='append', dest='exams', help='Exam id (repeatable); skips the schedule lookup')
+        parser.add_argument('--loop', action='store_true', help='Keep running, re-warming evicted entries')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            for exam_id in options['exams'] or upcoming_exam_ids(options['minutes']):
+                started = time.monotonic()
+                warmed = prewarm_exam(exam_id)
+                if warmed is None:
+                    self.stderr.write(f'Exam {exam_id} not found')
+                    continue
+                self.stdout.write(
+                    f'Exam {exam_id}: {warmed["questions"]} question(s), {warmed["candidates"]} candidate(s) '
+                    f'in {time.monotonic() - started:.2f}s'
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Exams warmed'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzMaster.provisioning import ProvisioningFailed, provision_users, read_users_csv
+
+
+class Command(BaseCommand):
+    help = 'Create users and subject assignments from a CSV (username,email,password,role,subjects)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file; subjects are ;-separated names')
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (default QUIZZ_HASH_WORKERS, 0 hashes inline)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report without writing')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as lines:
+                rows = read_users_csv(lines)
+        except (OSError, ProvisioningFailed) as e:
+            raise CommandError(str(e))
+        report = provision_users(rows, workers=options['workers'], dry_run=options['dry_run'])
+        for error in report['errors']:
+            self.stderr.write(f'Line {error["line"]} ({error["username"]}): {error["message"]}')
+        prefix = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {report["created"]} user(s) and {report["assigned"]} subject assignment(s) '
+            f'in {time.monotonic() - started:.2f}s; {len(report["errors"])} row(s) skipped'
+        ))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quizzMaster.grading import regrade_exam
+from quizzMaster.models import Exam
+
+
+class Command(BaseCommand):
+    help = 'Re-score submissions against the current answer keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, action='append', dest='exams', help='Exam id (repeatable); defaults to all exams')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        exam_ids = options['exams'] or list(Exam.objects.values_list('id', flat=True))
+        for exam_id in exam_ids:
+            started = time.monotonic()
+            count = regrade_exam(exam_id, batch_size=options['batch_size'])
+            self.stdout.write(f'Exam {exam_id}: re-scored {count} submission(s) in {time.monotonic() - started:.2f}s')
+        self.stdout.write(self.style.SUCCESS('Regrading finished'))
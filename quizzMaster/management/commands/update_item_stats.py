@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from quizzMaster.analytics import update_exam_stats
+from quizzMaster.models import Exam, Submission
+
+
+class Command(BaseCommand):
+    help = 'Fold new submissions into the materialized item analysis tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, action='append', dest='exams', help='Exam id (repeatable); defaults to exams with submissions')
+        parser.add_argument('--full', action='store_true', help='Recompute from scratch instead of incrementally')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--loop', action='store_true', help='Keep running and pick up new submissions')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            exam_ids = options['exams'] or list(
+                Exam.objects.filter(id__in=Submission.objects.values('exam_id')).values_list('id', flat=True)
+            )
+            for exam_id in exam_ids:
+                started = time.monotonic()
+                count = update_exam_stats(exam_id, full=options['full'], batch_size=options['batch_size'])
+                if count:
+                    self.stdout.write(f'Exam {exam_id}: folded {count} submission(s) in {time.monotonic() - started:.2f}s')
+            if not options['loop']:
+                break
+            options['full'] = False
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Item statistics updated'))
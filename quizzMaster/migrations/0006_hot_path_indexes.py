@@ -0,0 +1,64 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """Clear rows that would violate the new unique constraints.
+
+    Duplicate ExamQuestion and CorrectAnswer rows keep their oldest copy.
+    Questions whose choices share an option label (choices created by the
+    old paragraph importer had none) get their options relabelled in id
+    order.
+    """
+    for model_name, fields in (('ExamQuestion', ('exam', 'question')), ('CorrectAnswer', ('question', 'choice'))):
+        model = apps.get_model('quizzMaster', model_name)
+        duplicates = model.objects.values(*fields).annotate(keep=Min('id'), rows=Count('id')).filter(rows__gt=1)
+        for duplicate in duplicates:
+            keep = duplicate.pop('keep')
+            duplicate.pop('rows')
+            model.objects.filter(**duplicate).exclude(id=keep).delete()
+
+    Choice = apps.get_model('quizzMaster', 'Choice')
+    question_ids = (
+        Choice.objects.values('question', 'option').annotate(rows=Count('id')).filter(rows__gt=1)
+        .values_list('question', flat=True).distinct()
+    )
+    for question_id in list(question_ids):
+        choices = list(Choice.objects.filter(question_id=question_id).order_by('id'))
+        letters = 'abcdefghijklmnopqrstuvwxyz' if any(c.option.islower() for c in choices) else 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+        for choice, letter in zip(choices, letters):
+            choice.option = letter
+        Choice.objects.bulk_update(choices[:len(letters)], ['option'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0005_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='examschedule',
+            index=models.Index(fields=['start_time', 'end_time'], name='examschedule_time_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['exam', 'user'], name='submission_exam_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='choice',
+            constraint=models.UniqueConstraint(fields=('question', 'option'), name='choice_question_option_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='correctanswer',
+            constraint=models.UniqueConstraint(fields=('question', 'choice'), name='correctanswer_question_choice_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='examquestion',
+            constraint=models.UniqueConstraint(fields=('exam', 'question'), name='examquestion_exam_question_uniq'),
+        ),
+    ]
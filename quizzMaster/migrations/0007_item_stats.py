@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamItemStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('answer_key_fingerprint', models.CharField(blank=True, default='', max_length=40)),
+                ('last_submission_id', models.BigIntegerField(default=0)),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('total_sum', models.FloatField(default=0)),
+                ('total_sq_sum', models.FloatField(default=0)),
+                ('kr20', models.FloatField(blank=True, null=True)),
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='item_stats', to='quizzMaster.exam')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('correct_total_sum', models.FloatField(default=0)),
+                ('choice_counts', models.JSONField(blank=True, default=dict)),
+                ('p_value', models.FloatField(blank=True, null=True)),
+                ('point_biserial', models.FloatField(blank=True, null=True)),
+                ('distractor_rates', models.JSONField(blank=True, default=dict)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzMaster.exam')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzMaster.question')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('exam', 'question'), name='questionstats_exam_question_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0007_item_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionDraft',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('answers', models.JSONField(blank=True, default=dict)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzMaster.exam')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('exam', 'user'), name='submissiondraft_exam_user_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:03
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+FULLTEXT_INDEX = 'question_search_document_ft'
+
+
+def fold(text):
+    # Frozen copy of quizzMaster.search.fold.
+    text = unicodedata.normalize('NFD', (text or '').lower().replace('đ', 'd'))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[\W_]+', ' ', text).split())
+
+
+def fill_search_documents(apps, schema_editor):
+    Question = apps.get_model('quizzMaster', 'Question')
+    Choice = apps.get_model('quizzMaster', 'Choice')
+    question_ids = list(Question.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(question_ids), 500):
+        batch = question_ids[start:start + 500]
+        choices = {}
+        for question_id, choice_text in (
+            Choice.objects.filter(question_id__in=batch).order_by('question_id', 'option', 'id')
+            .values_list('question_id', 'choice_text')
+        ):
+            choices.setdefault(question_id, []).append(choice_text)
+        Question.objects.bulk_update(
+            [
+                Question(id=question_id, search_document=fold(' '.join(
+                    [question_text or '', *choices.get(question_id, ()), unit or '', subject_name or '']
+                )))
+                for question_id, question_text, unit, subject_name in (
+                    Question.objects.filter(id__in=batch).values_list('id', 'question_text', 'unit', 'subject__name')
+                )
+            ],
+            ['search_document'],
+        )
+
+
+def add_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    table = apps.get_model('quizzMaster', 'Question')._meta.db_table
+    quote = schema_editor.quote_name
+    schema_editor.execute(f'CREATE FULLTEXT INDEX {quote(FULLTEXT_INDEX)} ON {quote(table)} ({quote("search_document")})')
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    table = apps.get_model('quizzMaster', 'Question')._meta.db_table
+    quote = schema_editor.quote_name
+    schema_editor.execute(f'DROP INDEX {quote(FULLTEXT_INDEX)} ON {quote(table)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0008_submission_draft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0009_question_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='matches',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='minhash',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['subject', 'fingerprint'], name='question_subject_fp_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0010_question_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='choice',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choices', to='quizzMaster.question'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0011_choice_related_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examitemstats',
+            name='last_submission_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:34
+
+from django.db import migrations, models
+from django.db.models import Count
+
+MAX_LISTED_DUPLICATES = 50
+
+
+def check_duplicate_submissions(apps, schema_editor):
+    """Stop before the constraint if a candidate has several graded submissions for one exam.
+
+    Which one to keep is not ours to decide, so nothing is deleted: the
+    pairs are listed for an operator to resolve before migrating again.
+    """
+    Submission = apps.get_model('quizzMaster', 'Submission')
+    duplicates = list(
+        Submission.objects.values('exam', 'user').annotate(rows=Count('id')).filter(rows__gt=1).order_by('exam', 'user')
+    )
+    if not duplicates:
+        return
+    lines = []
+    for duplicate in duplicates[:MAX_LISTED_DUPLICATES]:
+        ids = Submission.objects.filter(exam=duplicate['exam'], user=duplicate['user']).order_by('id')
+        lines.append(f"  exam {duplicate['exam']}, user {duplicate['user']}: "
+                     f"submissions {', '.join(map(str, ids.values_list('id', flat=True)))}")
+    if len(duplicates) > MAX_LISTED_DUPLICATES:
+        lines.append(f"  ... and {len(duplicates) - MAX_LISTED_DUPLICATES} more")
+    raise RuntimeError(
+        f"{len(duplicates)} (exam, user) pair(s) have more than one submission. Keep one submission per pair "
+        "and run migrate again:\n" + "\n".join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0012_examitemstats_last_submission_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_submissions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='submission',
+            constraint=models.UniqueConstraint(fields=('exam', 'user'), name='submission_exam_user_uniq'),
+        ),
+        migrations.RemoveIndex(
+            model_name='submission',
+            name='submission_exam_user_idx',
+        ),
+    ]
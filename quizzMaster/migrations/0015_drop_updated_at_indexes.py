@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0014_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='choice',
+            name='choice_updated_at_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='exam',
+            name='exam_updated_at_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_updated_at_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='role',
+            name='role_updated_at_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='subject',
+            name='subject_updated_at_idx',
+        ),
+    ]
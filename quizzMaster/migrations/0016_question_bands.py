@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# dedupe.py at the time: 16 bands of 4 uint32 rows.
+BANDS = 16
+BAND_BYTES = 16
+BATCH_SIZE = 500
+
+
+def fill_question_bands(apps, schema_editor):
+    Question = apps.get_model('quizzMaster', 'Question')
+    QuestionBand = apps.get_model('quizzMaster', 'QuestionBand')
+    rows = Question.objects.exclude(minhash=b'').order_by('id').values_list('id', 'subject_id', 'minhash')
+    bands = []
+    for question_id, subject_id, signature in rows.iterator(chunk_size=BATCH_SIZE):
+        signature = bytes(signature)
+        bands.extend(
+            QuestionBand(question_id=question_id, subject_id=subject_id, band=band,
+                         bucket=signature[band * BAND_BYTES:(band + 1) * BAND_BYTES].hex())
+            for band in range(BANDS)
+        )
+        if len(bands) >= BATCH_SIZE * BANDS:
+            QuestionBand.objects.bulk_create(bands, batch_size=BATCH_SIZE)
+            bands = []
+    QuestionBand.objects.bulk_create(bands, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0015_drop_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.CharField(max_length=32)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='quizzMaster.question')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzMaster.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subject', 'band', 'bucket'], name='questionband_bucket_idx')],
+            },
+        ),
+        migrations.RunPython(fill_question_bands, migrations.RunPython.noop),
+    ]
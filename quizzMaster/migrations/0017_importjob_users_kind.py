@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzMaster', '0016_question_bands'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importjob',
+            name='kind',
+            field=models.CharField(choices=[('exam', 'Exam document'), ('questions', 'Question document'), ('users', 'Users CSV')], max_length=20),
+        ),
+    ]
@@ -51,6 +51,9 @@ class User(AbstractBaseUser,BaseModel):
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=now)
+    # Embedded in access tokens; bumped when role or is_active changes so
+    # tokens issued before the change stop being accepted.
+    role_version = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email']
@@ -61,7 +64,16 @@ class User(AbstractBaseUser,BaseModel):
         self.password = make_password(raw_password)
 
     def check_password(self, raw_password):
-        return check_password(raw_password, self.password)
+        def rehash(raw_password):
+            # Hashed with an outdated hasher or iteration count. update()
+            # writes only the password and skips the role-change signal.
+            self.set_password(raw_password)
+            User.objects.filter(pk=self.pk).update(password=self.password)
+
+        return check_password(raw_password, self.password, rehash)
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'], name='user_created_id_idx')]
 
 
     def __str__(self):
@@ -84,10 +96,38 @@ class Question(BaseModel):
     image = CloudinaryField('image', blank=True, null=True)
     unit = models.CharField(max_length=50, blank=True, null=True)
     is_mixed = models.BooleanField(default=False)
+    # Folded text of the question, its choices, unit and subject; kept up to
+    # date by search.refresh_search_documents and FULLTEXT-indexed on MySQL.
+    search_document = models.TextField(blank=True, default='', editable=False)
+    # Content hash and MinHash signature used to find duplicates (dedupe.py).
+    fingerprint = models.CharField(max_length=64, blank=True, default='', editable=False)
+    minhash = models.BinaryField(blank=True, default=b'', editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='question_created_id_idx'),
+            models.Index(fields=['subject', 'fingerprint'], name='question_subject_fp_idx'),
+        ]
 
     def __str__(self):
         return self.question_text
 
+
+class QuestionBand(models.Model):
+    """One LSH band of a question's MinHash signature, see dedupe.py.
+
+    Near-duplicate lookups read the buckets of the incoming questions here
+    instead of every signature of the subject. Sixteen rows per question
+    are derived data, so they skip the BaseModel bookkeeping columns.
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='bands')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
+    band = models.PositiveSmallIntegerField()
+    bucket = models.CharField(max_length=32)
+
+    class Meta:
+        indexes = [models.Index(fields=['subject', 'band', 'bucket'], name='questionband_bucket_idx')]
+
 class Exam(BaseModel):
     exam_code = models.CharField(max_length=100, unique=True)
     duration = models.IntegerField()
@@ -102,22 +142,34 @@ class ExamQuestion(BaseModel):
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['exam', 'question'], name='examquestion_exam_question_uniq')]
+
 
 class ExamSchedule(BaseModel):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [models.Index(fields=['start_time', 'end_time'], name='examschedule_time_range_idx')]
+
 class Choice(BaseModel):
-    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='choices')
     choice_text = models.CharField(max_length=255)
     option = models.CharField(max_length=1)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['question', 'option'], name='choice_question_option_uniq')]
+
 
 class CorrectAnswer(BaseModel):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['question', 'choice'], name='correctanswer_question_choice_uniq')]
+
 class Submission(BaseModel):
     score = models.FloatField()
     answers = models.JSONField()
@@ -125,3 +177,92 @@ class Submission(BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     submitted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'], name='submission_created_id_idx')]
+        constraints = [models.UniqueConstraint(fields=['exam', 'user'], name='submission_exam_user_uniq')]
+
+
+class SubmissionDraft(BaseModel):
+    """Last flushed autosave of a candidate who has not submitted yet."""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    answers = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['exam', 'user'], name='submissiondraft_exam_user_uniq')]
+
+
+class ExamItemStats(BaseModel):
+    """Running sums over the submissions of an exam, for item analysis.
+
+    Totals are raw scores (number of correct answers); everything in
+    QuestionStats and here can be updated by adding the sums of new
+    submissions. ``last_submission_updated_at`` is the newest updated_at
+    among the folded submissions, used to notice edits and deletes.
+    """
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, related_name='item_stats')
+    answer_key_fingerprint = models.CharField(max_length=40, blank=True, default='')
+    last_submission_id = models.BigIntegerField(default=0)
+    last_submission_updated_at = models.DateTimeField(blank=True, null=True)
+    submissions = models.PositiveIntegerField(default=0)
+    total_sum = models.FloatField(default=0)
+    total_sq_sum = models.FloatField(default=0)
+    kr20 = models.FloatField(blank=True, null=True)
+
+
+class QuestionStats(BaseModel):
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    responses = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    correct_total_sum = models.FloatField(default=0)
+    choice_counts = models.JSONField(default=dict, blank=True)
+    p_value = models.FloatField(blank=True, null=True)
+    point_biserial = models.FloatField(blank=True, null=True)
+    distractor_rates = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['exam', 'question'], name='questionstats_exam_question_uniq')]
+
+
+class ImportJob(BaseModel):
+    KIND_EXAM = 'exam'
+    KIND_QUESTIONS = 'questions'
+    KIND_USERS = 'users'
+    KIND_CHOICES = [
+        (KIND_EXAM, 'Exam document'),
+        (KIND_QUESTIONS, 'Question document'),
+        (KIND_USERS, 'Users CSV'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    file_name = models.CharField(max_length=255)
+    file_data = models.BinaryField()
+    params = models.JSONField(default=dict, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    # Imported questions that were linked to existing ones instead of copied.
+    matches = models.JSONField(default=list, blank=True)
+    exam = models.ForeignKey(Exam, on_delete=models.SET_NULL, blank=True, null=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'id'])]
+
+    def __str__(self):
+        return f"{self.kind} import {self.pk} ({self.status})"
@@ -0,0 +1,82 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Keyset pagination over (created_at, id), newest first.
+
+    DRF's cursor keys only on the first ordering field and falls back to an
+    offset for rows that share it, which is what bulk_create bursts produce.
+    Here the cursor carries both created_at and id, so every position is
+    unique, the offset stays 0 and each page is a single range scan.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.cursor.position if self.cursor else None
+
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            created_at, pk = self._parse_position(position)
+            op = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'created_at__{op}': created_at})
+                | Q(created_at=created_at, **{f'id__{op}': pk})
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = True, position
+            self.has_previous, self.previous_position = following is not None, following
+        else:
+            self.has_next, self.next_position = following is not None, following
+            self.has_previous, self.previous_position = position is not None, position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, dict):
+            created_at, pk = instance['created_at'], instance['id']
+        else:
+            created_at, pk = instance.created_at, instance.pk
+        return f'{created_at.isoformat()}|{pk}'
+
+    def _parse_position(self, position):
+        created_at, _, pk = position.rpartition('|')
+        try:
+            parsed = parse_datetime(created_at)
+            pk = int(pk)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise NotFound(self.invalid_cursor_message)
+        return parsed, pk
+
+
+class SearchPagination(PageNumberPagination):
+    """Numbered pages for ranked results, which have no stable keyset."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,95 @@
+import json
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Choice, Exam, ExamQuestion
+from .shuffling import personalize_paper
+from .versioning import aget_versioned, get_versioned, set_versioned
+
+PAPER_CACHE_TIMEOUT = 6 * 60 * 60
+
+
+def _image_url(image):
+    if not image:
+        return None
+    public_id = image.public_id or ''
+    if public_id.startswith(('http://', 'https://', '/')):
+        # Already a full URL (e.g. from the DOCX importer); keep it as stored.
+        return f'{public_id}.{image.format}' if image.format else public_id
+    return image.url
+
+
+def build_paper(exam_id):
+    """Build the candidate view of an exam: questions and choices, no answers."""
+    exam = Exam.objects.using(DEFAULT_DB_ALIAS).select_related('subject').get(id=exam_id)
+    rows = (
+        ExamQuestion.objects.using(DEFAULT_DB_ALIAS).filter(exam_id=exam_id)
+        .order_by('id')
+        .values_list('question_id', 'question__question_text', 'question__image', 'question__unit', 'question__is_mixed')
+    )
+    questions = {}
+    for question_id, question_text, image, unit, is_mixed in rows:
+        questions.setdefault(question_id, {
+            "id": question_id,
+            "question_text": question_text,
+            "image": _image_url(image),
+            "unit": unit,
+            "is_mixed": is_mixed,
+            "choices": [],
+        })
+    for choice_id, question_id, option, choice_text in (
+        Choice.objects.using(DEFAULT_DB_ALIAS).filter(question_id__in=list(questions))
+        .order_by('question_id', 'option', 'id')
+        .values_list('id', 'question_id', 'option', 'choice_text')
+    ):
+        questions[question_id]["choices"].append({"id": choice_id, "option": option, "choice_text": choice_text})
+
+    return {
+        "exam": {
+            "id": exam.id,
+            "exam_code": exam.exam_code,
+            "duration": exam.duration,
+            "num_questions": exam.num_questions,
+            "subject": exam.subject_id,
+            "subject_name": exam.subject.name,
+        },
+        "questions": list(questions.values()),
+    }
+
+
+def get_paper_bytes(exam_id):
+    """Return the serialized paper of an exam, building and caching it once.
+
+    Raises Exam.DoesNotExist for unknown exams.
+    """
+    paper, version = get_versioned('exam-paper', exam_id)
+    if paper is None:
+        paper = json.dumps(build_paper(exam_id), ensure_ascii=False).encode('utf-8')
+        set_versioned('exam-paper', exam_id, version, paper, PAPER_CACHE_TIMEOUT)
+    return paper
+
+
+async def aget_paper_bytes(exam_id):
+    paper, _ = await aget_versioned('exam-paper', exam_id)
+    if paper is None:
+        paper = await sync_to_async(get_paper_bytes)(exam_id)
+    return paper
+
+
+@lru_cache(maxsize=32)
+def _load_paper(paper):
+    # Shared between requests: personalize_paper copies, never mutates.
+    return json.loads(paper)
+
+
+def get_candidate_paper_bytes(exam_id, user_id):
+    """The cached paper in the question and choice order of one candidate."""
+    paper = personalize_paper(_load_paper(get_paper_bytes(exam_id)), user_id)
+    return json.dumps(paper, ensure_ascii=False).encode('utf-8')
+
+
+async def aget_candidate_paper_bytes(exam_id, user_id):
+    paper = personalize_paper(_load_paper(await aget_paper_bytes(exam_id)), user_id)
+    return json.dumps(paper, ensure_ascii=False).encode('utf-8')
@@ -1,17 +1,24 @@
 from rest_framework import permissions
 
+
+def role_name(user):
+    # Token users carry the role as a claim, so this never hits the database
+    # for them; anonymous users have no role.
+    role = getattr(user, 'role', None)
+    return getattr(role, 'name', None)
+
 class IsStudent(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.role.name == 'Candidate'
+        return role_name(request.user) == 'Candidate'
 
 class IsExamAdministrator(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.role.name == 'Exam Administrator'
+        return role_name(request.user) == 'Exam Administrator'
 
 class IsQuestionManager(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.role.name == 'Question Manager'
+        return role_name(request.user) == 'Question Manager'
 
 class IsAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.role.name == 'Admin'
+        return role_name(request.user) == 'Admin'
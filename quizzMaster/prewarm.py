@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.timezone import now
+
+from .grading import get_answer_key
+from .models import Exam, ExamSchedule, UserSubject
+from .papers import get_paper_bytes
+from .scheduling import exam_windows, overlapping
+from .versioning import CANDIDATES, get_versioned, set_versioned
+
+CANDIDATES_CACHE_TIMEOUT = 6 * 60 * 60
+
+
+def eligible_candidates(exam_id):
+    """Ids of active candidates assigned to the subject of an exam, cached."""
+    candidates, version = get_versioned('exam-candidates', exam_id, CANDIDATES)
+    if candidates is None:
+        candidates = list(
+            UserSubject.objects.using(DEFAULT_DB_ALIAS).filter(
+                subject__exam__id=exam_id, user__role__name='Candidate', user__is_active=True
+            ).order_by('user_id').values_list('user_id', flat=True).distinct()
+        )
+        set_versioned('exam-candidates', exam_id, version, candidates, CANDIDATES_CACHE_TIMEOUT)
+    return candidates
+
+
+def exam_is_open_to(exam_id, user_id):
+    """Whether a candidate may see the exam now.
+
+    The candidate must be assigned to the exam's subject and one of its
+    schedule windows must be running. Both lookups are cached.
+    """
+    current = now()
+    if not any(start_time <= current < end_time for start_time, end_time in exam_windows(exam_id)):
+        return False
+    return user_id in eligible_candidates(exam_id)
+
+
+def upcoming_exam_ids(minutes):
+    """Exams with a schedule running now or starting within ``minutes``."""
+    current = now()
+    schedules = overlapping(ExamSchedule.objects.all(), current, current + timedelta(minutes=minutes))
+    return sorted(set(schedules.filter(exam__is_active=True).values_list('exam_id', flat=True)))
+
+
+def prewarm_exam(exam_id):
+    """Build whatever is missing from the cache for one exam.
+
+    Each getter is a no-op when its entry is already cached for the
+    current exam version, so running this often is cheap.
+    """
+    try:
+        get_paper_bytes(exam_id)
+    except Exam.DoesNotExist:
+        return None
+    key = get_answer_key(exam_id)
+    exam_windows(exam_id)
+    return {"questions": key.num_questions, "candidates": len(eligible_candidates(exam_id))}
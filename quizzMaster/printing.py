@@ -0,0 +1,159 @@
+"""Printable DOCX papers, the reverse of importers.import_exam_document.
+
+Papers use the metadata paragraphs and the QN / a.-d. / ANSWER / MARK /
+UNIT / MIX CHOICES table that process_questions_table reads, so a paper
+rendered with answers can be imported again. Images are not embedded.
+
+Rendering is CPU-bound, so batches of variants are rendered in a process
+pool. Everything a worker needs is prepared here first: workers never
+touch the database or settings.
+"""
+import json
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from docx import Document
+
+from .grading import grading_scale
+from .models import CorrectAnswer, ExamQuestion, Subject, User
+from .papers import get_paper_bytes
+from .shuffling import personalize_paper
+
+MAX_PAPER_VARIANTS = 1000
+DEFAULT_RENDER_WORKERS = 4
+
+
+def render_workers():
+    return getattr(settings, 'QUIZZ_RENDER_WORKERS', DEFAULT_RENDER_WORKERS)
+
+
+def render_docx(paper, header, correct_choice_ids=None, mark=None):
+    """DOCX bytes of ``paper`` (papers.build_paper layout).
+
+    ``header`` is a list of ``(label, value)`` metadata paragraphs. ANSWER
+    rows are written only when ``correct_choice_ids`` is given.
+    """
+    document = Document()
+    for label, value in header:
+        document.add_paragraph(f'{label}: {value}')
+    table = document.add_table(rows=0, cols=2)
+
+    def row(first, second):
+        cells = table.add_row().cells
+        cells[0].text = first
+        cells[1].text = second
+
+    for number, question in enumerate(paper["questions"], start=1):
+        row(f'QN={number}', question["question_text"])
+        answer = None
+        for choice in question["choices"]:
+            option = choice["option"].strip().lower()
+            row(f'{option}.', choice["choice_text"])
+            if correct_choice_ids is not None and choice["id"] in correct_choice_ids:
+                answer = option
+        if answer is not None:
+            row('ANSWER:', answer.upper())
+        if mark is not None:
+            row('MARK:', f'{mark:g}')
+        row('UNIT:', question["unit"] or '')
+        row('MIX CHOICES:', 'Yes' if question["is_mixed"] else 'No')
+
+    output = BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def _render(task):
+    return task[0], render_docx(*task[1:])
+
+
+def paper_tasks(exam_id, user_ids=None, answers=False):
+    """``(filename, paper, header, correct_choice_ids, mark)`` per document.
+
+    Without ``user_ids`` there is one document in canonical order;
+    otherwise one per candidate, in the order that candidate sees.
+    Raises Exam.DoesNotExist for unknown exams.
+    """
+    paper = json.loads(get_paper_bytes(exam_id))
+    exam = paper["exam"]
+    lecturer = Subject.objects.filter(id=exam["subject"]).values_list('lecturer', flat=True).first()
+    header = [
+        ('Subject', exam["subject_name"]),
+        ('Number of Quiz', exam["num_questions"]),
+        ('Lecturer', lecturer or ''),
+        ('Exam code', exam["exam_code"]),
+    ]
+    correct = None
+    if answers:
+        correct = set(
+            CorrectAnswer.objects.filter(question__in=ExamQuestion.objects.filter(exam_id=exam_id).values('question_id'))
+            .values_list('choice_id', flat=True)
+        )
+    mark = grading_scale() / len(paper["questions"]) if paper["questions"] else None
+
+    if user_ids is None:
+        return [(f'{exam["exam_code"]}.docx', paper, header, correct, mark)]
+    usernames = dict(User.objects.filter(id__in=user_ids).values_list('id', 'username'))
+    return [
+        (
+            f'{exam["exam_code"]}-{usernames[user_id]}.docx',
+            personalize_paper(paper, user_id),
+            header + [('Candidate', usernames[user_id])],
+            correct,
+            mark,
+        )
+        for user_id in user_ids if user_id in usernames
+    ]
+
+
+def render_papers(tasks, workers=None):
+    """Yield ``(filename, docx_bytes)`` in task order.
+
+    With more than one task and ``workers`` > 0, rendering fans out over a
+    process pool.
+    """
+    workers = render_workers() if workers is None else workers
+    if workers <= 0 or len(tasks) <= 1:
+        yield from map(_render, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        try:
+            yield from pool.map(_render, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+        except GeneratorExit:
+            pool.shutdown(cancel_futures=True)
+            raise
+
+
+class _Pipe:
+    """Write-only buffer that a ZipFile writes into and a generator drains."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files):
+    """ZIP archive bytes of ``(filename, data)`` pairs, one chunk per file.
+
+    The pipe is not seekable, so ZipFile writes data descriptors and nothing
+    is held back but the central directory.
+    """
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, data in files:
+            archive.writestr(filename, data)
+            yield pipe.drain()
+    yield pipe.drain()
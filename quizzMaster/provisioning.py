@@ -0,0 +1,150 @@
+"""Bulk user provisioning from CSV.
+
+Columns: ``username, email, password, role, subjects``. ``role`` defaults
+to Candidate and ``subjects`` is a ``;``-separated list of subject names.
+A row whose username and email both belong to an existing user only adds
+subject assignments; its password is ignored.
+
+Duplicate checks are one query per lookup, not per row, and rows are
+written with bulk_create. Password hashing is CPU-bound: the import worker
+and the provision_users command run it on a small process pool, while a
+web request hashes inline and queues anything larger than a few users.
+"""
+import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Exam, Role, Subject, User, UserSubject
+from .versioning import CANDIDATES, bump_exam_versions
+
+PROVISION_COLUMNS = ('username', 'email', 'password', 'role', 'subjects')
+REQUIRED_COLUMNS = ('username', 'email', 'password')
+DEFAULT_ROLE = 'Candidate'
+PROVISION_BATCH_SIZE = 1000
+MAX_PROVISION_ROWS = 50000
+DEFAULT_HASH_WORKERS = 2
+DEFAULT_INLINE_ROWS = 20
+
+
+class ProvisioningFailed(Exception):
+    pass
+
+
+def hash_workers():
+    return getattr(settings, 'QUIZZ_HASH_WORKERS', DEFAULT_HASH_WORKERS)
+
+
+def inline_rows():
+    """Most rows a web request provisions itself; larger files are queued."""
+    return getattr(settings, 'QUIZZ_PROVISION_INLINE_ROWS', DEFAULT_INLINE_ROWS)
+
+
+def read_users_csv(lines):
+    """Rows of a users CSV as dicts; raises ProvisioningFailed on a bad header."""
+    reader = csv.DictReader(lines)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ProvisioningFailed(f"Missing columns: {', '.join(missing)}")
+    rows = []
+    for row in reader:
+        if len(rows) == MAX_PROVISION_ROWS:
+            raise ProvisioningFailed(f"At most {MAX_PROVISION_ROWS} users per file")
+        rows.append({column: (row.get(column) or '').strip() for column in PROVISION_COLUMNS})
+    return rows
+
+
+def hash_passwords(passwords, workers=None):
+    workers = hash_workers() if workers is None else workers
+    if workers == 0 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    # Spawned, not forked: the import worker runs jobs on threads.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def provision_users(rows, workers=None, dry_run=False):
+    """Create the users in ``rows`` (see read_users_csv) and assign subjects.
+
+    Invalid rows are skipped and reported; line numbers count the header
+    as line 1. Returns ``{"created", "assigned", "errors"}``.
+    """
+    errors = []
+    for row in rows:
+        row['email'] = User.objects.normalize_email(row['email'])
+    roles = dict(Role.objects.filter(name__in={row['role'] or DEFAULT_ROLE for row in rows}).values_list('name', 'id'))
+    subject_names = {name.strip() for row in rows for name in row['subjects'].split(';') if name.strip()}
+    subjects = dict(Subject.objects.filter(name__in=subject_names).values_list('name', 'id'))
+    existing_users = {
+        username: (user_id, email.lower())
+        for user_id, username, email in User.objects.filter(
+            Q(username__in={row['username'] for row in rows}) | Q(email__in={row['email'] for row in rows})
+        ).values_list('id', 'username', 'email')
+    }
+    taken_emails = {email for _, email in existing_users.values()}
+
+    new_users, assignments = [], []
+    seen_usernames, seen_emails = set(), set()
+    for line, row in enumerate(rows, start=2):
+        username, email = row['username'], row['email']
+        role = row['role'] or DEFAULT_ROLE
+        names = [name.strip() for name in row['subjects'].split(';') if name.strip()]
+        unknown = [name for name in names if name not in subjects]
+        if not username or not email or (not row['password'] and username not in existing_users):
+            problem = "username, email and password are required"
+        elif role not in roles:
+            problem = f"unknown role '{role}'"
+        elif unknown:
+            problem = f"unknown subjects: {', '.join(unknown)}"
+        elif username in seen_usernames or email.lower() in seen_emails:
+            problem = "duplicate username or email in file"
+        elif username in existing_users and existing_users[username][1] != email.lower():
+            problem = "username already exists"
+        elif username not in existing_users and email.lower() in taken_emails:
+            problem = "email already exists"
+        else:
+            problem = None
+        if problem:
+            errors.append({"line": line, "username": username, "message": problem})
+            continue
+        seen_usernames.add(username)
+        seen_emails.add(email.lower())
+        if username not in existing_users:
+            new_users.append((username, email, row['password'], roles[role]))
+        assignments.extend((username, subjects[name]) for name in names)
+
+    if dry_run:
+        return {"created": len(new_users), "assigned": len(set(assignments)), "errors": errors}
+
+    hashes = hash_passwords([password for _, _, password, _ in new_users], workers)
+    with transaction.atomic():
+        User.objects.bulk_create(
+            [
+                User(username=username, email=email, password=password_hash, role_id=role_id)
+                for (username, email, _, role_id), password_hash in zip(new_users, hashes)
+            ],
+            batch_size=PROVISION_BATCH_SIZE,
+        )
+        # MySQL does not return ids from bulk_create; usernames are unique.
+        user_ids = dict(
+            User.objects.filter(username__in={username for username, _ in assignments}).values_list('username', 'id')
+        )
+        pairs = {(user_ids[username], subject_id) for username, subject_id in assignments}
+        assigned = set(
+            UserSubject.objects.filter(user_id__in={user_id for user_id, _ in pairs})
+            .values_list('user_id', 'subject_id')
+        )
+        new_assignments = [
+            UserSubject(user_id=user_id, subject_id=subject_id) for user_id, subject_id in sorted(pairs - assigned)
+        ]
+        UserSubject.objects.bulk_create(new_assignments, batch_size=PROVISION_BATCH_SIZE)
+        # bulk_create bypasses signals.user_subject_changed.
+        exam_ids = list(
+            Exam.objects.filter(subject_id__in={link.subject_id for link in new_assignments}).values_list('id', flat=True)
+        )
+        transaction.on_commit(lambda: bump_exam_versions(exam_ids, scopes=(CANDIDATES,)))
+    return {"created": len(new_users), "assigned": len(new_assignments), "errors": errors}
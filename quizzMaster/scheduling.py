@@ -0,0 +1,117 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.timezone import now
+
+from .models import Exam, ExamSchedule
+
+MAX_BULK_SCHEDULES = 1000
+WINDOWS_CACHE_TIMEOUT = 60
+
+
+class ScheduleConflict(Exception):
+    def __init__(self, conflicts):
+        super().__init__(f'{len(conflicts)} schedule conflict(s)')
+        self.conflicts = conflicts
+
+
+def overlapping(queryset, start_time, end_time):
+    """Schedules sharing any instant with [start_time, end_time)."""
+    return queryset.filter(start_time__lt=end_time, end_time__gt=start_time)
+
+
+def find_conflicts(slots, existing=()):
+    """Sort-and-sweep the slots of each exam and report overlaps.
+
+    ``slots`` are dicts with ``exam_id``, ``start_time`` and ``end_time``;
+    ``existing`` are ``(id, exam_id, start_time, end_time)`` rows. Each
+    conflict names the slot index and what it overlaps: ``overlaps_slot``
+    (another slot index) or ``overlaps_schedule`` (an existing schedule
+    id). Overlaps among existing rows are ignored.
+    """
+    events = [(slot['exam_id'], slot['start_time'], slot['end_time'], ('slot', i)) for i, slot in enumerate(slots)]
+    events += [(exam_id, start, end, ('schedule', schedule_id)) for schedule_id, exam_id, start, end in existing]
+    events.sort(key=lambda event: (event[0], event[1], event[2]))
+
+    conflicts = []
+    active = None
+    for exam_id, start, end, source in events:
+        if active is not None and active[0] == exam_id and start < active[2]:
+            if source[0] == 'slot' or active[3][0] == 'slot':
+                slot, other = (source, active[3]) if source[0] == 'slot' else (active[3], source)
+                conflicts.append({"slot": slot[1], f"overlaps_{other[0]}": other[1]})
+            if end <= active[2]:
+                continue
+        active = (exam_id, start, end, source)
+    return sorted(conflicts, key=lambda conflict: conflict["slot"])
+
+
+def schedule_bulk(slots):
+    """Insert all slots in one transaction, or none if any of them conflict."""
+    if not slots:
+        return []
+    exam_ids = sorted({slot['exam_id'] for slot in slots})
+    with transaction.atomic():
+        # Locking the exams serializes concurrent planners for the same exams.
+        found = set(Exam.objects.select_for_update().filter(id__in=exam_ids).order_by('id').values_list('id', flat=True))
+        missing = [i for i, slot in enumerate(slots) if slot['exam_id'] not in found]
+        if missing:
+            raise ScheduleConflict([{"slot": i, "exam": "Exam not found."} for i in missing])
+        existing = overlapping(
+            ExamSchedule.objects.filter(exam_id__in=exam_ids),
+            min(slot['start_time'] for slot in slots),
+            max(slot['end_time'] for slot in slots),
+        ).values_list('id', 'exam_id', 'start_time', 'end_time')
+        conflicts = find_conflicts(slots, existing)
+        if conflicts:
+            raise ScheduleConflict(conflicts)
+        created = ExamSchedule.objects.bulk_create([ExamSchedule(**slot) for slot in slots], batch_size=500)
+        # bulk_create skips the post_save handler that normally does this.
+        transaction.on_commit(lambda: cache.delete_many([windows_key(exam_id) for exam_id in exam_ids]))
+    return created
+
+
+def windows_key(exam_id):
+    return f'exam-windows:{exam_id}'
+
+
+def _windows_queryset(exam_id):
+    return (
+        ExamSchedule.objects.using(DEFAULT_DB_ALIAS).filter(exam_id=exam_id, end_time__gt=now())
+        .order_by('start_time').values_list('start_time', 'end_time')
+    )
+
+
+def exam_windows(exam_id):
+    """``(start_time, end_time)`` of the exam's schedules that have not ended."""
+    key = windows_key(exam_id)
+    windows = cache.get(key)
+    if windows is None:
+        windows = list(_windows_queryset(exam_id))
+        cache.set(key, windows, WINDOWS_CACHE_TIMEOUT)
+    return windows
+
+
+async def aexam_windows(exam_id):
+    key = windows_key(exam_id)
+    windows = await cache.aget(key)
+    if windows is None:
+        windows = [window async for window in _windows_queryset(exam_id)]
+        await cache.aset(key, windows, WINDOWS_CACHE_TIMEOUT)
+    return windows
+
+
+def time_remaining(windows, current):
+    """Describe the running or next window at ``current``, or None."""
+    for start_time, end_time in windows:
+        if end_time <= current:
+            continue
+        running = start_time <= current
+        return {
+            "status": "running" if running else "scheduled",
+            "starts_at": start_time.isoformat(),
+            "ends_at": end_time.isoformat(),
+            "server_time": current.isoformat(),
+            "starts_in_seconds": 0 if running else int((start_time - current).total_seconds()),
+            "remaining_seconds": int((end_time - max(start_time, current)).total_seconds()),
+        }
+    return None
@@ -0,0 +1,78 @@
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Case, ExpressionWrapper, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Choice, Question
+
+SEARCH_BATCH_SIZE = 500
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def fold(text):
+    """Lowercase ``text`` and strip Vietnamese diacritics ("Đáp án" -> "dap an").
+
+    đ has no Unicode decomposition, so it is mapped to d by hand.
+    """
+    text = unicodedata.normalize('NFD', (text or '').lower().replace('đ', 'd'))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def build_search_document(question_text, unit, subject_name, choice_texts):
+    return fold(' '.join([question_text or '', *choice_texts, unit or '', subject_name or '']))
+
+
+def refresh_search_documents(question_ids):
+    """Recompute the search document of the given questions."""
+    question_ids = list(question_ids)
+    for start in range(0, len(question_ids), SEARCH_BATCH_SIZE):
+        batch = question_ids[start:start + SEARCH_BATCH_SIZE]
+        choices = {}
+        for question_id, choice_text in (
+            Choice.objects.filter(question_id__in=batch).order_by('question_id', 'option', 'id')
+            .values_list('question_id', 'choice_text')
+        ):
+            choices.setdefault(question_id, []).append(choice_text)
+        Question.objects.bulk_update(
+            [
+                Question(id=question_id, search_document=build_search_document(
+                    question_text, unit, subject_name, choices.get(question_id, ())
+                ))
+                for question_id, question_text, unit, subject_name in (
+                    Question.objects.filter(id__in=batch).values_list('id', 'question_text', 'unit', 'subject__name')
+                )
+            ],
+            ['search_document'],
+        )
+
+
+def search_questions(query, queryset=None):
+    """Questions matching ``query``, best match first, annotated with ``rank``.
+
+    MySQL uses the FULLTEXT index on search_document (natural language
+    mode). Other databases fall back to counting terms that start a word,
+    which is a scan and only meant for development.
+    """
+    queryset = Question.objects.all() if queryset is None else queryset
+    terms = fold(query).split()
+    if not terms:
+        return queryset.none()
+    if connection.vendor == 'mysql':
+        rank = RawSQL('MATCH (search_document) AGAINST (%s IN NATURAL LANGUAGE MODE)', (' '.join(terms),))
+        return queryset.annotate(rank=rank).filter(rank__gt=0).order_by('-rank', '-id')
+
+    matches = Q()
+    rank = Value(0)
+    for term in dict.fromkeys(terms):
+        word = Q(search_document__regex=rf'(^| ){re.escape(term)}')
+        matches |= word
+        rank = rank + Case(When(word, then=Value(1)), default=Value(0))
+    return (
+        queryset.filter(matches)
+        .annotate(rank=ExpressionWrapper(rank, output_field=IntegerField()))
+        .order_by('-rank', '-id')
+    )
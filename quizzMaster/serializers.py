@@ -1,6 +1,8 @@
 from rest_framework import serializers
-from .models import Choice, Exam, Question, Subject, ExamSchedule, ExamQuestion, CorrectAnswer, User, Submission, Role, UserSubject
+from .models import Choice, Exam, Question, Subject, ExamSchedule, ExamQuestion, CorrectAnswer, User, Submission, Role, UserSubject, ImportJob
 from rest_framework.exceptions import ValidationError
+from .expansion import Expandable, ExpandableFieldsMixin
+from .scheduling import overlapping
 class ChoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Choice
@@ -11,7 +13,15 @@ class QuestionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Question
-        fields = '__all__'
+        exclude = ['search_document', 'fingerprint', 'minhash']
+
+class QuestionSearchSerializer(serializers.ModelSerializer):
+    subject_name = serializers.CharField(source='subject.name', read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Question
+        fields = ['id', 'question_text', 'unit', 'subject', 'subject_name', 'is_mixed', 'rank']
 
 class ExamSerializer(serializers.ModelSerializer):
     subject_name = serializers.CharField(source='subject.name', read_only=True)
@@ -20,9 +30,11 @@ class ExamSerializer(serializers.ModelSerializer):
         model = Exam
         fields = ['id', 'exam_code', 'duration', 'num_questions', 'subject', 'subject_name']
 
-class ExamQuestionSerializer(serializers.ModelSerializer):
-    exam = ExamSerializer()
-    question = QuestionSerializer()
+class ExamQuestionSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'exam': Expandable(ExamSerializer, ['exam__subject']),
+        'question': Expandable(QuestionSerializer, ['question'], ['question__choices']),
+    }
 
     class Meta:
         model = ExamQuestion
@@ -51,16 +63,20 @@ class ExamScheduleSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def validate(self, attrs):
-        start_time = attrs.get('start_time')
-        end_time = attrs.get('end_time')
-        exam = attrs.get('exam')
+        instance = self.instance
+        start_time = attrs.get('start_time', getattr(instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(instance, 'end_time', None))
+        exam = attrs.get('exam', getattr(instance, 'exam', None))
 
-        if start_time > end_time:
+        if start_time >= end_time:
             raise serializers.ValidationError({
                 "end_time": "End time must be after start time."
             })
 
-        if ExamSchedule.objects.filter( exam=exam, start_time=start_time, end_time=end_time).exists():
+        conflicts = overlapping(ExamSchedule.objects.filter(exam=exam), start_time, end_time)
+        if instance is not None:
+            conflicts = conflicts.exclude(pk=instance.pk)
+        if conflicts.exists():
             raise serializers.ValidationError("The exam schedule conflicts with another schedule.")
 
         return attrs
@@ -71,6 +87,17 @@ class ExamScheduleSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Start time must be in the future.")
         return value
 
+class ExamScheduleSlotSerializer(serializers.Serializer):
+    """One slot of a bulk scheduling request; conflicts are checked by scheduling.schedule_bulk."""
+    exam = serializers.IntegerField(min_value=1, source='exam_id')
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs['start_time'] >= attrs['end_time']:
+            raise serializers.ValidationError({"end_time": "End time must be after start time."})
+        return attrs
+
 class UserSerializer(serializers.ModelSerializer):
     role_name = serializers.CharField(source='role.name', read_only=True)
 
@@ -79,24 +106,55 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'password', 'role', 'role_name']
         extra_kwargs = {'password': {'write_only': True}}
 
-class SubmissionSerializer(serializers.ModelSerializer):
-    exam = ExamSerializer()
-    user = UserSerializer()
+ALREADY_SUBMITTED = "You have already submitted this exam."
+
+def validate_answers(value):
+    if not isinstance(value, dict):
+        raise ValidationError("Answers must map question ids to choice ids or options.")
+    return value
+
+class SubmissionSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    exam = serializers.PrimaryKeyRelatedField(read_only=True)
+    exam_id = serializers.PrimaryKeyRelatedField(source='exam', queryset=Exam.objects.all(), write_only=True)
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandable_fields = {
+        'exam': Expandable(ExamSerializer, ['exam__subject']),
+        'user': Expandable(UserSerializer, ['user__role']),
+    }
 
     class Meta:
         model = Submission
         fields = '__all__'
+        read_only_fields = ['score']
+
+    def validate_answers(self, value):
+        return validate_answers(value)
+
+class SubmissionIngestSerializer(serializers.Serializer):
+    """Input of a logged submission; checked against the cached answer key, not the database."""
+    exam_id = serializers.IntegerField(min_value=1)
+    answers = serializers.JSONField()
+
+    def validate_answers(self, value):
+        return validate_answers(value)
 
 class RoleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Role
         fields = '__all__'
 
-class UserSubjectSerializer(serializers.ModelSerializer):
-    user = UserSerializer()
-    subject = SubjectSerializer()
+class UserSubjectSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'user': Expandable(UserSerializer, ['user__role']),
+        'subject': Expandable(SubjectSerializer, ['subject']),
+    }
 
     class Meta:
         model = UserSubject
         fields = '__all__'
 
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        exclude = ['file_data']
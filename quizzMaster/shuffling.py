@@ -0,0 +1,55 @@
+import hashlib
+import hmac
+import random
+
+from django.conf import settings
+
+
+def _rng(*parts):
+    message = ':'.join(str(part) for part in parts).encode()
+    digest = hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+
+def _permutation(n, *parts):
+    order = list(range(n))
+    _rng(*parts).shuffle(order)
+    return order
+
+
+def question_permutation(exam_id, user_id, n):
+    """``order[i]`` is the canonical index of the question shown at position i."""
+    if not getattr(settings, 'QUIZZ_SHUFFLE_QUESTIONS', True):
+        return list(range(n))
+    return _permutation(n, 'questions', exam_id, user_id)
+
+
+def choice_permutation(exam_id, user_id, question_id, n):
+    """``order[i]`` is the canonical index of the choice shown at position i.
+
+    Seeded per question so it does not depend on where the question lands.
+    """
+    return _permutation(n, 'choices', exam_id, user_id, question_id)
+
+
+def personalize_paper(paper, user_id):
+    """Return a candidate's copy of a paper built by ``papers.build_paper``.
+
+    Questions are reordered and choices of ``is_mixed`` questions shuffled.
+    Options are relabelled by position, so the displayed "b" is always the
+    second choice shown; the grader maps it back with choice_permutation.
+    """
+    exam_id = paper["exam"]["id"]
+    questions = paper["questions"]
+    shuffled = []
+    for index in question_permutation(exam_id, user_id, len(questions)):
+        question = questions[index]
+        choices = question["choices"]
+        if question["is_mixed"] and len(choices) > 1:
+            order = choice_permutation(exam_id, user_id, question["id"], len(choices))
+            choices = [
+                dict(choices[canonical], option=choices[position]["option"])
+                for position, canonical in enumerate(order)
+            ]
+        shuffled.append(dict(question, choices=choices))
+    return dict(paper, questions=shuffled)
@@ -0,0 +1,115 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import publish_role_version
+from .dedupe import refresh_fingerprints
+from .models import (
+    Choice, CorrectAnswer, Exam, ExamQuestion, ExamSchedule, Question, Role, Subject, User, UserSubject,
+)
+from .scheduling import windows_key
+from .search import refresh_search_documents
+from .versioning import CANDIDATES, CONTENT, bump_exam_versions, bump_table_versions
+
+
+def _bump_on_commit(exam_ids, scopes=(CONTENT,)):
+    exam_ids = set(exam_ids)
+    if exam_ids:
+        transaction.on_commit(lambda: bump_exam_versions(exam_ids, scopes))
+
+
+def _exams_of_question(question_id):
+    return ExamQuestion.objects.filter(question_id=question_id).values_list('exam_id', flat=True)
+
+
+def _deleting_question(origin):
+    # post_delete of choices and answers removed along with their question.
+    return isinstance(origin, Question) or getattr(origin, 'model', None) is Question
+
+
+@receiver([post_save, post_delete], sender=Exam)
+def exam_changed(sender, instance, **kwargs):
+    # The subject may have changed, and with it the candidates.
+    _bump_on_commit([instance.id], scopes=(CONTENT, CANDIDATES))
+
+
+@receiver([post_save, post_delete], sender=Choice)
+@receiver([post_save, post_delete], sender=Exam)
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=Role)
+@receiver([post_save, post_delete], sender=Subject)
+def table_changed(sender, **kwargs):
+    # Validators of the conditional GETs in conditional.py.
+    transaction.on_commit(lambda: bump_table_versions([sender]))
+
+
+@receiver([post_save, post_delete], sender=ExamSchedule)
+def exam_schedule_changed(sender, instance, **kwargs):
+    exam_id = instance.exam_id
+    transaction.on_commit(lambda: cache.delete(windows_key(exam_id)))
+
+
+@receiver(post_save, sender=Subject)
+def subject_changed(sender, instance, created, **kwargs):
+    if not created:
+        _bump_on_commit(Exam.objects.filter(subject_id=instance.id).values_list('id', flat=True))
+        refresh_search_documents(Question.objects.filter(subject_id=instance.id).values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=ExamQuestion)
+def exam_question_changed(sender, instance, **kwargs):
+    _bump_on_commit([instance.exam_id])
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        _bump_on_commit(_exams_of_question(instance.id))
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and set(update_fields) <= {'search_document', 'fingerprint', 'minhash'}):
+        return
+    refresh_search_documents([instance.id])
+    refresh_fingerprints([instance.id])
+
+
+@receiver([post_save, post_delete], sender=Choice)
+@receiver([post_save, post_delete], sender=CorrectAnswer)
+def answer_changed(sender, instance, **kwargs):
+    _bump_on_commit(_exams_of_question(instance.question_id))
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_documents([instance.question_id])
+
+
+@receiver([post_save, post_delete], sender=Choice)
+@receiver([post_save, post_delete], sender=CorrectAnswer)
+def question_content_changed(sender, instance, raw=False, origin=None, **kwargs):
+    if not raw and not _deleting_question(origin):
+        refresh_fingerprints([instance.question_id])
+
+
+@receiver([post_save, post_delete], sender=UserSubject)
+def user_subject_changed(sender, instance, **kwargs):
+    exam_ids = Exam.objects.filter(subject_id=instance.subject_id).values_list('id', flat=True)
+    _bump_on_commit(exam_ids, scopes=(CANDIDATES,))
+
+
+@receiver(pre_save, sender=User)
+def user_role_changing(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previous = User.objects.filter(pk=instance.pk).values('role_id', 'is_active').first()
+    if previous and (previous['role_id'] != instance.role_id or previous['is_active'] != instance.is_active):
+        instance.role_version += 1
+        user_id, version = instance.pk, instance.role_version
+        transaction.on_commit(lambda: publish_role_version(user_id, version))
+        # The user may join or leave the candidate lists of their exams.
+        exam_ids = Exam.objects.filter(subject__usersubject__user_id=instance.pk).values_list('id', flat=True)
+        _bump_on_commit(exam_ids, scopes=(CANDIDATES,))
@@ -1,3 +1,1547 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from docx import Document
+from openpyxl import load_workbook
+from mysite.db_routers import ReplicaRouter, ReplicaRoutingMiddleware, _read_alias
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .analytics import update_exam_stats
+from .authentication import tokens_for_user
+from .dedupe import band_buckets, duplicate_groups, merge_duplicates
+from .exports import result_rows
+from .grading import get_answer_key, regrade_exam
+from .images import LocalImageStorage, upload_images
+from .importers import extract_metadata, process_questions_table, save_questions
+from .ingest import drain, read_checkpoint
+from .jobs import ProgressReporter, claim_next_job, enqueue_import, requeue_stale_jobs, run_import_job
+from .models import (
+    Choice, CorrectAnswer, Exam, ExamItemStats, ExamQuestion, ExamSchedule, ImportJob, Question, QuestionBand,
+    QuestionStats, Role, Subject, Submission, SubmissionDraft, User, UserSubject,
+)
+from .pagination import CreatedAtCursorPagination
+from .printing import render_docx
+from .papers import get_candidate_paper_bytes, get_paper_bytes
+from .prewarm import eligible_candidates, prewarm_exam, upcoming_exam_ids
+from .scheduling import find_conflicts
+from .search import fold
+from .throttling import LoginThrottle, TokenBucket
+
+
+def make_questions(count):
+    return [
+        {
+            "question_text": f"Question {i}",
+            "choices": [{"option": option, "text": f"Choice {option} of {i}"} for option in "abcd"],
+            "correct_choice": "b",
+            "unit": "1",
+            "mix_choices": i % 2 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+class ImportExamBulkSaveTests(TestCase):
+    def setUp(self):
+        self.subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=0, subject=self.subject)
+
+    def save(self, questions):
+        with CaptureQueriesContext(connection) as ctx:
+            save_questions(questions, self.exam, self.subject)
+        return len(ctx.captured_queries)
+
+    def test_saves_questions_choices_and_answers(self):
+        self.save(make_questions(3))
+
+        self.assertEqual(Question.objects.filter(subject=self.subject).count(), 3)
+        self.assertEqual(Choice.objects.count(), 12)
+        self.assertEqual(ExamQuestion.objects.filter(exam=self.exam).count(), 3)
+        answers = CorrectAnswer.objects.select_related('choice', 'question')
+        self.assertEqual(len(answers), 3)
+        for answer in answers:
+            self.assertEqual(answer.choice.option, 'b')
+            self.assertEqual(answer.choice.question_id, answer.question_id)
+
+    def test_query_count_does_not_grow_with_question_count(self):
+        small = self.save(make_questions(5))
+        # 16 band rows per new question: beyond this, SQLite's 999-parameter
+        # cap (not the import) splits the insert into more batches.
+        large = self.save(make_questions(15))
+
+        self.assertEqual(small, large)
+
+    def test_unknown_answer_rolls_back_import(self):
+        questions = make_questions(2)
+        questions[1]["correct_choice"] = "z"
+
+        with self.assertRaises(ValueError):
+            self.save(questions)
+        self.assertFalse(Question.objects.exists())
+
+    def test_reports_progress_of_each_write_step(self):
+        steps = []
+        save_questions(make_questions(3), self.exam, self.subject, progress=lambda done, total: steps.append(done / total))
+        self.assertEqual(steps, sorted(steps))
+        self.assertEqual(steps[-1], 1)
+
+
+def question_document(count):
+    """Paragraph-layout DOCX (see importers.parse_docx_questions) as an upload."""
+    document = Document()
+    for i in range(count):
+        document.add_paragraph(f'Câu {i + 1}: Question {i}')
+        for option in 'ABCD':
+            document.add_paragraph(f'{option}. Choice {option} of {i}')
+        document.add_paragraph('Đáp án: B')
+    upload = BytesIO()
+    document.save(upload)
+    upload.seek(0)
+    upload.name = 'questions.docx'
+    return upload
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        self.subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=0, subject=self.subject)
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(admin).access_token}')
+
+    def enqueue(self, exam_id=None):
+        response = self.client.post('/api/import-docx/', {
+            "file": question_document(2), "exam_id": exam_id or self.exam.id, "subject_id": self.subject.id,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        return response.data["job_id"]
+
+    def test_queued_job_runs_to_success(self):
+        job_id = self.enqueue()
+        self.assertEqual(self.client.get(f'/api/import-jobs/{job_id}/').data["status"], ImportJob.STATUS_PENDING)
+
+        job = claim_next_job()
+        self.assertEqual((job.id, job.status), (job_id, ImportJob.STATUS_RUNNING))
+        self.assertIsNone(claim_next_job())
+        self.assertTrue(run_import_job(job))
+
+        data = self.client.get(f'/api/import-jobs/{job_id}/').data
+        self.assertEqual(data["status"], ImportJob.STATUS_SUCCEEDED)
+        self.assertEqual(data["progress"], 100)
+        self.assertEqual(data["rows_written"], 2 + 8 + 2 + 2)
+        self.assertEqual(data["exam"], self.exam.id)
+        self.assertEqual(ExamQuestion.objects.filter(exam=self.exam).count(), 2)
+        self.assertEqual(ImportJob.objects.get(id=job_id).file_data, b'')
+
+    def test_skipped_images_are_listed_on_the_job(self):
+        question = {
+            "question_text": "Which logo is this? [file:missing.png]", "unit": "1", "is_mixed": False,
+            "choices": [{"id": i, "option": option, "choice_text": option} for i, option in enumerate("abcd")],
+        }
+        header = [('Subject', 'Vue.js'), ('Number of Quiz', 1), ('Lecturer', 'Lecturer')]
+        data = render_docx({"questions": [question]}, header, {1})
+        job = enqueue_import(ImportJob.KIND_EXAM, SimpleUploadedFile('exam.docx', data), {"exam_id": self.exam.id})
+        with self.assertLogs('quizzMaster.images', 'WARNING'):
+            self.assertTrue(run_import_job(claim_next_job()))
+        job.refresh_from_db()
+        self.assertEqual(job.errors, ["Image missing.png not found in document"])
+
+    def test_failed_job_keeps_the_error(self):
+        job_id = self.enqueue(exam_id=999999)
+        self.assertFalse(run_import_job(claim_next_job()))
+
+        data = self.client.get(f'/api/import-jobs/{job_id}/').data
+        self.assertEqual(data["status"], ImportJob.STATUS_FAILED)
+        self.assertEqual(data["errors"], ["Exam or subject not found"])
+        self.assertFalse(Question.objects.exists())
+
+    def test_stale_running_jobs_are_requeued(self):
+        stale, fresh = self.enqueue(), self.enqueue()
+        claim_next_job(), claim_next_job()
+        ImportJob.objects.filter(id=stale).update(updated_at=timezone.now() - timezone.timedelta(minutes=20))
+
+        self.assertEqual(requeue_stale_jobs(600), 1)
+        self.assertEqual(ImportJob.objects.get(id=stale).status, ImportJob.STATUS_PENDING)
+        self.assertEqual(ImportJob.objects.get(id=fresh).status, ImportJob.STATUS_RUNNING)
+        self.assertEqual(claim_next_job().id, stale)
+
+
+class ImportProgressTests(TransactionTestCase):
+    @mock.patch('quizzMaster.jobs.PUBLISH_INTERVAL', 0.01)
+    def test_progress_is_visible_while_the_import_transaction_is_open(self):
+        job = ImportJob.objects.create(kind=ImportJob.KIND_QUESTIONS, file_name='questions.docx', file_data=b'',
+                                       status=ImportJob.STATUS_RUNNING)
+        seen = []
+
+        def save(done, total):
+            report(done, total)
+            time.sleep(0.2)
+            # Read on another thread, hence another connection.
+            thread = threading.Thread(target=lambda: seen.append(ImportJob.objects.get(pk=job.pk).progress))
+            thread.start()
+            thread.join()
+
+        with ProgressReporter(job) as reporter, transaction.atomic():
+            report = reporter.stage(90, 99)
+            save(1, 2)
+        self.assertEqual(seen, [94])
+
+def open_exam(exam, *candidates):
+    """Assign ``candidates`` to the exam's subject and start a one-hour window."""
+    for candidate in candidates:
+        UserSubject.objects.create(user=candidate, subject_id=exam.subject_id)
+    start = timezone.now() - timezone.timedelta(minutes=10)
+    return ExamSchedule.objects.create(exam=exam, start_time=start, end_time=start + timezone.timedelta(hours=1))
+
+
+def make_png(rgb):
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b'\x00' + bytes(rgb))) + chunk(b'IEND', b''))
+
+
+class CountingStorage(LocalImageStorage):
+    def __init__(self, location):
+        super().__init__(location, '/media/')
+        self.saved = []
+
+    def save(self, blob, name, digest):
+        self.saved.append(digest)
+        return super().save(blob, name, digest)
+
+
+class UploadImagesTests(TestCase):
+    def setUp(self):
+        document = Document()
+        for rgb in [(255, 0, 0), (0, 255, 0), (0, 0, 255)]:
+            document.add_picture(BytesIO(make_png(rgb)))
+        buffer = BytesIO()
+        document.save(buffer)
+        self.document = Document(buffer)
+        # python-docx shares parts between identical pictures, Word does not.
+        image3 = next(rel.target_part for rel in self.document.part.rels.values()
+                      if rel.target_ref.endswith('image3.png'))
+        image3._blob = make_png((255, 0, 0))
+        self.storage = CountingStorage(tempfile.mkdtemp())
+
+    def test_each_reference_gets_its_own_image(self):
+        urls = upload_images(self.document, ['image1.png', 'image2.png', 'missing.png'], storage=self.storage)
+
+        self.assertNotEqual(urls['image1.png'], urls['image2.png'])
+        self.assertIsNone(urls['missing.png'])
+
+    def test_missing_and_failed_images_are_reported(self):
+        class FailingStorage(CountingStorage):
+            def save(self, blob, name, digest):
+                raise OSError('quota exceeded')
+
+        problems = []
+        with self.assertLogs('quizzMaster.images', 'WARNING') as logs:
+            urls = upload_images(self.document, ['image1.png', 'missing.png'],
+                                 storage=FailingStorage(self.storage.location), problems=problems)
+        self.assertEqual(urls, {'image1.png': None, 'missing.png': None})
+        self.assertEqual(problems, ["Image missing.png not found in document",
+                                    "Error uploading image image1.png: quota exceeded"])
+        self.assertEqual(len(logs.output), 2)
+
+    def test_identical_images_upload_once(self):
+        urls = upload_images(self.document, ['image1.png', 'image2.png', 'image3.png'], storage=self.storage)
+
+        self.assertEqual(urls['image1.png'], urls['image3.png'])
+        self.assertEqual(len(self.storage.saved), 2)
+
+
+class GradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=4, subject=subject)
+        save_questions(make_questions(4), self.exam, subject)
+        self.questions = list(Question.objects.order_by('id'))
+        self.user = User.objects.create(username='candidate', email='candidate@example.com',
+                                        role=Role.objects.create(name='Candidate'))
+
+    def choice(self, question, option):
+        return Choice.objects.get(question=question, option=option).id
+
+    def test_scores_choice_ids_and_options_without_queries(self):
+        key = get_answer_key(self.exam.id)
+        answers = {
+            str(self.questions[0].id): self.choice(self.questions[0], 'b'),
+            str(self.questions[1].id): 'B',
+            str(self.questions[2].id): self.choice(self.questions[2], 'a'),
+        }
+
+        with self.assertNumQueries(0):
+            self.assertEqual(key.score(answers), 5.0)
+
+    def test_answer_key_recompiles_after_change(self):
+        get_answer_key(self.exam.id)
+        question = self.questions[0]
+        answer = CorrectAnswer.objects.get(question=question)
+        answer.choice_id = self.choice(question, 'a')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            answer.save()
+        self.assertEqual(get_answer_key(self.exam.id).score({str(question.id): 'a'}), 2.5)
+
+    def test_regrade_exam_scores_in_batch(self):
+        all_b = {str(q.id): self.choice(q, 'b') for q in self.questions}
+        users = [self.user] + [
+            User.objects.create(username=f'sv{i}', email=f'sv{i}@example.com', role=self.user.role) for i in range(2)
+        ]
+        Submission.objects.bulk_create([
+            Submission(exam=self.exam, user=user, score=0, answers=answers)
+            for user, answers in zip(users, [all_b, {}, {str(self.questions[0].id): self.choice(self.questions[0], 'b')}])
+        ])
+
+        self.assertEqual(regrade_exam(self.exam.id, batch_size=2), 3)
+        self.assertEqual(list(Submission.objects.order_by('id').values_list('score', flat=True)), [10.0, 0.0, 2.5])
+
+    def test_candidates_cannot_edit_or_read_other_submissions(self):
+        other = User.objects.create(username='other', email='other@example.com', role=self.user.role)
+        own = Submission.objects.create(exam=self.exam, user=self.user, score=0, answers={})
+        theirs = Submission.objects.create(exam=self.exam, user=other, score=0, answers={})
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.user).access_token}')
+        edit = {"answers": {str(self.questions[0].id): self.choice(self.questions[0], 'b')}}
+        for submission in (own, theirs):
+            self.assertEqual(client.patch(f'/api/submissions/{submission.id}/', edit, format='json').status_code, 403)
+            self.assertEqual(client.delete(f'/api/submissions/{submission.id}/').status_code, 403)
+        self.assertEqual(client.get(f'/api/submissions/{theirs.id}/').status_code, 404)
+        self.assertEqual([row["id"] for row in client.get('/api/submissions/').data["results"]], [own.id])
+
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(admin).access_token}')
+        response = client.patch(f'/api/submissions/{theirs.id}/', edit, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["score"], 2.5)
+
+
+class ExamPaperTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=3, subject=subject)
+        save_questions(make_questions(3), self.exam, subject)
+        self.candidate = User.objects.create(username='candidate', email='candidate@example.com',
+                                             role=Role.objects.create(name='Candidate'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.candidate)
+        self.url = f'/api/exams/{self.exam.id}/paper/'
+        self.schedule = open_exam(self.exam, self.candidate)
+
+    def test_paper_has_choices_but_no_answers(self):
+        paper = self.client.get(self.url).json()
+
+        self.assertEqual(len(paper["questions"]), 3)
+        self.assertEqual([c["option"] for c in paper["questions"][0]["choices"]], list("abcd"))
+        self.assertNotIn("correct", self.client.get(self.url).content.decode())
+
+    def test_cached_paper_is_served_without_queries(self):
+        self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_paper_is_rebuilt_after_choice_change(self):
+        self.client.get(self.url)
+        choice = Choice.objects.order_by('id').first()
+        choice.choice_text = 'Changed'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            choice.save()
+        choices = [c for q in self.client.get(self.url).json()["questions"] for c in q["choices"]]
+        self.assertIn({"id": choice.id, "option": choice.option, "choice_text": 'Changed'}, choices)
+
+    def test_candidate_order_is_stable_and_graded_back(self):
+        paper = self.client.get(self.url).json()
+        self.assertEqual(self.client.get(self.url).json(), paper)
+
+        correct = set(CorrectAnswer.objects.values_list('choice_id', flat=True))
+        answers = {
+            str(q["id"]): next(c["option"] for c in q["choices"] if c["id"] in correct)
+            for q in paper["questions"]
+        }
+        self.assertEqual(get_answer_key(self.exam.id).score(answers, self.candidate.id), 10.0)
+
+    def test_candidates_only_see_running_exams_of_their_subjects(self):
+        other = User.objects.create(username='other', email='other@example.com', role=self.candidate.role)
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(self.url).status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule.delete()
+            ExamSchedule.objects.create(exam=self.exam, start_time=timezone.now() + timezone.timedelta(hours=1),
+                                        end_time=timezone.now() + timezone.timedelta(hours=2))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.patch(f'/api/exams/{self.exam.id}/draft/', {"answers": {}},
+                                           format='json').status_code, 403)
+
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        client.force_authenticate(admin)
+        self.assertEqual(client.get(self.url).status_code, 200)
+
+
+class RoleTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin', email='admin@example.com',
+                                         role=Role.objects.create(name='Admin'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.admin).access_token}')
+
+    def test_permission_checks_use_token_claims(self):
+        # Only the roles list should reach the database.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/roles/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_role_change_rejects_old_tokens(self):
+        self.admin.role = Role.objects.create(name='Candidate')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.save()
+
+        self.assertEqual(self.client.get('/api/roles/').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.admin).access_token}')
+        self.assertEqual(self.client.get('/api/roles/').status_code, 403)
+
+    def test_revocation_survives_cache_loss(self):
+        self.admin.role = Role.objects.create(name='Candidate')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.save()
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/roles/').status_code, 401)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/roles/').status_code, 401)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        role = Role.objects.create(name='Admin')
+        User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com', role=role) for i in range(5)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.first())
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        url = '/api/users/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 2)
+            seen.extend(user["id"] for user in page["results"])
+            url = page["next"]
+
+        self.assertEqual(sorted(seen), sorted(User.objects.values_list('id', flat=True)))
+
+    def test_same_timestamp_rows_page_by_id_without_offset(self):
+        User.objects.update(created_at=timezone.now())
+        expected = list(User.objects.order_by('-id').values_list('id', flat=True))
+
+        pages, url = [], '/api/users/?page_size=2'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                page = self.client.get(url).json()
+                pages.append(page)
+                url = page["next"]
+        self.assertEqual([user["id"] for page in pages for user in page["results"]], expected)
+        self.assertFalse(any('OFFSET' in query['sql'].upper() for query in queries.captured_queries))
+
+        back = self.client.get(pages[-1]["previous"]).json()
+        self.assertEqual(back["results"], pages[-2]["results"])
+
+    def test_malformed_cursor_is_not_found(self):
+        self.assertEqual(self.client.get('/api/users/?cursor=cD1ub3BlfHg%3D').status_code, 404)
+
+    def test_page_size_is_capped(self):
+        request = Request(APIRequestFactory().get('/api/users/', {'page_size': 100000}))
+
+        self.assertEqual(CreatedAtCursorPagination().get_page_size(request), CreatedAtCursorPagination.max_page_size)
+
+
+class HotPathIndexTests(TestCase):
+    """The exam and grading lookups are planned on the composite indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subject = Subject.objects.create(name='Vue.js')
+        cls.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=40, subject=cls.subject)
+        save_questions(make_questions(40), cls.exam, cls.subject)
+        cls.user = User.objects.create(username='candidate', email='candidate@example.com',
+                                       role=Role.objects.create(name='Candidate'))
+        now = timezone.now()
+        ExamSchedule.objects.bulk_create([
+            ExamSchedule(exam=cls.exam, start_time=now + timezone.timedelta(hours=i),
+                         end_time=now + timezone.timedelta(hours=i, minutes=30))
+            for i in range(40)
+        ])
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        names = [index_name]
+        if connection.vendor == 'sqlite':
+            # SQLite names the index behind a UNIQUE constraint itself.
+            names.append(f'sqlite_autoindex_{queryset.model._meta.db_table}_')
+        self.assertTrue(any(name in plan for name in names), plan)
+
+    def test_choice_by_question_and_option(self):
+        question = Question.objects.first()
+        self.assertUsesIndex(Choice.objects.filter(question=question, option='b'), 'choice_question_option_uniq')
+
+    def test_correct_answer_by_question(self):
+        question_ids = list(Question.objects.values_list('id', flat=True)[:10])
+        self.assertUsesIndex(
+            CorrectAnswer.objects.filter(question_id__in=question_ids).values_list('choice_id'),
+            'correctanswer_question_choice_uniq',
+        )
+
+    def test_exam_question_by_exam(self):
+        self.assertUsesIndex(
+            ExamQuestion.objects.filter(exam=self.exam).values_list('question_id'),
+            'examquestion_exam_question_uniq',
+        )
+
+    def test_submission_by_exam_and_user(self):
+        self.assertUsesIndex(Submission.objects.filter(exam=self.exam, user=self.user), 'submission_exam_user_uniq')
+
+    def test_schedule_by_time_range(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            ExamSchedule.objects.filter(start_time__lt=now + timezone.timedelta(hours=2), end_time__gt=now),
+            'examschedule_time_range_idx',
+        )
+
+
+class ItemAnalysisTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=4, subject=subject)
+        save_questions(make_questions(4), self.exam, subject)
+        self.user = User.objects.create(username='candidate', email='candidate@example.com',
+                                        role=Role.objects.create(name='Candidate'))
+        self.choices = [
+            list(Choice.objects.filter(question=q).order_by('option').values_list('id', flat=True))
+            for q in Question.objects.order_by('id')
+        ]
+        self.question_ids = list(Question.objects.order_by('id').values_list('id', flat=True))
+        rng = np.random.default_rng(7)
+        self.responses = rng.integers(0, 4, size=(60, 4))
+        self.responses[:20, :] = 1  # strong candidates pick "b", the correct option
+
+    def submit(self, rows):
+        seeded = User.objects.count()
+        users = User.objects.bulk_create([
+            User(username=f'sv{seeded + i}', email=f'sv{seeded + i}@example.com', role=self.user.role)
+            for i in range(len(rows))
+        ])
+        Submission.objects.bulk_create([
+            Submission(exam=self.exam, user=user, score=0, answers={
+                str(question_id): self.choices[q][row[q]] for q, question_id in enumerate(self.question_ids)
+            })
+            for user, row in zip(users, rows)
+        ])
+
+    def test_incremental_update_matches_direct_computation(self):
+        self.submit(self.responses[:25])
+        self.assertEqual(update_exam_stats(self.exam.id), 25)
+        self.submit(self.responses[25:])
+        self.assertEqual(update_exam_stats(self.exam.id), 35)
+
+        correct = (self.responses == 1).astype(float)
+        totals = correct.sum(axis=1)
+        for q, stats in enumerate(QuestionStats.objects.filter(exam=self.exam).order_by('question_id')):
+            self.assertAlmostEqual(stats.p_value, correct[:, q].mean())
+            self.assertAlmostEqual(stats.point_biserial, np.corrcoef(correct[:, q], totals)[0, 1])
+            self.assertEqual(sum(stats.choice_counts.values()), 60)
+        k = correct.shape[1]
+        p = correct.mean(axis=0)
+        kr20 = k / (k - 1) * (1 - (p * (1 - p)).sum() / totals.var())
+        self.assertAlmostEqual(ExamItemStats.objects.get(exam=self.exam).kr20, kr20)
+
+    def test_reports_reject_non_numeric_ids(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='admin', email='admin@example.com',
+                                                      role=Role.objects.create(name='Admin')))
+        self.assertEqual(client.get(f'/api/exams/{self.exam.id}/item-stats/').status_code, 200)
+        self.assertEqual(client.get('/api/exams/abc/item-stats/').status_code, 404)
+        self.assertEqual(client.get('/api/subjects/abc/item-stats/').status_code, 404)
+
+    def test_edited_deleted_and_late_submissions_are_recounted(self):
+        self.submit(self.responses[:10])
+        update_exam_stats(self.exam.id)
+        first = Submission.objects.order_by('id').first()
+        first.answers = {}
+        first.save()
+        self.assertEqual(update_exam_stats(self.exam.id), 10)
+        self.assertEqual(sum(QuestionStats.objects.filter(exam=self.exam).first().choice_counts.values()), 9)
+
+        Submission.objects.filter(id=first.id).delete()
+        self.assertEqual(update_exam_stats(self.exam.id), 9)
+
+        # A lower id that commits after the stats have moved past it.
+        late_id = first.id
+        self.submit(self.responses[10:11])
+        Submission.objects.filter(id=Submission.objects.latest('id').id).update(id=late_id)
+        self.assertEqual(update_exam_stats(self.exam.id), 10)
+        self.assertEqual(ExamItemStats.objects.get(exam=self.exam).submissions, 10)
+        self.assertEqual(update_exam_stats(self.exam.id), 0)
+
+
+class SubmissionLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, 'submissions.log')
+        settings = override_settings(QUIZZ_SUBMISSION_INGEST='log', QUIZZ_SUBMISSION_LOG=self.log)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=2, subject=subject)
+        save_questions(make_questions(2), self.exam, subject)
+        role = Role.objects.create(name='Candidate')
+        self.users = [
+            User.objects.create(username=f'candidate{i}', email=f'candidate{i}@example.com', role=role)
+            for i in range(3)
+        ]
+        open_exam(self.exam, *self.users)
+        self.answers = {
+            str(question.id): question.choices.get(option='b').id for question in Question.objects.all()
+        }
+
+    def submit(self, user, answers=None, exam_id=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(user).access_token}')
+        data = {"exam_id": exam_id or self.exam.id, "answers": self.answers if answers is None else answers}
+        return client.post('/api/submissions/', data, format='json')
+
+    def test_submissions_are_logged_then_drained_once(self):
+        prewarm_exam(self.exam.id)
+        # The stored-submission check and the draft lookup: an uncached
+        # draft may still have a flushed row.
+        with self.assertNumQueries(2):
+            response = self.submit(self.users[0])
+        self.assertEqual(response.status_code, 202)
+        self.assertNotIn("score", response.data)
+        self.submit(self.users[1])
+        self.assertEqual(self.submit(self.users[0], {}).status_code, 400)
+        self.assertFalse(Submission.objects.exists())
+
+        self.assertEqual(drain(batch_size=2), 2)
+        self.assertEqual(read_checkpoint(), os.path.getsize(self.log))
+        self.assertEqual(Submission.objects.get(user=self.users[0]).score, 10)
+
+        # Losing the checkpoint after a crash replays the log without duplicates.
+        os.remove(self.log + '.offset')
+        self.submit(self.users[2])
+        self.assertEqual(drain(), 1)
+        self.assertEqual(Submission.objects.count(), 3)
+
+    def test_repeat_is_rejected_after_drain_and_cache_loss(self):
+        self.submit(self.users[0], {})
+        drain()
+        cache.clear()
+        response = self.submit(self.users[0])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("exam_id", response.data)
+        self.assertEqual(drain(), 0)
+        self.assertEqual(Submission.objects.get().score, 0)
+
+    def test_deleted_user_does_not_block_the_drain(self):
+        self.submit(self.users[0])
+        self.users[0].delete()
+        self.submit(self.users[1])
+        self.assertEqual(drain(), 1)
+        self.assertEqual(read_checkpoint(), os.path.getsize(self.log))
+        self.assertEqual(Submission.objects.get().user, self.users[1])
+
+    def test_row_stored_meanwhile_does_not_block_the_drain(self):
+        self.submit(self.users[0])
+        with mock.patch('quizzMaster.ingest.Submission.objects.filter', return_value=Submission.objects.none()):
+            Submission.objects.create(exam=self.exam, user=self.users[0], answers={}, score=0)
+            drain()
+        self.assertEqual(read_checkpoint(), os.path.getsize(self.log))
+        self.assertEqual(Submission.objects.get().score, 0)
+
+    def test_partial_trailing_line_waits_for_next_drain(self):
+        self.submit(self.users[0])
+        with open(self.log, 'ab') as f:
+            f.write(b'{"exam":')
+        self.assertEqual(drain(), 1)
+        self.assertEqual(drain(), 0)
+
+    def test_unknown_exam_is_rejected(self):
+        response = self.submit(self.users[0], exam_id=self.exam.id + 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_unassigned_candidate_is_rejected(self):
+        outsider = User.objects.create(username='outsider', email='outsider@example.com', role=self.users[0].role)
+        self.assertEqual(self.submit(outsider).status_code, 403)
+        self.assertFalse(os.path.exists(self.log))
+
+
+class SubmissionDraftTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=2, subject=subject)
+        save_questions(make_questions(2), self.exam, subject)
+        self.user = User.objects.create(username='candidate', email='candidate@example.com',
+                                        role=Role.objects.create(name='Candidate'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.user).access_token}')
+        self.questions = list(Question.objects.order_by('id'))
+        self.url = f'/api/exams/{self.exam.id}/draft/'
+        open_exam(self.exam, self.user)
+
+    def autosave(self, answers):
+        return self.client.patch(self.url, {"answers": answers}, format='json')
+
+    @override_settings(QUIZZ_DRAFT_FLUSH_INTERVAL=3600)
+    def test_deltas_are_coalesced_in_cache(self):
+        q1, q2 = self.questions
+        self.autosave({str(q1.id): 'a'})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.autosave({str(q2.id): 'b'}).status_code, 200)
+            self.autosave({str(q1.id): None})
+        self.assertFalse(SubmissionDraft.objects.exists())
+        self.assertEqual(self.client.get(self.url).data["answers"], {str(q2.id): 'b'})
+
+        response = self.client.post('/api/submissions/', {"exam_id": self.exam.id, "answers": {}}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Submission.objects.get().answers, {str(q2.id): 'b'})
+        self.assertEqual(self.client.get(self.url).data["answers"], {})
+
+    def test_submission_needs_a_running_window(self):
+        ExamSchedule.objects.all().delete()
+        response = self.client.post('/api/submissions/', {"exam_id": self.exam.id, "answers": {}}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_second_submission_is_rejected(self):
+        data = {"exam_id": self.exam.id, "answers": {}}
+        self.assertEqual(self.client.post('/api/submissions/', data, format='json').status_code, 201)
+        response = self.client.post('/api/submissions/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("exam_id", response.data)
+        self.assertEqual(Submission.objects.count(), 1)
+
+    @override_settings(QUIZZ_DRAFT_FLUSH_INTERVAL=0)
+    def test_draft_is_flushed_and_survives_cache_loss(self):
+        q1, _ = self.questions
+        self.autosave({str(q1.id): 'c'})
+        self.assertEqual(SubmissionDraft.objects.get().answers, {str(q1.id): 'c'})
+        cache.clear()
+        self.assertEqual(self.client.get(self.url).data["answers"], {str(q1.id): 'c'})
+
+    @override_settings(QUIZZ_DRAFT_FLUSH_INTERVAL=0)
+    def test_flushed_draft_is_submitted_after_cache_loss(self):
+        q1, q2 = self.questions
+        self.autosave({str(q1.id): 'c'})
+        cache.clear()
+        response = self.client.post(
+            '/api/submissions/', {"exam_id": self.exam.id, "answers": {str(q2.id): 'd'}}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Submission.objects.get().answers, {str(q1.id): 'c', str(q2.id): 'd'})
+        self.assertFalse(SubmissionDraft.objects.exists())
+
+    def test_unknown_question_is_rejected(self):
+        self.assertEqual(self.autosave({"999999": 'a'}).status_code, 400)
+
+
+class ExamScheduleConflictTests(TestCase):
+    def setUp(self):
+        subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=2, subject=subject)
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(admin).access_token}')
+        self.start = timezone.now().replace(microsecond=0) + timezone.timedelta(days=1)
+        self.existing = ExamSchedule.objects.create(exam=self.exam, start_time=self.start,
+                                                    end_time=self.start + timezone.timedelta(hours=1))
+
+    def slot(self, start_minutes, end_minutes):
+        return {
+            "exam": self.exam.id,
+            "start_time": (self.start + timezone.timedelta(minutes=start_minutes)).isoformat(),
+            "end_time": (self.start + timezone.timedelta(minutes=end_minutes)).isoformat(),
+        }
+
+    def test_overlapping_schedule_is_rejected(self):
+        self.assertEqual(self.client.post('/api/exam-schedules/', self.slot(30, 90), format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/exam-schedules/', self.slot(60, 90), format='json').status_code, 201)
+
+    def test_bulk_reports_conflicts_and_inserts_nothing(self):
+        slots = [self.slot(60, 120), self.slot(100, 130), self.slot(-30, 10), self.slot(200, 260)]
+        response = self.client.post('/api/exam-schedules/bulk/', {"schedules": slots}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["conflicts"], [
+            {"slot": 1, "overlaps_slot": 0},
+            {"slot": 2, "overlaps_schedule": self.existing.id},
+        ])
+        self.assertEqual(ExamSchedule.objects.count(), 1)
+
+    def test_sweep_reports_slots_hidden_behind_a_long_one(self):
+        day = timezone.timedelta(days=1)
+        hour = timezone.timedelta(hours=1)
+        slots = [
+            {"exam_id": 1, "start_time": self.start, "end_time": self.start + day},
+            {"exam_id": 1, "start_time": self.start + hour, "end_time": self.start + 2 * hour},
+            {"exam_id": 1, "start_time": self.start + 3 * hour, "end_time": self.start + 4 * hour},
+            {"exam_id": 2, "start_time": self.start + hour, "end_time": self.start + 2 * hour},
+        ]
+        self.assertEqual(find_conflicts(slots), [{"slot": 1, "overlaps_slot": 0}, {"slot": 2, "overlaps_slot": 0}])
+
+    def test_bulk_inserts_in_one_transaction(self):
+        slots = [self.slot(60 * i, 60 * i + 45) for i in range(1, 100)]
+        # Savepoint, exam lock, overlap lookup, insert, release.
+        with self.assertNumQueries(5):
+            response = self.client.post('/api/exam-schedules/bulk/', slots, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ExamSchedule.objects.count(), 100)
+
+
+class PrewarmTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=2, subject=self.subject)
+        save_questions(make_questions(2), self.exam, self.subject)
+        self.candidate_role = Role.objects.create(name='Candidate')
+        self.candidate = User.objects.create(username='candidate', email='candidate@example.com', role=self.candidate_role)
+        UserSubject.objects.create(user=self.candidate, subject=self.subject)
+        self.start = timezone.now() + timezone.timedelta(minutes=10)
+        ExamSchedule.objects.create(exam=self.exam, start_time=self.start, end_time=self.start + timezone.timedelta(hours=1))
+
+    def test_upcoming_exam_is_served_warm(self):
+        self.assertEqual(upcoming_exam_ids(5), [])
+        self.assertEqual(upcoming_exam_ids(15), [self.exam.id])
+        self.assertEqual(prewarm_exam(self.exam.id), {"questions": 2, "candidates": 1})
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.candidate).access_token}')
+        with mock.patch('quizzMaster.prewarm.now', return_value=self.start), self.assertNumQueries(0):
+            self.assertEqual(client.get(f'/api/exams/{self.exam.id}/paper/').status_code, 200)
+            self.assertEqual(eligible_candidates(self.exam.id), [self.candidate.id])
+
+    def test_candidate_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='admin', email='admin@example.com',
+                                                      role=Role.objects.create(name='Admin')))
+        response = client.get(f'/api/exams/{self.exam.id}/candidates/')
+        self.assertEqual(response.data, {"candidates": [self.candidate.id]})
+        self.assertEqual(client.get('/api/exams/abc/candidates/').status_code, 404)
+
+    def test_candidate_list_follows_assignments(self):
+        prewarm_exam(self.exam.id)
+        other = User.objects.create(username='other', email='other@example.com', role=self.candidate_role)
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSubject.objects.create(user=other, subject=self.subject)
+        self.assertEqual(eligible_candidates(self.exam.id), [self.candidate.id, other.id])
+        with self.assertNumQueries(0):
+            # Assignments have their own version; the paper and key stay warm.
+            get_paper_bytes(self.exam.id)
+            get_answer_key(self.exam.id)
+
+        other.role = Role.objects.create(name='Admin')
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        self.assertEqual(eligible_candidates(self.exam.id), [self.candidate.id])
+
+
+class AsyncExamEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=2, subject=subject)
+        save_questions(make_questions(2), self.exam, subject)
+        self.candidate = User.objects.create(username='candidate', email='candidate@example.com',
+                                             role=Role.objects.create(name='Candidate'))
+        self.token = str(tokens_for_user(self.candidate).access_token)
+        self.headers = {"Authorization": f'Bearer {self.token}'}
+        self.base = f'/api/async/exams/{self.exam.id}'
+        self.questions = list(Question.objects.order_by('id'))
+        open_exam(self.exam, self.candidate)
+
+    async def test_paper_matches_sync_endpoint(self):
+        response = await self.async_client.get(f'{self.base}/paper/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        sync_client = APIClient()
+        sync_client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        sync_paper = await sync_to_async(sync_client.get)(f'/api/exams/{self.exam.id}/paper/')
+        self.assertEqual(response.json(), sync_paper.json())
+
+    async def test_autosave_then_submit(self):
+        q1, q2 = self.questions
+        correct = await sync_to_async(lambda: q1.choices.get(option='b').id)()
+        response = await self.async_client.patch(f'{self.base}/draft/', {"answers": {str(q1.id): correct}},
+                                                 content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        response = await self.async_client.post(f'{self.base}/submit/', {"answers": {str(q2.id): None}},
+                                                content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["score"], 5)
+        submission = await Submission.objects.aget(exam=self.exam, user=self.candidate)
+        self.assertEqual(submission.answers, {str(q1.id): correct, str(q2.id): None})
+
+    async def test_logged_submit_is_accepted_once(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            QUIZZ_SUBMISSION_INGEST='log', QUIZZ_SUBMISSION_LOG=os.path.join(directory, 'submissions.log'),
+        ):
+            responses = [
+                await self.async_client.post(f'{self.base}/submit/', {"answers": {}}, content_type='application/json',
+                                             headers=self.headers)
+                for _ in range(2)
+            ]
+        self.assertEqual([response.status_code for response in responses], [202, 400])
+        self.assertNotIn("score", responses[0].json())
+
+    async def test_time_remaining(self):
+        response = await self.async_client.get(f'{self.base}/time-remaining/', headers=self.headers)
+        self.assertEqual(response.json()["status"], 'running')
+        self.assertAlmostEqual(response.json()["remaining_seconds"], 50 * 60, delta=5)
+
+    def test_sync_time_remaining_rejects_non_numeric_id(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(client.get(f'/api/exams/{self.exam.id}/time-remaining/').json()["status"], 'running')
+        self.assertEqual(client.get('/api/exams/abc/time-remaining/').status_code, 404)
+
+    async def test_authentication_and_role_are_checked(self):
+        self.assertEqual((await self.async_client.get(f'{self.base}/paper/')).status_code, 401)
+        admin = await User.objects.acreate(username='admin', email='admin@example.com',
+                                           role=await Role.objects.acreate(name='Admin'))
+        token = await sync_to_async(lambda: str(tokens_for_user(admin).access_token))()
+        response = await self.async_client.post(f'{self.base}/submit/', {}, content_type='application/json',
+                                                headers={"Authorization": f'Bearer {token}'})
+        self.assertEqual(response.status_code, 403)
+
+        other = await User.objects.acreate(username='other', email='other@example.com', role_id=self.candidate.role_id)
+        token = await sync_to_async(lambda: str(tokens_for_user(other).access_token))()
+        response = await self.async_client.get(f'{self.base}/paper/', headers={"Authorization": f'Bearer {token}'})
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.post(f'{self.base}/submit/', {}, content_type='application/json',
+                                                headers={"Authorization": f'Bearer {token}'})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(await Submission.objects.filter(user=other).aexists())
+
+
+class AsgiEntrypointTests(SimpleTestCase):
+    def test_persistent_connections_are_disabled(self):
+        databases = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:', 'CONN_MAX_AGE': 60}}
+        with override_settings(DATABASES=databases):
+            importlib.reload(importlib.import_module('mysite.asgi'))
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 0)
+
+
+@override_settings(QUIZZ_READ_REPLICA='replica')
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory(headers={"Authorization": 'Bearer token-a'})
+
+    def route(self, method, status=200, **headers):
+        seen = {}
+
+        def view(request):
+            seen["alias"] = ReplicaRouter().db_for_read(Question)
+            return HttpResponse(status=status)
+
+        ReplicaRoutingMiddleware(view)(getattr(self.factory, method)('/api/questions/', headers=headers))
+        return seen["alias"]
+
+    def test_safe_reads_use_replica(self):
+        self.assertEqual(self.route('get'), 'replica')
+        self.assertEqual(ReplicaRouter().db_for_read(Question), 'default')
+        self.assertEqual(ReplicaRouter().db_for_write(Question), 'default')
+
+    def test_reads_stick_to_primary_after_own_write(self):
+        self.assertEqual(self.route('post', status=400), 'default')
+        self.assertEqual(self.route('get'), 'replica')
+        self.route('post', status=201)
+        self.assertEqual(self.route('get'), 'default')
+        self.assertEqual(self.route('get', Authorization='Bearer token-b'), 'replica')
+
+    @override_settings(QUIZZ_READ_REPLICA=None)
+    def test_no_replica_configured(self):
+        self.assertEqual(self.route('get'), 'default')
+
+
+@override_settings(DATABASE_ROUTERS=['mysite.db_routers.ReplicaRouter'])
+class ReplicaCacheFillTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=2, subject=subject)
+        save_questions(make_questions(2), self.exam, subject)
+
+    def test_versioned_cache_fills_read_the_primary(self):
+        # Outside a transaction (hence TransactionTestCase) the router would pick
+        # the replica; there is no 'replica' database here, so such a query fails.
+        token = _read_alias.set('replica')
+        try:
+            self.assertEqual(get_answer_key(self.exam.id).num_questions, 2)
+            self.assertEqual(len(json.loads(get_paper_bytes(self.exam.id))["questions"]), 2)
+            self.assertEqual(eligible_candidates(self.exam.id), [])
+        finally:
+            _read_alias.reset(token)
+
+
+class QuestionSearchTests(TestCase):
+    def setUp(self):
+        subject = Subject.objects.create(name='Lập trình Web')
+        exam = Exam.objects.create(exam_code='EXAM_WEB_001', duration=60, num_questions=3, subject=subject)
+        questions = make_questions(3)
+        questions[0]["question_text"] = "Đâu là thẻ dùng để tạo liên kết?"
+        questions[1]["question_text"] = "Thuộc tính nào tạo liên kết mở trong tab mới?"
+        questions[1]["choices"][0]["text"] = "target=_blank"
+        save_questions(questions, exam, subject)
+        self.questions = list(Question.objects.order_by('id'))
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(admin).access_token}')
+
+    def search(self, query):
+        return [row["id"] for row in self.client.get('/api/questions/search/', {"q": query}).data["results"]]
+
+    def test_fold_strips_vietnamese_diacritics(self):
+        self.assertEqual(fold("Câu 1: Đáp án ĐÚNG là"), "cau 1 dap an dung la")
+
+    def test_results_are_ranked_and_accent_insensitive(self):
+        first, second, third = self.questions
+        self.assertEqual(self.search("lien ket"), [second.id, first.id])
+        self.assertEqual(self.search("tạo liên kết tab"), [second.id, first.id])
+        self.assertEqual(self.search("blank"), [second.id])
+        self.assertEqual(self.search("lap trinh"), [third.id, second.id, first.id])
+
+    def test_document_follows_choice_changes(self):
+        choice = Choice.objects.filter(question=self.questions[2]).first()
+        choice.choice_text = "Thẻ anchor"
+        choice.save()
+        self.assertEqual(self.search("the anchor"), [self.questions[2].id, self.questions[0].id])
+
+
+class QuestionDedupeTests(TestCase):
+    def setUp(self):
+        self.subject = Subject.objects.create(name='Vue.js')
+        self.first = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=3, subject=self.subject)
+        self.second = Exam.objects.create(exam_code='EXAM_VUEJS_002', duration=60, num_questions=3, subject=self.subject)
+
+    def long_questions(self):
+        questions = make_questions(3)
+        for i, question in enumerate(questions):
+            question["question_text"] = f"Which directive renders list number {i} of items from an array in a Vue template"
+        return questions
+
+    def test_reimport_links_existing_questions(self):
+        save_questions(make_questions(3), self.first, self.subject)
+        questions = make_questions(3)
+        questions[0]["question_text"] = "QUESTION 0!"
+        rows, matches = save_questions(questions, self.second, self.subject)
+
+        self.assertEqual(rows, 3)
+        self.assertEqual(Question.objects.count(), 3)
+        self.assertEqual([match["match"] for match in matches], ['exact'] * 3)
+        self.assertEqual(
+            set(ExamQuestion.objects.filter(exam=self.second).values_list('question_id', flat=True)),
+            set(Question.objects.values_list('id', flat=True)),
+        )
+
+    def test_repeats_in_one_file_are_saved_once(self):
+        rows, matches = save_questions(make_questions(2) + make_questions(1), self.first, self.subject)
+
+        self.assertEqual(Question.objects.count(), 2)
+        self.assertEqual(ExamQuestion.objects.filter(exam=self.first).count(), 2)
+        self.assertEqual(matches, [{"index": 2, "question_id": Question.objects.order_by('id')[0].id, "match": "repeated", "similarity": 1.0}])
+
+    def test_near_duplicate_needs_same_answer(self):
+        save_questions(self.long_questions(), self.first, self.subject)
+        questions = self.long_questions()
+        questions[0]["question_text"] = questions[0]["question_text"].replace("template", "templates")
+        questions[1]["question_text"] = questions[1]["question_text"].replace("template", "templates")
+        questions[1]["correct_choice"] = "c"
+        _, matches = save_questions(questions[:2], self.second, self.subject)
+
+        self.assertEqual([(match["index"], match["match"]) for match in matches], [(0, 'near')])
+        self.assertEqual(Question.objects.count(), 4)
+
+    def test_bands_follow_question_edits_and_deletes(self):
+        save_questions(self.long_questions(), self.first, self.subject)
+        self.assertEqual(QuestionBand.objects.count(), 3 * 16)
+        question = Question.objects.order_by('id').first()
+        question.question_text = "Which hook runs after a Vue component is mounted"
+        question.save()
+        question.refresh_from_db()
+        self.assertEqual(
+            set(QuestionBand.objects.filter(question=question).values_list('band', 'bucket')),
+            set(band_buckets(bytes(question.minhash))),
+        )
+        # The old buckets are gone, so the old text is new again.
+        _, matches = save_questions(self.long_questions()[:1], self.second, self.subject)
+        self.assertEqual(matches, [])
+
+        question.delete()
+        self.assertFalse(QuestionBand.objects.filter(question_id=question.id).exists())
+
+    def test_merge_rewrites_submissions(self):
+        save_questions(make_questions(2), self.first, self.subject)
+        with override_settings(QUIZZ_DEDUPE_NEAR=False):
+            Question.objects.update(fingerprint='')
+            save_questions(make_questions(2), self.second, self.subject)
+        Question.objects.update(fingerprint='')
+        call_command('dedupe_questions', stdout=StringIO())
+        exact, _ = duplicate_groups(self.subject.id)
+        self.assertEqual(len(exact), 2)
+
+        keep, duplicate = exact[0]
+        kept_choice = Choice.objects.get(question_id=keep, option='b')
+        duplicate_choice = Choice.objects.get(question_id=duplicate, option='b')
+        student = User.objects.create(username='student', email='student@example.com', role=Role.objects.create(name='Student'))
+        submission = Submission.objects.create(
+            exam=self.second, user=student, answers={str(duplicate): duplicate_choice.id}, score=10,
+        )
+
+        self.assertEqual(merge_duplicates(exact), 2)
+        self.assertEqual(merge_duplicates(exact), 0)  # the duplicates are gone; nothing left to merge
+        self.assertEqual(Question.objects.count(), 2)
+        self.assertEqual(ExamQuestion.objects.filter(exam=self.second).count(), 2)
+        submission.refresh_from_db()
+        self.assertEqual(submission.answers, {str(keep): kept_choice.id})
+
+
+class ResultExportTests(TestCase):
+    def setUp(self):
+        subject = Subject.objects.create(name='Lập trình Web')
+        self.exam = Exam.objects.create(exam_code='EXAM_WEB_001', duration=60, num_questions=0, subject=subject)
+        other = Exam.objects.create(exam_code='EXAM_WEB_002', duration=60, num_questions=0, subject=subject)
+        student = Role.objects.create(name='Candidate')
+        for i in range(5):
+            user = User.objects.create(username=f'sv{i}', email=f'sv{i}@example.com', role=student)
+            Submission.objects.create(exam=self.exam if i < 3 else other, user=user, answers={}, score=i)
+        self.subject = subject
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(admin).access_token}')
+
+    def test_csv_streams_exam_results(self):
+        response = self.client.get(f'/api/exams/{self.exam.id}/results/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'submission_id,exam_code,subject,username,email,role,score,submitted_at')
+        self.assertEqual([line.split(',')[3] for line in lines[1:]], ['sv0', 'sv1', 'sv2'])
+        self.assertIn('Lập trình Web', lines[1])
+
+    def test_rows_are_read_in_batches(self):
+        with CaptureQueriesContext(connection) as ctx:
+            rows = list(result_rows(Submission.objects.all(), batch_size=2))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+    def test_xlsx_export_of_subject(self):
+        response = self.client.get(f'/api/subjects/{self.subject.id}/results/export/', {"file_format": "xlsx"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'subject-{self.subject.id}-results.xlsx', response['Content-Disposition'])
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)['Results']
+        rows = list(sheet.values)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([row[6] for row in rows[1:]], [0, 1, 2, 3, 4])
+
+    def test_unknown_format_and_exam(self):
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/results/export/', {"file_format": "pdf"}).status_code, 400)
+        self.assertEqual(self.client.get('/api/exams/999/results/export/').status_code, 404)
+
+
+class PaperPrintingTests(TestCase):
+    def setUp(self):
+        subject = Subject.objects.create(name='Vue.js', lecturer='Nguyễn Văn A')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=3, subject=subject)
+        save_questions(make_questions(3), self.exam, subject)
+        candidate = Role.objects.create(name='Candidate')
+        self.students = [
+            User.objects.create(username=f'sv{i}', email=f'sv{i}@example.com', role=candidate) for i in range(3)
+        ]
+        for student in self.students:
+            UserSubject.objects.create(user=student, subject=subject)
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(admin).access_token}')
+
+    def papers(self, **params):
+        response = self.client.get(f'/api/exams/{self.exam.id}/papers/docx/', params)
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        return {name: Document(BytesIO(archive.read(name))) for name in archive.namelist()}
+
+    def test_paper_with_answers_can_be_imported_again(self):
+        document = self.papers(answers='1')['EXAM_VUEJS_001.docx']
+        self.assertEqual(extract_metadata(document), ('Vue.js', 3, 'Nguyễn Văn A'))
+        questions = process_questions_table(document.tables[0], document)
+        self.assertEqual([question["question_text"] for question in questions], ['Question 0', 'Question 1', 'Question 2'])
+        self.assertEqual({question["correct_choice"] for question in questions}, {'B'})
+        self.assertEqual(questions[1]["choices"][2], {"option": "c", "text": "Choice c of 1"})
+
+    @override_settings(QUIZZ_RENDER_WORKERS=2)
+    def test_one_variant_per_candidate_rendered_in_a_pool(self):
+        papers = self.papers(candidates='all')
+        self.assertEqual(sorted(papers), [f'EXAM_VUEJS_001-sv{i}.docx' for i in range(3)])
+        for i, student in enumerate(self.students):
+            paper = json.loads(get_candidate_paper_bytes(self.exam.id, student.id))
+            table = papers[f'EXAM_VUEJS_001-sv{i}.docx'].tables[0]
+            shown = [row.cells[1].text for row in table.rows if row.cells[0].text.startswith('QN=')]
+            self.assertEqual(shown, [question["question_text"] for question in paper["questions"]])
+            self.assertNotIn('ANSWER:', [row.cells[0].text for row in table.rows])
+
+    def test_rejects_bad_candidate_list(self):
+        response = self.client.get(f'/api/exams/{self.exam.id}/papers/docx/', {"candidates": "1,x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class UserProvisioningTests(TestCase):
+    def setUp(self):
+        Role.objects.create(name='Candidate')
+        self.web = Subject.objects.create(name='Lập trình Web')
+        self.vue = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=0, subject=self.vue)
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(admin).access_token}')
+
+    def upload(self, text, **params):
+        upload = BytesIO(text.encode('utf-8'))
+        upload.name = 'users.csv'
+        query = '?' + '&'.join(f'{key}={value}' for key, value in params.items()) if params else ''
+        return self.client.post(f'/api/users/bulk/{query}', {"file": upload}, format='multipart')
+
+    def test_creates_users_and_assignments(self):
+        eligible_candidates(self.exam.id)
+        rows = ''.join(f'sv{i},sv{i}@example.com,secret{i},,Lập trình Web;Vue.js\n' for i in range(3))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload('username,email,password,role,subjects\n' + rows + 'admin,other@example.com,x,,\n')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual(response.data["assigned"], 6)
+        self.assertEqual(response.data["errors"], [{"line": 5, "username": "admin", "message": "username already exists"}])
+        user = User.objects.select_related('role').get(username='sv1')
+        self.assertTrue(user.check_password('secret1'))
+        self.assertEqual(user.role.name, 'Candidate')
+        self.assertEqual(len(eligible_candidates(self.exam.id)), 3)
+
+    def test_existing_user_only_gets_new_subjects(self):
+        self.upload('username,email,password,subjects\nsv0,sv0@example.com,secret,Vue.js\n')
+        response = self.upload('username,email,password,subjects\nsv0,sv0@example.com,,Vue.js;Lập trình Web\n')
+
+        self.assertEqual((response.data["created"], response.data["assigned"]), (0, 1))
+        self.assertEqual(UserSubject.objects.filter(user__username='sv0').count(), 2)
+
+    def test_dry_run_and_bad_rows(self):
+        text = (
+            'username,email,password,subjects\n'
+            'sv0,sv0@example.com,secret,Hoá học\n'
+            'sv1,sv1@example.com,secret,\n'
+            'sv2,SV1@example.com,secret,\n'
+        )
+        response = self.upload(text, dry_run=1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual([error["line"] for error in response.data["errors"]], [2, 4])
+        self.assertFalse(User.objects.filter(username='sv1').exists())
+        self.assertEqual(self.upload('name,email\n').status_code, 400)
+
+    @override_settings(QUIZZ_PROVISION_INLINE_ROWS=2, QUIZZ_HASH_WORKERS=0)
+    def test_large_upload_is_queued(self):
+        rows = ''.join(f'sv{i},sv{i}@example.com,secret{i},,Vue.js\n' for i in range(3))
+        response = self.upload('username,email,password,role,subjects\n' + rows + 'admin,other@example.com,x,,\n')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(User.objects.filter(username__startswith='sv').exists())
+
+        self.assertTrue(run_import_job(claim_next_job()))
+        job = ImportJob.objects.get(pk=response.data["job_id"])
+        self.assertEqual((job.kind, job.status, job.rows_written), (ImportJob.KIND_USERS, ImportJob.STATUS_SUCCEEDED, 6))
+        self.assertEqual(job.errors, ['Line 5 (admin): username already exists'])
+        self.assertTrue(User.objects.get(username='sv2').check_password('secret2'))
+
+    @override_settings(QUIZZ_HASH_WORKERS=2)
+    def test_command_hashes_in_a_pool(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as users:
+            users.write('username,email,password\n')
+            users.writelines(f'sv{i},sv{i}@example.com,secret{i}\n' for i in range(4))
+        self.addCleanup(os.unlink, users.name)
+        call_command('provision_users', users.name, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='sv').count(), 4)
+        self.assertTrue(User.objects.get(username='sv3').check_password('secret3'))
+
+
+@override_settings(QUIZZ_PASSWORD_ITERATIONS=1000)
+class LoginTests(TestCase):
+    def setUp(self):
+        LoginThrottle.reset()
+        self.addCleanup(LoginThrottle.reset)
+        self.user = User.objects.create_user('sv1', 'sv1@example.com', 'secret', role=Role.objects.create(name='Candidate'))
+        self.client = APIClient()
+
+    def login(self, password='secret', username='sv1', **extra):
+        return self.client.post('/api/auth/login/', {"username": username, "password": password}, format='json',
+                                **extra)
+
+    def test_login_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["username"]["email"], 'sv1@example.com')
+
+    def test_hash_is_upgraded_on_login(self):
+        with override_settings(QUIZZ_PASSWORD_ITERATIONS=2000):
+            self.assertEqual(self.login('wrong').status_code, 400)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.user.check_password('secret'))
+
+    @override_settings(QUIZZ_LOGIN_BUCKETS={'username': (2, 0.001), 'ip': (100, 1)})
+    def test_attempts_are_limited_per_username(self):
+        self.assertEqual(self.login('wrong').status_code, 400)
+        self.assertEqual(self.login('wrong').status_code, 400)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.login(username='SV2').status_code, 404)
+        # Failed guesses from one address do not lock the user out elsewhere.
+        self.assertEqual(self.login(REMOTE_ADDR='198.51.100.4').status_code, 200)
+
+    @override_settings(QUIZZ_LOGIN_BUCKETS={'username': (100, 1), 'ip': (2, 0.001)})
+    def test_spoofed_forwarded_for_does_not_escape_the_ip_limit(self):
+        for i in range(2):
+            self.assertEqual(self.login(username=f'x{i}').status_code, 404)
+        self.client.credentials(HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(self.login().status_code, 429)
+
+    def test_token_bucket_refills(self):
+        bucket = TokenBucket(capacity=2, rate=0.5)
+        self.assertEqual([bucket.take('a', now=0), bucket.take('a', now=0)], [0, 0])
+        self.assertEqual(bucket.take('a', now=0), 2)
+        self.assertEqual(bucket.take('a', now=2), 0)
+        self.assertEqual(bucket.take('b', now=2), 0)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=0, subject=self.subject)
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(admin).access_token}')
+
+    def test_unchanged_list_is_not_modified(self):
+        first = self.client.get('/api/subjects/')
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/subjects/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Subject.objects.create(name='Lập trình Web')
+        self.assertEqual(self.client.get('/api/subjects/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_exam_etag_follows_subject_and_deletes(self):
+        url = f'/api/exams/{self.exam.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.subject.name = 'Vue.js 3'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subject.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["subject_name"], 'Vue.js 3')
+
+        listed = self.client.get('/api/exams/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exam.delete()
+        self.assertEqual(self.client.get('/api/exams/', HTTP_IF_NONE_MATCH=listed).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_bulk_import_changes_question_etag(self):
+        etag = self.client.get('/api/questions/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            save_questions(make_questions(2), self.exam, self.subject)
+        response = self.client.get('/api/questions/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_if_modified_since(self):
+        response = self.client.get('/api/roles/')
+        self.assertEqual(self.client.get('/api/roles/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get('/api/roles/abc/').status_code, 404)
+
+
+class ExpandFieldsTests(TestCase):
+    def setUp(self):
+        self.subject = Subject.objects.create(name='Vue.js')
+        self.exam = Exam.objects.create(exam_code='EXAM_VUEJS_001', duration=60, num_questions=0, subject=self.subject)
+        candidate = Role.objects.create(name='Candidate')
+        self.student = User.objects.create(username='sv0', email='sv0@example.com', role=candidate)
+        admin = User.objects.create(username='admin', email='admin@example.com', role=Role.objects.create(name='Admin'))
+        self.student_client = APIClient()
+        self.student_client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.student).access_token}')
+        self.admin_client = APIClient()
+        self.admin_client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(admin).access_token}')
+
+    def add_submissions(self, count):
+        # Candidates list their own submissions only, one per exam.
+        for _ in range(count):
+            exam = Exam.objects.create(exam_code=f'EXAM_VUEJS_{Exam.objects.count() + 1:03}', duration=60,
+                                       num_questions=0, subject=self.subject)
+            Submission.objects.create(exam=exam, user=self.student, answers={}, score=5)
+
+    def list_submissions(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.student_client.get('/api/submissions/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"], len(ctx.captured_queries)
+
+    def test_relations_are_keys_unless_expanded(self):
+        self.add_submissions(1)
+        [row], _ = self.list_submissions()
+        self.assertEqual(row["user"], self.student.id)
+        self.assertIsInstance(row["exam"], int)
+
+        [row], _ = self.list_submissions(expand='exam,user')
+        self.assertEqual(row["exam"]["subject_name"], 'Vue.js')
+        self.assertEqual(row["user"]["role_name"], 'Candidate')
+
+    def test_expanded_query_count_is_constant(self):
+        self.add_submissions(2)
+        _, small = self.list_submissions(expand='exam,user')
+        self.add_submissions(8)
+        rows, large = self.list_submissions(expand='exam,user')
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(small, large)
+
+    def test_sparse_fields(self):
+        self.add_submissions(1)
+        [row], _ = self.list_submissions(fields='id,score,exam', expand='exam,user')
+        self.assertEqual(set(row), {'id', 'score', 'exam'})
+        self.assertEqual(row["exam"]["exam_code"], 'EXAM_VUEJS_002')
+
+    def test_user_subjects_accept_keys_on_write(self):
+        response = self.admin_client.post(
+            '/api/user-subjects/?expand=subject', {"user": self.student.id, "subject": self.subject.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["subject"]["name"], 'Vue.js')
+        self.assertEqual(response.data["user"], self.student.id)
+
+
+# (role, url, queries); every endpoint must stay at its budget whatever the
+# number of rows, see QueryBudgetTests.
+QUERY_BUDGETS = [
+    ('Admin', '/api/questions/', 2),
+    ('Admin', '/api/questions/{question}/', 2),
+    ('Admin', '/api/questions/search/?q=question', 2),
+    ('Admin', '/api/exams/', 1),
+    ('Admin', '/api/exams/{exam}/', 1),
+    ('Admin', '/api/subjects/', 1),
+    ('Admin', '/api/roles/', 1),
+    ('Admin', '/api/exam-questions/', 1),
+    ('Admin', '/api/exam-questions/?expand=exam,question', 2),
+    ('Admin', '/api/exam-schedules/', 1),
+    ('Admin', '/api/users/', 1),
+    ('Admin', '/api/user-subjects/?expand=user,subject', 1),
+    ('Admin', '/api/import-jobs/', 1),
+    ('Admin', '/api/auth/me/', 1),
+    ('Candidate', '/api/submissions/?expand=exam,user', 1),
+    ('Candidate', '/api/choices/', 1),
+]
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.roles = {name: Role.objects.create(name=name) for name in ('Admin', 'Candidate')}
+        self.clients = {}
+        for name, role in self.roles.items():
+            user = User.objects.create(username=name.lower(), email=f'{name.lower()}@example.com', role=role)
+            self.clients[name] = APIClient()
+            self.clients[name].credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(user).access_token}')
+        self.seeded = 0
+
+    def seed(self, count):
+        """Add ``count`` subjects, each with an exam, questions, schedule, candidate and submission."""
+        for i in range(self.seeded, self.seeded + count):
+            subject = Subject.objects.create(name=f'Subject {i}')
+            exam = Exam.objects.create(exam_code=f'EXAM_{i}', duration=60, num_questions=2, subject=subject)
+            questions = make_questions(2)
+            for question in questions:
+                question["question_text"] += f" of subject {i}"
+            save_questions(questions, exam, subject)
+            ExamSchedule.objects.create(
+                exam=exam, start_time=timezone.now(), end_time=timezone.now() + timezone.timedelta(hours=1),
+            )
+            user = User.objects.create(username=f'sv{i}', email=f'sv{i}@example.com', role=self.roles['Candidate'])
+            UserSubject.objects.create(user=user, subject=subject)
+            Submission.objects.create(exam=exam, user=user, answers={}, score=i)
+        self.seeded += count
+        return exam
+
+    def measure(self, exam):
+        question = ExamQuestion.objects.filter(exam=exam).values_list('question_id', flat=True).first()
+        counts = {}
+        for role, url, _ in QUERY_BUDGETS:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.clients[role].get(url.format(exam=exam.id, question=question))
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(ctx.captured_queries)
+        return counts
+
+    def test_endpoints_stay_within_query_budget(self):
+        small = self.measure(self.seed(2))
+        large = self.measure(self.seed(8))
+        for _, url, budget in QUERY_BUDGETS:
+            with self.subTest(url=url):
+                self.assertEqual(large[url], small[url])
+                self.assertLessEqual(large[url], budget)
+
+    def test_questions_serve_choices_from_prefetch(self):
+        self.seed(1)
+        response = self.clients['Admin'].get('/api/questions/')
+        self.assertEqual([choice["option"] for choice in response.data["results"][0]["choices"]], list('abcd'))
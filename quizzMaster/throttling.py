@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_LOGIN_BUCKETS = {
+    # (burst, tokens per second); 'username' buckets are per username and IP.
+    'username': (5, 1 / 30),
+    # A whole class often logs in from one NAT address.
+    'ip': (300, 20),
+}
+MAX_BUCKETS = 100000
+
+
+class TokenBucket:
+    """Token buckets per key, kept in process memory.
+
+    Each key holds up to ``capacity`` tokens, refilled at ``rate`` per
+    second. The least recently used keys are dropped beyond ``max_keys``.
+    """
+
+    def __init__(self, capacity, rate, max_keys=MAX_BUCKETS):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, now=None):
+        """Take a token; returns 0 on success, else the seconds until one is free."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, stamp = self.buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - stamp) * self.rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+            self.buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return wait
+
+
+class LoginThrottle(BaseThrottle):
+    """Limits login attempts per client IP, and per username from that IP, before any hashing.
+
+    Keying the username bucket on the address too means guessing someone's
+    password from one machine cannot lock them out of another. Buckets live in each worker process, so the effective limit scales
+    with the number of workers. The client IP comes from DRF's get_ident,
+    which only trusts X-Forwarded-For as far as NUM_PROXIES allows.
+    """
+
+    _buckets = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def bucket(cls, scope):
+        capacity, rate = getattr(settings, 'QUIZZ_LOGIN_BUCKETS', DEFAULT_LOGIN_BUCKETS)[scope]
+        with cls._lock:
+            if (scope, capacity, rate) not in cls._buckets:
+                cls._buckets[scope, capacity, rate] = TokenBucket(capacity, rate)
+            return cls._buckets[scope, capacity, rate]
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._buckets.clear()
+
+    def allow_request(self, request, view):
+        ident = self.get_ident(request)
+        self.wait_seconds = self.bucket('ip').take(ident)
+        if not self.wait_seconds:
+            username = str(request.data.get('username') or '').lower()
+            self.wait_seconds = self.bucket('username').take((username, ident))
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
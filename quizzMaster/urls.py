@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 
 router = DefaultRouter()
@@ -15,12 +15,17 @@ router.register(r'submissions', views.SubmissionViewSet)
 router.register(r'roles', views.RoleViewSet)
 router.register(r'user-subjects', views.UserSubjectViewSet)
 router.register(r'auth', views.AuthViewSet, basename='auth')
+router.register(r'import-jobs', views.ImportJobViewSet)
 
 
 urlpatterns = [
     path('', include(router.urls)),
     path('import-docx/', views.ImportDocxView.as_view(), name='import-docx'),
     path('exam-import-docx/', views.ImportExamView.as_view(), name='exam-import-docx'),
+    path('async/exams/<int:exam_id>/paper/', async_views.exam_paper, name='async-exam-paper'),
+    path('async/exams/<int:exam_id>/draft/', async_views.exam_draft, name='async-exam-draft'),
+    path('async/exams/<int:exam_id>/submit/', async_views.exam_submit, name='async-exam-submit'),
+    path('async/exams/<int:exam_id>/time-remaining/', async_views.exam_time_remaining, name='async-exam-time-remaining'),
     # path('exams/<int:exam_id>/questions/', views.ExamQuestionsView.as_view(), name='exam-questions'),
 
 ]
@@ -0,0 +1,100 @@
+import time
+
+from django.core.cache import cache
+
+VERSION_CACHE_TIMEOUT = None
+
+# Version scopes: an exam's content (questions, choices, answers) and the
+# candidates assigned to it change independently, so assignment changes
+# keep the cached paper and answer key.
+CONTENT = 'exam-version'
+CANDIDATES = 'exam-candidates-version'
+
+
+def exam_version_key(exam_id, scope=CONTENT):
+    return f'{scope}:{exam_id}'
+
+
+def exam_version(exam_id, scope=CONTENT):
+    """Current version token of an exam's questions, choices and answers.
+
+    Cached data derived from an exam (paper, answer key) is keyed by this
+    token, so bumping it invalidates all of it at once. ``scope`` selects
+    another token, e.g. CANDIDATES for the candidate list.
+    """
+    key = exam_version_key(exam_id, scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, str(time.time_ns()), VERSION_CACHE_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_exam_versions(exam_ids, scopes=(CONTENT,)):
+    version = str(time.time_ns())
+    cache.set_many(
+        {exam_version_key(exam_id, scope): version for exam_id in exam_ids for scope in scopes},
+        VERSION_CACHE_TIMEOUT,
+    )
+
+
+def get_versioned(name, exam_id, scope=CONTENT):
+    """Read a cache entry derived from an exam together with the exam version.
+
+    Both are fetched in one cache round trip. Returns ``(value, version)``
+    where value is None if the entry is missing or was built for an older
+    version.
+    """
+    version_key = exam_version_key(exam_id, scope)
+    key = f'{name}:{exam_id}'
+    values = cache.get_many([version_key, key])
+    version = values.get(version_key)
+    if version is None:
+        version = exam_version(exam_id, scope)
+    entry = values.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1], version
+    return None, version
+
+
+async def aget_versioned(name, exam_id):
+    """Async variant of get_versioned for the async views."""
+    version_key = exam_version_key(exam_id)
+    key = f'{name}:{exam_id}'
+    values = await cache.aget_many([version_key, key])
+    version = values.get(version_key)
+    if version is None:
+        await cache.aadd(version_key, str(time.time_ns()), VERSION_CACHE_TIMEOUT)
+        version = await cache.aget(version_key)
+    entry = values.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1], version
+    return None, version
+
+
+def set_versioned(name, exam_id, version, value, timeout):
+    cache.set(f'{name}:{exam_id}', (version, value), timeout)
+
+
+def table_version_key(model):
+    return f'table-version:{model._meta.label_lower}'
+
+
+def table_versions(models):
+    """Version tokens of whole tables, in one cache round trip.
+
+    signals.py bumps a table's token on every save and delete, and bulk
+    writers call bump_table_versions themselves.
+    """
+    keys = [table_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, str(time.time_ns()), VERSION_CACHE_TIMEOUT)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_table_versions(models):
+    version = str(time.time_ns())
+    cache.set_many({table_version_key(model): version for model in models}, VERSION_CACHE_TIMEOUT)
@@ -2,21 +2,36 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.views import APIView
 from django.contrib.auth.hashers import make_password
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Choice, Exam, Question, Subject, ExamSchedule,CorrectAnswer, ExamQuestion, User, Submission, Role, UserSubject
-from .serializers import ChoiceSerializer, ExamSerializer, QuestionSerializer, SubjectSerializer, ExamScheduleSerializer, ExamQuestionSerializer, UserSerializer, SubmissionSerializer, RoleSerializer, UserSubjectSerializer
+from django.db import IntegrityError, router, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.timezone import now
+from .models import Choice, Exam, Question, Subject, ExamSchedule,CorrectAnswer, ExamQuestion, User, Submission, SubmissionDraft, Role, UserSubject, ImportJob
+from .serializers import ALREADY_SUBMITTED, ChoiceSerializer, ExamSerializer, QuestionSerializer, SubjectSerializer, ExamScheduleSerializer, ExamQuestionSerializer, UserSerializer, SubmissionSerializer, RoleSerializer, UserSubjectSerializer, ImportJobSerializer, SubmissionIngestSerializer, ExamScheduleSlotSerializer, QuestionSearchSerializer
 from .permissions import IsStudent, IsAdmin, IsExamAdministrator, IsQuestionManager
+from .authentication import RoleJWTAuthentication, tokens_for_user
+from .pagination import CreatedAtCursorPagination, SearchPagination
+from .conditional import ConditionalGetMixin
+from .expansion import ExpandableQuerysetMixin
+from .search import search_questions
+from .jobs import enqueue_import
+from .grading import get_answer_key, grade_answers
+from .drafts import load_draft, save_draft, take_draft
+from .ingest import INGEST_LOG, append_submission, claim_submission, ingest_mode, release_submission
+from .analytics import exam_item_report, subject_item_report
+from .scheduling import MAX_BULK_SCHEDULES, ScheduleConflict, exam_windows, schedule_bulk, time_remaining
+from .prewarm import eligible_candidates, exam_is_open_to
+from .papers import get_candidate_paper_bytes, get_paper_bytes
+from .exports import CSV_CONTENT_TYPE, XLSX_CONTENT_TYPE, result_rows, stream_csv, stream_xlsx
+from .printing import MAX_PAPER_VARIANTS, paper_tasks, render_papers, stream_zip
+from .provisioning import ProvisioningFailed, inline_rows, provision_users, read_users_csv
+from .throttling import LoginThrottle
 from rest_framework.exceptions import ValidationError
-from docx import Document
-import cloudinary
-from cloudinary.uploader import upload
 
 
 class ProtectedView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -24,34 +39,187 @@ class ProtectedView(APIView):
 class ChoiceViewSet(viewsets.ModelViewSet):
     queryset = Choice.objects.all()
     serializer_class = ChoiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsStudent]
 
-class QuestionViewSet(viewsets.ModelViewSet):
-    queryset = Question.objects.all()
+class QuestionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Question.objects.prefetch_related('choices')
     serializer_class = QuestionSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsQuestionManager | IsAdmin]
-
-class ExamViewSet(viewsets.ModelViewSet):
-    queryset = Exam.objects.all()
+    pagination_class = CreatedAtCursorPagination
+    conditional_models = (Choice,)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Ranked search over question text, choices, unit and subject: ?q=...&subject=&unit=."""
+        queryset = Question.objects.select_related('subject')
+        subject = request.query_params.get('subject')
+        if subject:
+            if not subject.isdigit():
+                raise ValidationError({"subject": "Expected a subject id."})
+            queryset = queryset.filter(subject_id=subject)
+        if request.query_params.get('unit'):
+            queryset = queryset.filter(unit=request.query_params['unit'])
+        results = search_questions(request.query_params.get('q', ''), queryset)
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(results, request, view=self)
+        return paginator.get_paginated_response(QuestionSearchSerializer(page, many=True).data)
+
+def export_results(request, queryset, name):
+    """Stream the submissions in ``queryset`` as ?file_format=csv (default) or xlsx."""
+    file_format = request.query_params.get('file_format', 'csv')
+    if file_format not in ('csv', 'xlsx'):
+        raise ValidationError({"file_format": "Must be csv or xlsx."})
+    # The body is produced after the view returns, outside the replica
+    # routing context, so pin the read database now.
+    rows = result_rows(queryset.using(router.db_for_read(Submission)))
+    if file_format == 'csv':
+        response = StreamingHttpResponse(stream_csv(rows), content_type=CSV_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(stream_xlsx(rows), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{name}-results.{file_format}"'
+    return response
+
+
+class ExamViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Exam.objects.select_related('subject')
     serializer_class = ExamSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdmin | IsExamAdministrator]
+    # subject_name comes from the subject.
+    conditional_models = (Subject,)
 
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def paper(self, request, pk=None):
+        """The exam paper; candidates only get theirs while the exam is running."""
+        try:
+            exam_id = int(pk)
+            if IsStudent().has_permission(request, self):
+                if not exam_is_open_to(exam_id, request.user.id):
+                    return Response({'message': 'This exam is not open to you', 'status': 'error'},
+                                    status=status.HTTP_403_FORBIDDEN)
+                paper = get_candidate_paper_bytes(exam_id, request.user.id)
+            else:
+                paper = get_paper_bytes(exam_id)
+        except (ValueError, Exam.DoesNotExist):
+            return Response({'message': 'Exam not found', 'status': 'error'}, status=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(paper, content_type='application/json')
+
+    @action(detail=True, methods=['get'], url_path='item-stats',
+            permission_classes=[IsAuthenticated, IsAdmin | IsExamAdministrator | IsQuestionManager])
+    def item_stats(self, request, pk=None):
+        try:
+            exam_id = int(pk)
+        except ValueError:
+            return Response({'message': 'Exam not found', 'status': 'error'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(exam_item_report(exam_id), status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='results/export',
+            permission_classes=[IsAuthenticated, IsAdmin | IsExamAdministrator])
+    def export(self, request, pk=None):
+        exam = self.get_object()
+        return export_results(request, Submission.objects.filter(exam=exam), f'exam-{exam.id}')
+
+    @action(detail=True, methods=['get'], url_path='papers/docx',
+            permission_classes=[IsAuthenticated, IsAdmin | IsExamAdministrator])
+    def print_papers(self, request, pk=None):
+        """ZIP of printable DOCX papers.
+
+        ?candidates=all (every eligible candidate) or a comma-separated list
+        of user ids gives one shuffled variant per candidate; without it the
+        ZIP holds the canonical paper. ?answers=1 adds ANSWER rows.
+        """
+        exam = self.get_object()
+        candidates = request.query_params.get('candidates')
+        if not candidates:
+            user_ids = None
+        elif candidates == 'all':
+            user_ids = eligible_candidates(exam.id)
+        else:
+            try:
+                user_ids = [int(user_id) for user_id in candidates.split(',')]
+            except ValueError:
+                raise ValidationError({"candidates": "Must be 'all' or a comma-separated list of user ids."})
+        if user_ids is not None and len(user_ids) > MAX_PAPER_VARIANTS:
+            raise ValidationError({"candidates": f"At most {MAX_PAPER_VARIANTS} variants per request."})
+        tasks = paper_tasks(exam.id, user_ids, answers=request.query_params.get('answers') == '1')
+        response = StreamingHttpResponse(stream_zip(render_papers(tasks)), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{exam.exam_code}-papers.zip"'
+        return response
+
+    @action(detail=True, methods=['get'], url_path='time-remaining', permission_classes=[IsAuthenticated])
+    def time_left(self, request, pk=None):
+        try:
+            exam_id = int(pk)
+        except ValueError:
+            return Response({'message': 'Exam not found', 'status': 'error'}, status=status.HTTP_404_NOT_FOUND)
+        remaining = time_remaining(exam_windows(exam_id), now())
+        if remaining is None:
+            return Response({'message': 'No upcoming schedule for this exam', 'status': 'error'},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(remaining, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsAdmin | IsExamAdministrator])
+    def candidates(self, request, pk=None):
+        try:
+            exam_id = int(pk)
+        except ValueError:
+            return Response({'message': 'Exam not found', 'status': 'error'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"candidates": eligible_candidates(exam_id)}, status=status.HTTP_200_OK)
 
-class ExamQuestionViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get', 'patch'], permission_classes=[IsAuthenticated, IsStudent])
+    def draft(self, request, pk=None):
+        try:
+            key = get_answer_key(int(pk))
+        except ValueError:
+            key = None
+        if key is None or not key.num_questions:
+            return Response({'message': 'Exam not found', 'status': 'error'}, status=status.HTTP_404_NOT_FOUND)
+        if not exam_is_open_to(key.exam_id, request.user.id):
+            return Response({'message': 'This exam is not open to you', 'status': 'error'},
+                            status=status.HTTP_403_FORBIDDEN)
+        if request.method == 'GET':
+            return Response({"answers": load_draft(key.exam_id, request.user.id)}, status=status.HTTP_200_OK)
+
+        delta = request.data.get('answers')
+        if not isinstance(delta, dict):
+            raise ValidationError({"answers": "Answers must map question ids to choice ids or options."})
+        unknown = [question_id for question_id in delta if not str(question_id).isdigit()
+                   or int(question_id) not in key.question_index]
+        if unknown:
+            raise ValidationError({"answers": f"Questions not in this exam: {', '.join(map(str, unknown))}"})
+        answers = save_draft(key.exam_id, request.user.id, delta)
+        return Response({"saved": len(delta), "answered": len(answers)}, status=status.HTTP_200_OK)
+
+
+class ExamQuestionViewSet(ExpandableQuerysetMixin, viewsets.ModelViewSet):
     queryset = ExamQuestion.objects.all()
     serializer_class = ExamQuestionSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdmin | IsExamAdministrator | IsQuestionManager]
 
-class SubjectViewSet(viewsets.ModelViewSet):
+class SubjectViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated | IsAdmin | IsQuestionManager]
 
+    @action(detail=True, methods=['get'], url_path='item-stats',
+            permission_classes=[IsAuthenticated, IsAdmin | IsExamAdministrator | IsQuestionManager])
+    def item_stats(self, request, pk=None):
+        try:
+            subject_id = int(pk)
+        except ValueError:
+            return Response({'message': 'Subject not found', 'status': 'error'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(subject_item_report(subject_id), status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='results/export',
+            permission_classes=[IsAuthenticated, IsAdmin | IsExamAdministrator])
+    def export(self, request, pk=None):
+        subject = self.get_object()
+        return export_results(request, Submission.objects.filter(exam__subject=subject), f'subject-{subject.id}')
+
     def create(self, request, *args, **kwargs):
         serializer = SubjectSerializer(data=request.data)
         try:
@@ -71,282 +239,172 @@ class SubjectViewSet(viewsets.ModelViewSet):
 class ExamScheduleViewSet(viewsets.ModelViewSet):
     queryset = ExamSchedule.objects.all()
     serializer_class = ExamScheduleSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdmin | IsExamAdministrator]
 
-class SubmissionViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        slots = request.data.get('schedules') if isinstance(request.data, dict) else request.data
+        if not isinstance(slots, list) or not slots:
+            raise ValidationError({"schedules": "Expected a non-empty list of schedules."})
+        if len(slots) > MAX_BULK_SCHEDULES:
+            raise ValidationError({"schedules": f"At most {MAX_BULK_SCHEDULES} schedules per request."})
+        serializer = ExamScheduleSlotSerializer(data=slots, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            created = schedule_bulk(serializer.validated_data)
+        except ScheduleConflict as e:
+            return Response(
+                {"message": "The exam schedules conflict.", "conflicts": e.conflicts},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response({"created": len(created)}, status=status.HTTP_201_CREATED)
+
+class SubmissionViewSet(ExpandableQuerysetMixin, viewsets.ModelViewSet):
     queryset = Submission.objects.all()
     serializer_class = SubmissionSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsStudent]
+    pagination_class = CreatedAtCursorPagination
 
-class RoleViewSet(viewsets.ModelViewSet):
+    def get_permissions(self):
+        if self.action in ('update', 'partial_update', 'destroy'):
+            # Candidates submit once; a regraded edit would reveal the key.
+            return [IsAuthenticated(), (IsAdmin | IsExamAdministrator)()]
+        return super().get_permissions()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if IsStudent().has_permission(self.request, self):
+            queryset = queryset.filter(user_id=self.request.user.id)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        if ingest_mode() != INGEST_LOG:
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            if not exam_is_open_to(serializer.validated_data['exam'].id, request.user.id):
+                return Response({'message': 'This exam is not open to you', 'status': 'error'},
+                                status=status.HTTP_403_FORBIDDEN)
+            self.perform_create(serializer)
+            return Response(serializer.data, status=status.HTTP_201_CREATED,
+                            headers=self.get_success_headers(serializer.data))
+        serializer = SubmissionIngestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        exam_id = serializer.validated_data['exam_id']
+        key = get_answer_key(exam_id)
+        if not key.num_questions:
+            raise ValidationError({"exam_id": "Exam not found or has no questions."})
+        if not exam_is_open_to(exam_id, request.user.id):
+            return Response({'message': 'This exam is not open to you', 'status': 'error'},
+                            status=status.HTTP_403_FORBIDDEN)
+        if not claim_submission(exam_id, request.user.id):
+            raise ValidationError({"exam_id": ALREADY_SUBMITTED})
+        answers = {**take_draft(exam_id, request.user.id), **serializer.validated_data['answers']}
+        try:
+            append_submission(exam_id, request.user.id, answers, key.score(answers, request.user.id))
+        except Exception:
+            release_submission(exam_id, request.user.id)
+            raise
+        # The score is only stored by the drainer, so it is not reported yet.
+        return Response({"status": "accepted", "exam_id": exam_id}, status=status.HTTP_202_ACCEPTED)
+
+    def perform_create(self, serializer):
+        exam = serializer.validated_data['exam']
+        user_id = self.request.user.id
+        answers = {**take_draft(exam.id, user_id), **serializer.validated_data['answers']}
+        try:
+            with transaction.atomic():
+                serializer.save(user_id=user_id, answers=answers, score=grade_answers(exam.id, answers, user_id))
+        except IntegrityError:
+            raise ValidationError({"exam_id": ALREADY_SUBMITTED})
+        SubmissionDraft.objects.filter(exam_id=exam.id, user_id=user_id).delete()
+
+    def perform_update(self, serializer):
+        exam = serializer.validated_data.get('exam', serializer.instance.exam)
+        answers = serializer.validated_data.get('answers', serializer.instance.answers)
+        serializer.save(score=grade_answers(exam.id, answers, serializer.instance.user_id))
+
+class RoleViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdmin]
 
-class UserSubjectViewSet(viewsets.ModelViewSet):
+class UserSubjectViewSet(ExpandableQuerysetMixin, viewsets.ModelViewSet):
     queryset = UserSubject.objects.all()
     serializer_class = UserSubjectSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdmin]
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('role')
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdmin]
+    pagination_class = CreatedAtCursorPagination
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Provision users from an uploaded CSV, see provisioning.py."""
+        csv_file = request.FILES.get('file')
+        if not csv_file or not csv_file.name.endswith('.csv'):
+            return Response({"message": "Invalid file format", "status": "error"}, status=400)
+        try:
+            rows = read_users_csv(line.decode('utf-8-sig') for line in csv_file)
+        except UnicodeDecodeError:
+            return Response({"message": "File must be UTF-8", "status": "error"}, status=400)
+        except ProvisioningFailed as e:
+            return Response({"message": str(e), "status": "error"}, status=400)
+        dry_run = request.query_params.get('dry_run') == '1'
+        if not dry_run and len(rows) > inline_rows():
+            csv_file.seek(0)
+            job = enqueue_import(ImportJob.KIND_USERS, csv_file, user=request.user)
+            return Response({"message": "File queued for provisioning", "status": "queued", "job_id": job.id},
+                            status=status.HTTP_202_ACCEPTED)
+        # No process pool in a web worker; larger files were queued above.
+        report = provision_users(rows, workers=0, dry_run=dry_run)
+        return Response(report, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
 
 class ImportDocxView(APIView):
     # authentication_classes = [JWTAuthentication]
     # permission_classes = [IsAuthenticated, IsAdmin, IsQuestionManager]
-    def save_to_database( self, questions, exam_id, subject_id):
-        for question in questions:
-            question_text = question['question']
-            choices = question['choices']
-            correct_choice = question.get('correct_choice')
-
-            subject = Subject.objects.get(id=subject_id)
-            question = Question.objects.create(question_text=question_text, subject=subject)
-            correct_choice_obj = None
-            for choice_data in choices:
-                choice_text = choice_data["text"]
-                choice = Choice.objects.create(question=question, choice_text=choice_text)
-                if choice_data["option"] == correct_choice:
-                    correct_choice_obj = choice
-            if correct_choice_obj:
-                CorrectAnswer.objects.create(question=question, choice=correct_choice_obj)
-            exam = Exam.objects.get(id=exam_id)
-            ExamQuestion.objects.create(exam=exam, question=question)
-
     def post(self, request, *args, **kwargs):
         exam_id = request.data.get('exam_id')
         subject_id = request.data.get('subject_id')
         docx_file = request.FILES.get('file')
-        questions = []
-        current_question = None
-        current_choices = []
-        correct_choice = None
         if not docx_file or not docx_file.name.endswith('.docx'):
             return Response({"message": "Invalid file format", "status": "error"}, status=400)
         if not exam_id or not subject_id:
             return Response({"message": "Missing exam_id or subject_id", "status": "error"}, status=400)
-        try:
-            document = Document(docx_file)
-            for paragraph in document.paragraphs:
-                text = paragraph.text.strip()
-                if text.startswith("Câu"):
-                    if current_question and current_choices:
-                        questions.append({
-                            "question": current_question,
-                            "choices": current_choices
-                        })
-                    question_text = text.split(":")[1].strip()
-                    current_question = question_text
-                    current_choices = []
-                elif text.startswith(("A.", "B.", "C.", "D.")):
-                    option,choice_text = text.split(".", 1)
-                    current_choices.append({
-                        "option": option.strip(),
-                        "text": choice_text.strip()
-                    })
-                elif text.startswith("Đáp án"):
-                    correct_choice = text.split(":")[1].strip()
-                    if current_choices and current_question:
-                        questions.append({
-                            "question": current_question,
-                            "choices": current_choices,
-                            "correct_choice": correct_choice
-                        })
-                        current_question = None
-                        current_choices = []
-                        correct_choice = None
-            if current_question and current_choices:
-                questions.append({
-                    "question": current_question,
-                    "choices": current_choices
-                })
-            self.save_to_database(questions, exam_id, subject_id)
-        except Exception as e:
-            return Response({"message": "Something went wrong", "status": "error"}, status=400)
-        else:
-            return Response({"message": "File imported successfully", "status": "success"}, status=200)
-import datetime
+        job = enqueue_import(ImportJob.KIND_QUESTIONS, docx_file, {"exam_id": exam_id, "subject_id": subject_id}, request.user)
+        return Response({"message": "File queued for import", "status": "queued", "job_id": job.id}, status=202)
+
 class ImportExamView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdmin | IsQuestionManager | IsExamAdministrator]
 
-    def extract_metadata(self,document):
-        subject_name = None
-        num_questions = 0
-        lecturer = None
-
-        for paragraph in document.paragraphs:
-            text = paragraph.text.strip()
-            if text.startswith("Subject:"):
-                subject_name = text.split(":")[1].strip()
-            elif text.startswith("Number of Quiz:"):
-                num_questions = int(text.split(":")[1].strip())
-            elif text.startswith("Lecturer:"):
-                lecturer = text.split(":")[1].strip()
-
-        return subject_name, num_questions, lecturer
-    def create_or_update_subject(self,subject_name, lecturer):
-        subject, created = Subject.objects.get_or_create(name=subject_name)
-        if created:
-            subject.lecturer = lecturer
-            subject.save()
-        return subject
-
-
-    def upload_image_from_docx(self ,doc, image_reference):
-        from docx import Document
-        from cloudinary.uploader import upload
-        from cloudinary.utils import cloudinary_url
-        from io import BytesIO
-        try:
-            for rel in doc.part.rels.values():
-                if "image" in rel.target_ref:
-                    image = rel.target_part.blob
-                    result = upload(BytesIO(image), resource_type="image",upload_preset='quiz_images_upload')
-                    print(result["secure_url"])
-                    return result["secure_url"]
-        except Exception as e:
-            print(f"Error uploading image {image_reference}: {e}")
-            return None
-
-    def process_questions_table(self,table, doc):
-
-        questions = []
-        current_question = None
-        correct_choice = None
-        mark = None
-        unit = None
-        mix_choices = False
-        for row in table.rows:
-            first_cell = row.cells[0].text.strip()
-            second_cell = row.cells[1].text.strip()
-            if first_cell.startswith("QN"):
-                image_file = None
-
-                if "[file:" in second_cell:
-                    question_text = second_cell.split("[file:")[0].strip()
-                    image_reference  = second_cell.split("[file:")[1].split("]")[0].strip()
-                    image_file = self.upload_image_from_docx(doc, image_reference)
-                else:
-                    question_text = second_cell
-
-                current_question = {
-                    "question_text": question_text,
-                    "choices": [],
-                    "image_file": image_file,
-                    "correct_choice": correct_choice,
-                    "mark": mark,
-                    "unit": unit,
-                    "mix_choices": mix_choices
-                }
-
-                questions.append(current_question)
-
-            elif first_cell.startswith(("a.", "b.", "c.", "d.")):
-                option = first_cell.split(".", 1)[0]
-                choice_text = second_cell
-                if current_question:
-                     current_question["choices"].append({
-                        "option": option,
-                        "text": choice_text
-                    })
-            elif first_cell.startswith("ANSWER:"):
-                correct_choice = second_cell.strip()
-                if current_question:
-                    current_question["correct_choice"] = correct_choice
-            elif first_cell.startswith("MARK:"):
-                mark = float(second_cell.strip())
-                if current_question:
-                    current_question["mark"] = mark
-            elif first_cell.startswith("UNIT:"):
-                unit = second_cell.strip()
-                if current_question:
-                    current_question["unit"] = unit
-            elif first_cell.startswith("MIX CHOICES:"):
-                mix_choices = second_cell.strip().lower() == "yes"
-                if current_question:
-                    current_question["mix_choices"] = mix_choices
-        return questions
-
-    def save_exam(self,subject, num_questions, exam_code, exam_id = None):
-        if exam_id:
-            print("exam_id",exam_id)
-            exam = Exam.objects.get(id=exam_id)
-            print("exam",exam)
-            exam.subject = subject
-            exam.num_questions = num_questions
-            exam.exam_code = exam_code
-            exam.save()
-            return exam
-        else:
-            exam = Exam.objects.create(subject=subject, num_questions=num_questions, exam_code=exam_code)
-            return exam
-
-    def save_questions_and_choices_and_answers(self, questions, exam, subject):
-        for question_data in questions:
-            question_text = question_data["question_text"]
-            choices = question_data["choices"]
-            image_file = question_data.get("image_file")
-            unit = question_data.get("unit")
-            is_mixed = question_data.get("mix_choices")
-            correct_answer = question_data.get("correct_choice")
-
-            question = Question.objects.create(question_text=question_text, image=image_file, unit=unit, is_mixed=is_mixed, subject=subject)
-            for choice_data in choices:
-                option = choice_data["option"]
-                choice_text = choice_data["text"]
-                Choice.objects.create(question=question, choice_text=choice_text, option=option)
-            if correct_answer:
-                correct_choice = Choice.objects.get(question=question, option=correct_answer)
-                CorrectAnswer.objects.create(question=question, choice=correct_choice)
-            ExamQuestion.objects.create(exam=exam, question=question)
-
     def post(self, request, *args, **kwargs):
         docx_file = request.FILES.get('file')
 
         if not docx_file or not docx_file.name.endswith('.docx'):
             return Response({"message": "Invalid file format", "status": "error"}, status=400)
-        try:
-            document = Document(docx_file)
-
-            subject_name, num_questions, lecturer = self.extract_metadata(document)
 
-            if not subject_name or not num_questions or not lecturer:
-                return Response({"message": "Missing required fields", "status": "error"}, status=400)
-
-            subject = self.create_or_update_subject(subject_name, lecturer)
-
-            exam_id  = request.data.get('exam_id')
-            if exam_id:
-                try:
-                    exam = Exam.objects.get(id=exam_id)
-                    exam_code = exam.exam_code
-                except Exam.DoesNotExist:
-                    return Response({"message": "Exam not found", "status": "error"}, status=404)
-            else:
-                exam_code = f"EXAM_{subject_name}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-            exam = self.save_exam(subject, num_questions, exam_code, exam_id)
-
-            table = document.tables[0]
-            questions = self.process_questions_table(table,document)
-            print(questions)
+        exam_id = request.data.get('exam_id')
+        if exam_id and not Exam.objects.filter(id=exam_id).exists():
+            return Response({"message": "Exam not found", "status": "error"}, status=404)
 
-            self.save_questions_and_choices_and_answers(questions, exam, subject)
+        job = enqueue_import(ImportJob.KIND_EXAM, docx_file, {"exam_id": exam_id}, request.user)
+        return Response({"message": "File queued for import", "status": "queued", "job_id": job.id}, status=202)
 
-        except Exception as e:
-            return Response({"message": str(e), "status": "error"}, status=400)
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ImportJob.objects.defer('file_data').order_by('-id')
+    serializer_class = ImportJobSerializer
+    authentication_classes = [RoleJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdmin | IsQuestionManager | IsExamAdministrator]
 
-        return Response({"message": "File imported successfully", "status": "success"}, status=200)
 class AuthViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('role')
     serializer_class = UserSerializer
 
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
@@ -369,33 +427,37 @@ class AuthViewSet(viewsets.ModelViewSet):
        user.save()
        return Response({'message': 'User registered successfully', 'data': UserSerializer(user).data, 'status': 'success'}, status=status.HTTP_201_CREATED)
 
-    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny], throttle_classes=[LoginThrottle])
     def login(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
-        try:
-            user = User.objects.get(username=username)
-            if user.check_password(password):
-                refresh = RefreshToken.for_user(user)
-                return Response({
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                    'username': {
-                        'id': user.id,
-                        'username': user.username,
-                        'email': user.email
-                    },
-                    'message': 'User logged in successfully',
-                    'status': 'success'
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response({'message': 'Invalid credentials', 'status': 'error'}, status=status.HTTP_400_BAD_REQUEST)
-        except User.DoesNotExist:
+        # One query for exactly what the password check and the tokens need.
+        user = (
+            User.objects.select_related('role')
+            .only('id', 'username', 'email', 'password', 'role_version', 'role__name')
+            .filter(username=username)
+            .first()
+        )
+        if user is None:
             return Response({'message': 'User does not exist', 'status': 'error'}, status=status.HTTP_404_NOT_FOUND)
+        if not user.check_password(password):
+            return Response({'message': 'Invalid credentials', 'status': 'error'}, status=status.HTTP_400_BAD_REQUEST)
+        refresh = tokens_for_user(user)
+        return Response({
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'username': {
+                'id': user.id,
+                'username': user.username,
+                'email': user.email
+            },
+            'message': 'User logged in successfully',
+            'status': 'success'
+        }, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
-        user = request.user
+        user = User.objects.select_related('role').get(pk=request.user.id)
         serializer = UserSerializer(user)
         return Response({'user': serializer.data, 'message': 'User details', 'status': 'success'}, status=status.HTTP_200_OK)
 